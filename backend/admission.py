@@ -0,0 +1,192 @@
+"""
+Admission control for model inference across gunicorn workers
+"""
+import math
+import multiprocessing
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Peso da última medição na média móvel da latência do modelo
+EWMA_ALPHA = 0.2
+# Intervalo entre tentativas de quem espera por uma vaga
+SLOT_POLL_SECONDS = 0.005
+
+
+class Overloaded(Exception):
+    """The wait queue is full (or the wait timed out); retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'Server overloaded, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """The client deadline passed before classification could start"""
+
+
+def thread_budget(workers: int, configured: int = 0) -> int:
+    """Intra-op threads per worker so that all workers together use each core once"""
+    if configured > 0:
+        return configured
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def apply_thread_budget(threads: int):
+    """Limit the CPU threads used by torch (and OpenMP/MKL) in this process"""
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+class AdmissionController:
+    """Bounds concurrent model inferences across all worker processes.
+
+    Built before gunicorn forks (preload_app), so the slot table and counters
+    are shared by every worker. At most `max_concurrency` inferences run at
+    once; up to `max_queue` requests wait for a slot, and more are rejected
+    right away with Overloaded. A request with a deadline that the model
+    cannot meet (judged from a moving average of recent model latency) is
+    downgraded to the keyword engine instead of waiting.
+
+    A slot is taken by writing the holder's pid into the slot table under
+    one lock, so there is no moment where a slot is in use without an owner.
+    reclaim() can then give back the slots (and queue places) of a worker
+    that was killed (timeout SIGKILL, OOM) before its finally blocks ran.
+    Waiting requests poll the table every SLOT_POLL_SECONDS.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, default_model_seconds: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # pid de quem ocupa cada vaga e cada lugar da fila (0 = livre), protegidos por _pids_lock
+        self._pids_lock = multiprocessing.Lock()
+        self._holders = multiprocessing.Array('i', max_concurrency, lock=False)
+        self._waiters = multiprocessing.Array('i', max_queue, lock=False)
+        self._model_seconds = multiprocessing.Value('d', default_model_seconds)
+        self._rejected = multiprocessing.Value('q', 0)
+        self._downgraded = multiprocessing.Value('q', 0)
+        self._expired = multiprocessing.Value('q', 0)
+
+    def estimated_seconds(self, items: int = 1) -> float:
+        """Expected model time for `items` emails"""
+        return self._model_seconds.value * items
+
+    @staticmethod
+    def _occupied(pids) -> int:
+        return sum(1 for pid in pids if pid)
+
+    def _claim(self, pids, pid: int, limit: int = None) -> bool:
+        """Record pid in a free entry among the first `limit`; False when they are all taken"""
+        with self._pids_lock:
+            for index in range(len(pids) if limit is None else limit):
+                if not pids[index]:
+                    pids[index] = pid
+                    return True
+        return False
+
+    def set_max_concurrency(self, max_concurrency: int):
+        """Lower the number of slots to match the workers' thread budget (before any is taken)"""
+        self.max_concurrency = max(1, min(max_concurrency, len(self._holders)))
+
+    def _unclaim(self, pids, pid: int):
+        with self._pids_lock:
+            for index, holder in enumerate(pids):
+                if holder == pid:
+                    pids[index] = 0
+                    return
+
+    def _retry_after(self) -> int:
+        backlog = self._occupied(self._waiters) + self._occupied(self._holders) + 1
+        return max(1, math.ceil(backlog * self._model_seconds.value / self.max_concurrency))
+
+    def _count(self, counter):
+        with counter.get_lock():
+            counter.value += 1
+
+    @contextmanager
+    def admit(self, deadline: Optional[float] = None, items: int = 1) -> Iterator[bool]:
+        """Wait for an inference slot; yields True to run the model, False to use keywords.
+
+        `deadline` is a time.monotonic() instant. Raises DeadlineExceeded if it
+        has already passed and Overloaded if the queue is full or the wait
+        times out without a deadline to downgrade against.
+        """
+        estimate = self.estimated_seconds(items)
+        timeout = self.queue_timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count(self._expired)
+                raise DeadlineExceeded('Deadline exceeded before classification started')
+            if remaining < estimate:
+                # O modelo não termina a tempo: responde já com as palavras-chave
+                self._count(self._downgraded)
+                yield False
+                return
+            timeout = min(timeout, remaining - estimate)
+
+        pid = os.getpid()
+        if not self._claim(self._holders, pid, self.max_concurrency):
+            if not self._claim(self._waiters, pid):
+                self._count(self._rejected)
+                raise Overloaded(self._retry_after())
+
+            try:
+                acquired = False
+                wait_until = time.monotonic() + max(0.0, timeout)
+                while not acquired and time.monotonic() < wait_until:
+                    time.sleep(min(SLOT_POLL_SECONDS, max(0.0, wait_until - time.monotonic())))
+                    acquired = self._claim(self._holders, pid, self.max_concurrency)
+            finally:
+                self._unclaim(self._waiters, pid)
+
+            if not acquired:
+                if deadline is not None:
+                    self._count(self._downgraded)
+                    yield False
+                    return
+                self._count(self._rejected)
+                raise Overloaded(self._retry_after())
+
+        start = time.monotonic()
+        try:
+            yield True
+        finally:
+            elapsed = (time.monotonic() - start) / max(1, items)
+            with self._model_seconds.get_lock():
+                self._model_seconds.value += EWMA_ALPHA * (elapsed - self._model_seconds.value)
+            self._unclaim(self._holders, pid)
+
+    def reclaim(self, pid: int) -> int:
+        """Give back the slots and queue places held by a dead worker; returns the slots freed"""
+        freed = 0
+        with self._pids_lock:
+            for index, holder in enumerate(self._waiters):
+                if holder == pid:
+                    self._waiters[index] = 0
+            for index, holder in enumerate(self._holders):
+                if holder == pid:
+                    self._holders[index] = 0
+                    freed += 1
+        return freed
+
+    def snapshot(self) -> Dict:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'active': self._occupied(self._holders),
+            'queue_depth': self._occupied(self._waiters),
+            'model_seconds_avg': round(self._model_seconds.value, 4),
+            'shed': {
+                'rejected': self._rejected.value,
+                'downgraded': self._downgraded.value,
+                'expired': self._expired.value
+            }
+        }
@@ -1,372 +1,397 @@
 import os
+import sys
+import time
 
-# Configurar diretório de cache seguro para Hugging Face
-hf_cache_dir = "/tmp/hf_cache"
-os.makedirs(hf_cache_dir, exist_ok=True)
-os.environ["TRANSFORMERS_CACHE"] = hf_cache_dir
-os.environ["HF_HOME"] = hf_cache_dir
-os.environ["HF_DATASETS_CACHE"] = hf_cache_dir
+_import_start = time.perf_counter()
 
-from flask import Flask, request, jsonify
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import re
+from werkzeug.exceptions import HTTPException
+import json
 import logging
-from typing import Dict, List
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import RSLPStemmer
+import random
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 from datetime import datetime
-from transformers import pipeline
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()  # Envia logs para a saída padrão
-    ]
-)
+from config import get_config
+from logging_setup import configure_logging, dropped_records, reset_request_sampling, sample_request
+from result_cache import ResultCache
+from near_duplicates import NearDuplicateIndex
+from job_queue import JobQueue, JobRunner, RetryLater
+from admission import AdmissionController, DeadlineExceeded, Overloaded
+from classifier import AI_FALLBACK_FIELD, RESPONSE_FIELDS, EmailClassifier
+from compression import RequestDecompressionMiddleware, compress_response
+import metrics
+from mailbox_stream import extract_text, iter_mbox_messages, iter_multipart_messages
+from document_extract import UnsupportedDocument, extract_document, spool_upload
+from text_budget import MAX_CHARS_PER_TOKEN
+from process_memory import process_memory
+import profiling
+
+config = get_config()
+
+# Logs em JSON por uma fila, escritos numa thread em segundo plano
+configure_logging(config)
 logger = logging.getLogger(__name__)
 
-
-nltk_data_dir = "/tmp/nltk_data"
-os.makedirs(nltk_data_dir, exist_ok=True)
-nltk.data.path.insert(0, nltk_data_dir)
-
-
-nltk_packages = ['punkt', 'stopwords', 'rslp', 'punkt_tab']
-for pkg_id in nltk_packages:
-    try:
-        # Tenta encontrar o pacote
-        if pkg_id == 'rslp':
-            nltk.data.find(f'stemmers/{pkg_id}')
-        elif pkg_id == 'stopwords':
-            nltk.data.find(f'corpora/{pkg_id}')
-        else:
-            nltk.data.find(f'tokenizers/{pkg_id}')
-        logger.info(f"NLTK package '{pkg_id}' already downloaded.")
-    except LookupError:
-        logger.info(f"Downloading NLTK package '{pkg_id}' to {nltk_data_dir}...")
-        # Descarrega para o diretório temporário
-        nltk.download(pkg_id, download_dir=nltk_data_dir)
-
 app = Flask(__name__, static_folder='../static', static_url_path='')
 CORS(app)
+# Aceita corpos de pedido comprimidos (Content-Encoding: gzip, deflate, br)
+app.wsgi_app = RequestDecompressionMiddleware(app.wsgi_app, config.MAX_DECOMPRESSED_REQUEST_BYTES)
+
+if config.COMPRESSION_ENABLED:
+    @app.after_request
+    def _compress_response(response):
+        return compress_response(response, request.accept_encodings, config.COMPRESSION_MIN_SIZE)
+
+if config.PROFILING_ENABLED:
+    class _TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with profiling.stage('json_encoding'):
+                return super().dumps(obj, **kwargs)
+    
+    app.json = _TimedJSONProvider(app)
+    
+    @app.before_request
+    def _start_profile():
+        # X-Profile: 1 (ou ?profile=1) devolve os tempos por etapa; full também guarda um cProfile
+        flag = (request.headers.get(config.PROFILE_HEADER) or request.args.get('profile') or '').lower()
+        requested = flag in ('1', 'true', 'yes', 'full')
+        sampled = config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE
+        if not requested and not sampled:
+            return
+        g.profile = profiling.RequestProfile(capture=sampled or flag == 'full')
+        g.profile_requested = requested
+        g.profile_full = flag == 'full'
+        g.profile.start()
+    
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        profile.stop()
+        if g.profile_requested:
+            response.headers['Server-Timing'] = profile.server_timing()
+        
+        # Amostras só são guardadas acima do limiar; um pedido "full" é sempre guardado
+        if profile.profiler is not None and (g.profile_full or profile.total * 1000 >= config.PROFILE_SLOW_MS):
+            name = profile.save(config.PROFILE_DIR, config.PROFILE_DIR_MAX_BYTES, request.endpoint)
+            if name is not None:
+                logger.info("Request profile saved: %s (%s %s, %.0f ms)",
+                            name, request.method, request.path, profile.total * 1000)
+                if g.profile_requested:
+                    response.headers['X-Profile-File'] = name
+        return response
+    
+    @app.teardown_request
+    def _discard_profile(error=None):
+        # Pedido terminado sem passar pelo after_request (exceção não tratada)
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.stop()
 
 @app.route('/')
 def api_info():
     """Serve o arquivo principal do frontend."""
     return app.send_static_file('index.html')
 
-class EmailClassifier:
-    def __init__(self):
-        self.stemmer = RSLPStemmer()
-        self.stop_words = set(stopwords.words('portuguese') + stopwords.words('english'))
-        
-        self.ai_classifier = None
-        self.use_ai_model = self._initialize_ai_model()
-        
-        self.productive_keywords = {
-            'reuniao', 'projeto', 'prazo', 'entrega', 'relatorio', 'apresentacao',
-            'meeting', 'project', 'deadline', 'delivery', 'report', 'presentation',
-            'trabalho', 'tarefa', 'responsabilidade', 'objetivo', 'meta', 'agenda',
-            'cronograma', 'planejamento', 'estrategia', 'desenvolvimento', 'analise',
-            'proposta', 'orcamento', 'contrato', 'negociacao', 'cliente', 'fornecedor',
-            'colaboracao', 'equipe', 'time', 'departamento', 'gerencia', 'diretoria',
-            'solucao', 'problema', 'discussao', 'feedback', 'revisao', 'aprovacao'
-        }
-        
-        self.unproductive_keywords = {
-            'spam', 'promocao', 'desconto', 'oferta', 'gratis', 'ganhe', 'premio',
-            'promotion', 'discount', 'offer', 'free', 'win', 'prize', 'lottery',
-            'clique', 'click', 'urgente', 'urgent', 'limitado', 'limited',
-            'exclusivo', 'exclusive', 'oportunidade', 'opportunity', 'dinheiro',
-            'money', 'renda', 'income', 'investimento', 'investment', 'lucro',
-            'profit', 'ganhar', 'earn', 'facil', 'easy', 'rapido', 'quick',
-            'compre', 'buy', 'venda', 'sale', 'barato', 'cheap', 'economize'
-        }
-        
-        logger.info(f"EmailClassifier initialized. AI Model: {'Enabled' if self.use_ai_model else 'Disabled'}")
-
-    def _initialize_ai_model(self):
-        """Initialize the AI model for zero-shot classification"""
-        try:
-            logger.info("Initializing AI classification model...")
-            # Usando o modelo  que é mais pequeno e adequado para o plano gratuito
-            model_name = "facebook/bart-large-mnli"
-            self.ai_classifier = pipeline(
-                "zero-shot-classification",
-                model=model_name,
-                device=-1,  # Força o uso de CPU
-                cache_dir=hf_cache_dir  # Força o cache para a pasta com permissão
-            )
-            
-            logger.info(f"AI model '{model_name}' loaded successfully")
-            return True
-            
-        except Exception as e:
-            logger.warning(f"Failed to initialize AI model: {e}")
-            logger.info("Falling back to keyword-based classification")
-            return False
-
-    def preprocess_text(self, text: str) -> List[str]:
-        """Preprocess email text for classification"""
-        text = text.lower()
-        
-        text = re.sub(r'[^a-záàâãéèêíïóôõöúçñ\s]', ' ', text)
-        
-        tokens = word_tokenize(text, language='portuguese')
-        
-        processed_tokens = []
-        for token in tokens:
-            if token not in self.stop_words and len(token) > 2:
-                stemmed_token = self.stemmer.stem(token)
-                processed_tokens.append(stemmed_token)
-        
-        return processed_tokens
-
+classifier = EmailClassifier(startup_timings={'imports': time.perf_counter() - _import_start})
 
-    def classify_with_ai(self, content: str) -> Dict:
-        """Classify email using AI model"""
-        try:
-            # RÓTULOS FINAIS E OTIMIZADOS
-            candidate_labels = [
-                "E-mail de trabalho sobre tarefa, projeto ou reunião",
-                "E-mail de marketing, spam, propaganda ou anúncio"
-            ]
-            
-            result = self.ai_classifier(content, candidate_labels, multi_label=False)
-            
-            # Adicione este log para depuração
-            logger.info(f"AI Model Raw Output: {result}")
-            
-            top_label = result['labels'][0]
-            confidence = result['scores'][0]
-            
-            if top_label == candidate_labels[0]:
-                category = "Produtivo"
-            else:
-                category = "Improdutivo"
-            
-            tokens = self.preprocess_text(content)
-            if category == "Produtivo":
-                found_keywords = self.find_keywords(tokens, self.productive_keywords)
-            else:
-                found_keywords = self.find_keywords(tokens, self.unproductive_keywords)
-            
-            return {
-                "category": category,
-                "confidence": confidence,
-                "method": "AI",
-                "found_keywords": found_keywords[:10]
-            }
-            
-        except Exception as e:
-            logger.error(f"AI classification failed: {e}")
-            return self.classify_with_keywords(content)
-
-    def classify_with_keywords(self, content: str) -> Dict:
-        """Fallback keyword-based classification"""
-        tokens = self.preprocess_text(content)
-        found_productive = self.find_keywords(tokens, self.productive_keywords)
-        found_unproductive = self.find_keywords(tokens, self.unproductive_keywords)
-        
-        productive_score = len(found_productive)
-        unproductive_score = len(found_unproductive)
-        
-        if productive_score > unproductive_score:
-            category = "Produtivo"
-            confidence = min(0.95, max(0.6, (productive_score + 1) / (productive_score + unproductive_score + 2)))
-            found_keywords = found_productive
-        elif unproductive_score > productive_score:
-            category = "Improdutivo"
-            confidence = min(0.95, max(0.6, (unproductive_score + 1) / (productive_score + unproductive_score + 2)))
-            found_keywords = found_unproductive
-        else:
-            category = "Produtivo"
-            confidence = 0.5
-            found_keywords = found_productive if found_productive else []
-        
-        return {
-            "category": category,
-            "confidence": confidence,
-            "method": "Keywords",
-            "found_keywords": found_keywords[:10]  
-        }
+if config.STARTUP_MODE == 'lazy':
+    # Em modo lazy o modelo carrega em segundo plano em cada processo que serve
+    # pedidos: nos workers do gunicorn logo após o fork, ou no primeiro pedido.
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=classifier.start_background_load)
 
+    @app.before_request
+    def _ensure_model_loading():
+        classifier.start_background_load()
 
-    def classify_email(self, content: str) -> Dict:
-        """Main classification method with Hybrid Logic"""
-        start_time = datetime.now()
-        
-        logger.info(f"Classifying email with {len(content)} characters")
-        
-        # PASSO 1: Classificação inicial com IA
-        if self.use_ai_model:
-            classification_result = self.classify_with_ai(content)
-        else:
-            classification_result = self.classify_with_keywords(content)
-        
-        # PASSO 2: LÓGICA HÍBRIDA (REDE DE SEGURANÇA)
-
-        # para garantir que não seja um spam disfarçado.
-        if classification_result["category"] == "Produtivo" and classification_result["method"] == "AI":
-            # Palavras-chave de spam de alta certeza (PT e EN, incluindo expressões compostas)
-            spam_triggers = {
-                'investimento', 'renda', 'lucro', 'ganhar dinheiro', 'gratis', 'oportunidade unica', 'clique aqui', 'promocao',
-                'lottery', 'prize', 'winner', 'click here', 'urgent', 'confidential', 'agent', 'claim your prize', 'selected as a winner',
-                'contact our agent', 'provide your details', 'annual international lottery', 'you have won', 'usd', 'premio', 'ganhe', 'oferta'
-            }
-            content_lower = content.lower()
-            
-            # Se alguma palavra-gatilho de spam for encontrada...
-            if any(trigger in content_lower for trigger in spam_triggers):
-                logger.info("Hybrid Logic Triggered: AI classified as Productive, but spam keywords were found. Overriding to Improductive.")
-                # Inverte a classificação para Improdutivo
-                classification_result["category"] = "Improdutivo"
-                # Inverte a confiança para refletir a certeza da regra
-                classification_result["confidence"] = 0.95 
-                classification_result["method"] = "AI + Hybrid Rule"
-
-        suggested_response = self.generate_response(classification_result["category"], content)
-        
-        reasoning = self.generate_reasoning(
-            classification_result["category"], 
-            classification_result["found_keywords"],
-            classification_result["method"]
-        )
-        
-        processing_time = (datetime.now() - start_time).total_seconds()
-        
-        result = {
-            "category": classification_result["category"],
-            "confidence": classification_result["confidence"],
-            "suggestedResponse": suggested_response,
-            "reasoning": reasoning,
-            "processingTime": processing_time,
-            "highlightedKeywords": classification_result["found_keywords"],
-            "originalContent": content,
-            "classificationMethod": classification_result["method"]
-        }
-        
-        logger.info(f"Classification completed: {result['category']} "
-                f"({result['confidence']:.2f} confidence) "
-                f"in {processing_time:.2f}s using {result['classificationMethod']}")
-        
+if config.LOG_SAMPLE_RATE < 1:
+    @app.before_request
+    def _sample_request_logs():
+        # Decidido uma vez por pedido: um pedido amostrado mantém todas as suas linhas INFO
+        sample_request(config.LOG_SAMPLE_RATE)
+    
+    @app.teardown_request
+    def _reset_log_sampling(error=None):
+        reset_request_sampling()
+
+@app.before_request
+def _update_model_metric():
+    # Cada worker publica o seu próprio estado do modelo
+    metrics.set_model_loaded(classifier.model_state == 'ready')
+
+admission = None
+if config.ADMISSION_ENABLED:
+    # Criado antes do fork (preload_app): as vagas e os contadores são partilhados pelos workers.
+    # Sem ADMISSION_MAX_CONCURRENCY, o gunicorn reduz as vagas ao orçamento de threads dos workers.
+    admission = AdmissionController(
+        config.ADMISSION_MAX_CONCURRENCY or max(1, (os.cpu_count() or 1) // max(1, config.INFERENCE_THREADS)),
+        config.ADMISSION_MAX_QUEUE,
+        config.ADMISSION_QUEUE_TIMEOUT,
+        config.ADMISSION_DEFAULT_MODEL_SECONDS
+    )
+    metrics.register_admission(admission)
+    app.extensions['admission'] = admission
+
+def _request_deadline() -> Optional[float]:
+    """time.monotonic() deadline from the client's remaining-budget header, if sent"""
+    value = request.headers.get(config.DEADLINE_HEADER)
+    if not value:
+        return None
+    try:
+        return time.monotonic() + float(value) / 1000
+    except ValueError:
+        return None
+
+def _classify_contents(contents: List[str], fields: Set[str], use_model: bool = True) -> List[Dict]:
+    if len(contents) == 1:
+        return [classifier.classify_email(contents[0], fields, use_model=use_model)]
+    return classifier.classify_emails(contents, fields, use_model=use_model)
+
+def _admitted_classify(contents: List[str], fields: Set[str], deadline: Optional[float]) -> Tuple[List[Dict], List[bool]]:
+    """Classify through admission control; returns the results and, for each, whether it is _reusable"""
+    if admission is None or not classifier.use_ai_model:
+        results = _classify_contents(contents, fields)
+        return results, [_reusable(result, True) for result in results]
+    
+    with admission.admit(deadline, len(contents)) as use_model:
+        if not use_model:
+            logger.warning("Deadline too short for the model, classifying %d email(s) with keywords", len(contents))
+            g.classification_degraded = True
+        results = _classify_contents(contents, fields, use_model)
+        return results, [_reusable(result, use_model) for result in results]
+
+@app.after_request
+def _mark_degraded(response):
+    if g.get('classification_degraded'):
+        response.headers['X-Classification-Degraded'] = 'keywords'
+    return response
+
+@app.errorhandler(Overloaded)
+def overloaded(error):
+    logger.warning("Request shed: %s", error)
+    response = jsonify({'error': 'Server overloaded, please retry later', 'retryAfter': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(error):
+    logger.warning("Request shed: %s", error)
+    return jsonify({'error': str(error)}), 503
+
+result_cache = None
+if config.RESULT_CACHE_ENABLED:
+    result_cache = ResultCache(config.RESULT_CACHE_PATH, config.RESULT_CACHE_MAX_ENTRIES, config.RESULT_CACHE_TTL)
+
+near_duplicates = None
+if config.NEAR_DUPLICATE_ENABLED:
+    near_duplicates = NearDuplicateIndex(config.NEAR_DUPLICATE_THRESHOLD, config.NEAR_DUPLICATE_MAX_ENTRIES,
+                                         config.NEAR_DUPLICATE_TTL, config.NEAR_DUPLICATE_MIN_TOKENS)
+
+def _cache_requested(data: Dict) -> bool:
+    """Whether the request allows reusing results (body "cache" or ?cache= flag)"""
+    if result_cache is None and near_duplicates is None:
+        return False
+    flag = data.get('cache', request.args.get('cache', True))
+    if isinstance(flag, str):
+        return flag.lower() not in ('false', '0', 'no')
+    return bool(flag)
+
+# Campos devolvidos no modo compacto (?compact=true)
+COMPACT_FIELDS = ('category', 'confidence')
+
+def _requested_fields(data: Dict) -> Optional[Set[str]]:
+    """Fields selected with "fields" (list or comma-separated) or "compact"; None means all.
+    
+    Raises ValueError for unknown field names.
+    """
+    fields = data.get('fields', request.args.get('fields'))
+    if fields is None:
+        compact = data.get('compact', request.args.get('compact', False))
+        if isinstance(compact, str):
+            compact = compact.lower() in ('true', '1', 'yes')
+        return set(COMPACT_FIELDS) if compact else None
+    
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    fields = {str(field).strip() for field in fields if str(field).strip()}
+    unknown = fields - set(RESPONSE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))} (valid: {', '.join(RESPONSE_FIELDS)})")
+    return fields
+
+def _select_fields(result: Dict, fields: Optional[Set[str]]) -> Dict:
+    if fields is None or 'error' in result:
         return result
+    return {key: value for key, value in result.items() if key in fields}
 
-    def generate_response(self, category: str, content: str) -> str:
-        """Generate appropriate response based on classification"""
-        if category == "Produtivo":
-            content_lower = content.lower()
-            
-            if any(word in content_lower for word in ['reuniao', 'meeting', 'encontro', 'agenda']):
-                return """Obrigado pelo seu email.
-
-Recebi sua solicitação de reunião e vou verificar minha agenda. Retornarei em breve com minha disponibilidade.
-
-Caso seja urgente, não hesite em entrar em contato por telefone.
-
-Atenciosamente,
-[Seu Nome]"""
-            
-            elif any(word in content_lower for word in ['projeto', 'project', 'proposta', 'desenvolvimento']):
-                return """Obrigado pelo contato.
-
-Recebi as informações sobre o projeto e vou analisar os detalhes fornecidos. Retornarei com um feedback detalhado em até 2 dias úteis.
-
-Caso tenha alguma dúvida adicional, fique à vontade para entrar em contato.
-
-Atenciosamente,
-[Seu Nome]"""
-            
-            elif any(word in content_lower for word in ['relatorio', 'report', 'analise', 'documento']):
-                return """Obrigado pelo envio.
+def _cache_key(content: str) -> str:
+    """Cache key for the content under the current model and keyword sets"""
+    return ResultCache.make_key(content, classifier.model_version, classifier.keyword_index.fingerprint)
 
-Recebi o documento e vou proceder com a análise. Caso tenha alguma observação específica ou prazo para retorno, por favor me informe.
+def _from_cache(content: str, cached: Dict, start_time: datetime) -> Dict:
+    """Rebuild a full response from a cached result"""
+    cached['originalContent'] = content
+    cached['processingTime'] = (datetime.now() - start_time).total_seconds()
+    return cached
 
-Retornarei com meus comentários em breve.
+def _to_cache(key: str, result: Dict):
+    """Store a result without echoing the content back into the cache"""
+    if result_cache is not None:
+        result_cache.set(key, {k: v for k, v in result.items() if k != 'originalContent'})
 
-Atenciosamente,
-[Seu Nome]"""
-            
-            elif any(word in content_lower for word in ['prazo', 'deadline', 'entrega', 'urgente']):
-                return """Obrigado pelo contato.
+def _reusable(result: Dict, used_model: bool) -> bool:
+    """Whether a fresh result may be cached or reused for near-duplicates.
+    
+    Only results the configured pipeline produced as intended qualify: not
+    errors, not keyword results forced by the admission deadline (used_model
+    False), and not the keyword fallback of a failed model call, which would
+    otherwise stay under the model's cache key for the whole TTL. Removes the
+    classifier's private fallback marker from the result.
+    """
+    ai_fallback = result.pop(AI_FALLBACK_FIELD, False)
+    return used_model and not ai_fallback and 'error' not in result
+
+def _cached(key: str) -> Optional[Dict]:
+    return result_cache.get(key) if result_cache is not None else None
+
+# Campos que dependem do texto do email e são gerados de novo ao reutilizar um resultado
+_CONTENT_FIELDS = ('originalContent', 'suggestedResponse', 'reasoning')
+
+def _find_near_duplicate(content: str) -> Tuple[Optional[int], Optional[Dict]]:
+    """SimHash of the content and, when a recent near-identical email was classified, its result"""
+    if near_duplicates is None:
+        return None, None
+    fingerprint = near_duplicates.fingerprint(classifier.preprocess_text(content))
+    if fingerprint is None:
+        return None, None
+    
+    found = near_duplicates.find(fingerprint, _index_version())
+    metrics.NEAR_DUPLICATE_LOOKUPS.labels(outcome='reused' if found else 'miss').inc()
+    if found is None:
+        return fingerprint, None
+    
+    result, similarity = found
+    logger.info("Near-duplicate reuse (similarity %.2f)", similarity)
+    result['classificationMethod'] = f"{result['classificationMethod']} + Near-duplicate"
+    return fingerprint, result
 
-Entendi a urgência da solicitação e vou priorizar esta demanda. Retornarei com uma resposta o mais breve possível.
+def _remember_near_duplicate(fingerprint: Optional[int], result: Dict):
+    if fingerprint is not None and 'error' not in result:
+        near_duplicates.add(fingerprint, _index_version(),
+                            {k: v for k, v in result.items() if k not in _CONTENT_FIELDS})
 
-Caso precise de esclarecimentos adicionais, estou à disposição.
+def _index_version() -> str:
+    return f"{classifier.model_version}:{classifier.keyword_index.fingerprint}"
 
-Atenciosamente,
-[Seu Nome]"""
-            
+def classify_with_cache(content: str, use_cache: bool, fields: Set[str] = None, deadline: float = None) -> Dict:
+    """Classify one email, reusing the shared cached result when available.
+    
+    suggestedResponse and reasoning are only generated when `fields` asks for them.
+    Cache misses go through admission control.
+    """
+    if not use_cache:
+        result = _admitted_classify([content], fields, deadline)[0][0]
+    else:
+        start_time = datetime.now()
+        key = _cache_key(content)
+        cached = _cached(key)
+        if cached is not None:
+            logger.info("Result cache hit")
+            # A entrada pode ter sido gravada por um pedido compacto, sem os textos gerados
+            result = classifier.add_generated_fields(content, _from_cache(content, cached, start_time), fields)
+        else:
+            fingerprint, reused = _find_near_duplicate(content)
+            if reused is not None:
+                result = classifier.add_generated_fields(content, _from_cache(content, reused, start_time), fields)
+                _to_cache(key, result)
             else:
-                return """Obrigado pelo seu email.
-
-Recebi sua mensagem e vou analisar as informações fornecidas. Retornarei com uma resposta detalhada em breve.
-
-Caso seja urgente, não hesite em entrar em contato por telefone.
-
-Atenciosamente,
-[Seu Nome]"""
-        
-        else:  # Improdutivo
-            return """Obrigado pelo contato.
-
-No momento, não tenho interesse na proposta apresentada. Caso tenha algo mais específico relacionado ao meu trabalho, fique à vontade para entrar em contato novamente.
-
-Para remover meu email de sua lista de contatos, responda com "REMOVER" no assunto.
-
-Atenciosamente,
-[Seu Nome]"""
-
-    def generate_reasoning(self, category: str, found_keywords: List[str], method: str) -> str:
-        """Generate reasoning for the classification"""
-        
-        if category == "Produtivo":
-            reasoning = f"""Este email foi classificado como PRODUTIVO usando {method}.
-
-Indicadores encontrados:
-• {len(found_keywords)} palavras-chave relacionadas a trabalho e produtividade"""
-            
-            if found_keywords:
-                reasoning += f"\n• Palavras identificadas: {', '.join(found_keywords[:5])}"
-                if len(found_keywords) > 5:
-                    reasoning += f" (e mais {len(found_keywords) - 5})"
-            
-            reasoning += "\n\nA análise identificou termos associados a atividades profissionais, projetos, reuniões ou assuntos corporativos relevantes, indicando que este email requer atenção e resposta adequada."
+                results, reusable = _admitted_classify([content], fields, deadline)
+                result = results[0]
+                # Resultados degradados para palavras-chave não ficam no cache do modelo
+                if reusable[0]:
+                    _to_cache(key, result)
+                    _remember_near_duplicate(fingerprint, result)
+    
+    metrics.record_classification(content, result)
+    return result
+
+def classify_batch_with_cache(contents: List[str], use_cache: bool, fields: Set[str] = None,
+                              deadline: float = None) -> List[Dict]:
+    """Classify a batch, sending only the cache misses through the model"""
+    if not use_cache:
+        results = _admitted_classify(contents, fields, deadline)[0]
+        for content, result in zip(contents, results):
+            metrics.record_classification(content, result)
+        return results
+    
+    start_time = datetime.now()
+    keys = [_cache_key(content) for content in contents]
+    results = [_cached(key) for key in keys]
+    hits = sum(1 for result in results if result is not None)
+    fingerprints = [None] * len(contents)
+    
+    for index, result in enumerate(results):
+        if result is None:
+            fingerprints[index], result = _find_near_duplicate(contents[index])
+            if result is None:
+                continue
+            _to_cache(keys[index], result)
+        results[index] = classifier.add_generated_fields(
+            contents[index], _from_cache(contents[index], result, start_time), fields)
+    
+    misses = [index for index, result in enumerate(results) if result is None]
+    if misses:
+        miss_results, reusable = _admitted_classify([contents[index] for index in misses], fields, deadline)
+        for index, result, result_reusable in zip(misses, miss_results, reusable):
+            if result_reusable:
+                _to_cache(keys[index], result)
+                _remember_near_duplicate(fingerprints[index], result)
+            results[index] = result
+    
+    logger.info("Result cache - Batch hits: %d, Near-duplicates: %d, Misses: %d",
+                hits, len(contents) - hits - len(misses), len(misses))
+    for content, result in zip(contents, results):
+        metrics.record_classification(content, result)
+    return results
+
+def classify_batch_items(emails: List, use_cache: bool, fields: Set[str] = None, deadline: float = None) -> Dict:
+    """Validate and classify the items of a batch; one result (or error) per item, in order"""
+    # Cada item pode ser uma string ou um objeto no formato do /classify
+    results = [None] * len(emails)
+    valid_indexes = []
+    valid_contents = []
+    for index, item in enumerate(emails):
+        content = item.get('content') if isinstance(item, dict) else item
         
+        if not isinstance(content, str):
+            results[index] = {'error': 'Email content is required'}
+        elif len(content.strip()) < config.MIN_CONTENT_LENGTH:
+            results[index] = {'error': f'Email content too short for classification (minimum {config.MIN_CONTENT_LENGTH} characters)'}
         else:
-            reasoning = f"""Este email foi classificado como IMPRODUTIVO usando {method}.
-
-Indicadores encontrados:
-• {len(found_keywords)} palavras-chave relacionadas a spam/promoções"""
-            
-            if found_keywords:
-                reasoning += f"\n• Palavras identificadas: {', '.join(found_keywords[:5])}"
-                if len(found_keywords) > 5:
-                    reasoning += f" (e mais {len(found_keywords) - 5})"
-            
-            reasoning += "\n\nA análise identificou padrões típicos de emails promocionais, spam ou conteúdo não relacionado a atividades profissionais, sugerindo que pode ser tratado com menor prioridade."
-        
-        return reasoning
-
-    def find_keywords(self, tokens, keyword_set):
-        """Identifica palavras-chave usando stemming e correspondência parcial"""
-        found = set()
-        for token in tokens:
-            for kw in keyword_set:
-                # Stemming para ambos
-                stemmed_kw = self.stemmer.stem(kw)
-                if stemmed_kw in token or token in stemmed_kw:
-                    found.add(kw)
-                # Correspondência parcial (substring)
-                elif kw in token or token in kw:
-                    found.add(kw)
-        return list(found)
-
-classifier = EmailClassifier()
+            valid_indexes.append(index)
+            valid_contents.append(content)
+    
+    if valid_contents:
+        batch_results = classify_batch_with_cache(valid_contents, use_cache, fields, deadline)
+        for index, result in zip(valid_indexes, batch_results):
+            results[index] = _select_fields(result, fields)
+    
+    failed = sum(1 for result in results if 'error' in result)
+    
+    logger.info("Batch classification completed - Succeeded: %d, Failed: %d", len(results) - failed, failed)
+    
+    return {
+        'results': results,
+        'total': len(results),
+        'succeeded': len(results) - failed,
+        'failed': failed
+    }
 
 @app.route('/classify', methods=['POST'])
 def classify_email():
@@ -381,23 +406,329 @@ def classify_email():
         content = data['content']
         
         if len(content.strip()) < 10:
-            logger.warning(f"Content too short: {len(content)} characters")
+            logger.warning("Content too short: %d characters", len(content))
             return jsonify({'error': 'Email content too short for classification (minimum 10 characters)'}), 400
         
+        try:
+            fields = _requested_fields(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         source = data.get('source', 'unknown')
         filename = data.get('filename', 'N/A')
-        logger.info(f"Classification request - Source: {source}, Filename: {filename}, Length: {len(content)}")
+        logger.info("Classification request - Source: %s, Filename: %s, Length: %d", source, filename, len(content))
         
-        result = classifier.classify_email(content)
+        result = classify_with_cache(content, _cache_requested(data), fields, _request_deadline())
         
-        logger.info(f"Classification successful - Category: {result['category']}, Confidence: {result['confidence']:.2f}")
+        logger.info("Classification successful - Category: %s, Confidence: %.2f", result['category'], result['confidence'])
         
-        return jsonify(result)
+        return jsonify(_select_fields(result, fields))
+    
+    except (Overloaded, DeadlineExceeded):
+        raise
+    
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
     
     except Exception as e:
-        logger.error(f"Classification failed: {str(e)}", exc_info=True)
+        logger.error("Classification failed: %s", e, exc_info=True)
         return jsonify({'error': f'Classification failed: {str(e)}'}), 500
 
+@app.route('/classify/batch', methods=['POST'])
+def classify_email_batch():
+    """Endpoint to classify a list of emails in a single batched call"""
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('emails'), list):
+            logger.warning("Batch classification request missing emails list")
+            return jsonify({'error': 'A list of emails is required'}), 400
+        
+        emails = data['emails']
+        
+        if not emails:
+            return jsonify({'error': 'The emails list is empty'}), 400
+        
+        if len(emails) > config.MAX_BATCH_ITEMS:
+            logger.warning("Batch too large: %d emails", len(emails))
+            return jsonify({'error': f'Too many emails in batch (maximum {config.MAX_BATCH_ITEMS})'}), 400
+        
+        try:
+            fields = _requested_fields(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.info("Batch classification request - Emails: %d", len(emails))
+        
+        return jsonify(classify_batch_items(emails, _cache_requested(data), fields, _request_deadline()))
+    
+    except (Overloaded, DeadlineExceeded):
+        raise
+    
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    
+    except Exception as e:
+        logger.error("Batch classification failed: %s", e, exc_info=True)
+        return jsonify({'error': f'Batch classification failed: {str(e)}'}), 500
+
+# Texto extraído de um documento: só o que cabe no orçamento de tokens do modelo
+UPLOAD_MAX_TEXT_CHARS = config.UPLOAD_MAX_TEXT_CHARS or config.MAX_INPUT_TOKENS * MAX_CHARS_PER_TOKEN
+
+@app.route('/classify/upload', methods=['POST'])
+def classify_upload():
+    """Endpoint to classify an uploaded .pdf, .eml or .txt document (multipart/form-data).
+    
+    The upload is spooled to a temp file as it arrives and text is extracted
+    page by page (PDF) or part by part (EML) only up to the model's token budget.
+    """
+    if request.mimetype != 'multipart/form-data' or not request.mimetype_params.get('boundary'):
+        return jsonify({'error': 'A multipart/form-data upload with a .pdf, .eml or .txt file is required'}), 400
+    
+    upload = None
+    try:
+        upload = spool_upload(request.stream, request.mimetype_params['boundary'], config.MAILBOX_CHUNK_SIZE,
+                              config.UPLOAD_MAX_BYTES, config.UPLOAD_SPOOL_MEMORY_BYTES)
+        
+        try:
+            fields = _requested_fields(upload.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        content, document = extract_document(upload, UPLOAD_MAX_TEXT_CHARS, config.MAILBOX_CHUNK_SIZE)
+        
+        logger.info("Upload classification request - Filename: %s, Type: %s, Size: %d, Extracted: %d chars",
+                    document['filename'], document['type'], document['size'], document['extractedChars'])
+        
+        if len(content.strip()) < config.MIN_CONTENT_LENGTH:
+            return jsonify({'error': 'Document text too short for classification', 'document': document}), 400
+        
+        result = classify_with_cache(content, _cache_requested(upload.form), fields, _request_deadline())
+        
+        logger.info("Classification successful - Category: %s, Confidence: %.2f", result['category'], result['confidence'])
+        
+        response = _select_fields(result, fields)
+        response['document'] = document
+        return jsonify(response)
+    
+    except UnsupportedDocument as e:
+        return jsonify({'error': str(e)}), 415
+    
+    except (Overloaded, DeadlineExceeded):
+        raise
+    
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    
+    except Exception as e:
+        logger.error("Upload classification failed: %s", e, exc_info=True)
+        return jsonify({'error': f'Classification failed: {str(e)}'}), 500
+    
+    finally:
+        if upload is not None:
+            upload.close()
+
+@app.route('/classify/mailbox', methods=['POST'])
+def classify_mailbox():
+    """Endpoint to classify a whole mailbox streamed as mbox or multi-.eml upload.
+    
+    Messages are parsed incrementally from the request stream and one result
+    per message is streamed back (NDJSON, or SSE with Accept: text/event-stream)
+    as soon as it is classified, while the upload is still being read.
+    At most MAILBOX_MAX_MESSAGES are classified; the rest of the archive is
+    left unread and the final line says so.
+    """
+    if request.mimetype == 'multipart/form-data':
+        boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            return jsonify({'error': 'Multipart upload without boundary'}), 400
+        messages = iter_multipart_messages(request.stream, boundary, config.MAILBOX_CHUNK_SIZE,
+                                           config.MAILBOX_MAX_MESSAGE_BYTES)
+    else:
+        messages = iter_mbox_messages(request.stream, config.MAILBOX_CHUNK_SIZE, config.MAILBOX_MAX_MESSAGE_BYTES)
+    
+    use_sse = request.args.get('format') == 'sse' or request.accept_mimetypes.best == 'text/event-stream'
+    use_cache = _cache_requested(request.args)
+    try:
+        fields = _requested_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    logger.info("Mailbox classification request - Content-Type: %s, SSE: %s", request.mimetype, use_sse)
+    
+    def encode(payload: Dict) -> str:
+        line = json.dumps(payload, ensure_ascii=False)
+        return f"data: {line}\n\n" if use_sse else line + "\n"
+    
+    def generate() -> Iterator[str]:
+        total = failed = 0
+        truncated = False
+        pending = []
+        
+        def flush():
+            nonlocal failed
+            valid = [item for item in pending if 'error' not in item]
+            try:
+                results = classify_batch_with_cache([item['content'] for item in valid], use_cache, fields) if valid else []
+            except Overloaded as e:
+                results = [{'error': f'Server overloaded, retry after {e.retry_after}s'}] * len(valid)
+            for item, result in zip(valid, results):
+                item['result'] = result
+            for item in pending:
+                result = item.pop('result', None)
+                item.pop('content', None)
+                if result is not None and 'error' not in result:
+                    result.pop('originalContent', None)
+                    item['result'] = _select_fields(result, fields)
+                else:
+                    item['error'] = item.get('error') or result['error']
+                    failed += 1
+                yield encode(item)
+            pending.clear()
+        
+        try:
+            for filename, message in messages:
+                if config.MAILBOX_MAX_MESSAGES and total >= config.MAILBOX_MAX_MESSAGES:
+                    truncated = True
+                    break
+                item = {
+                    'index': total,
+                    'filename': filename,
+                    'messageId': message.get('message-id'),
+                    'subject': message.get('subject'),
+                    'from': message.get('from')
+                }
+                total += 1
+                
+                try:
+                    content = extract_text(message)
+                except Exception as e:
+                    content = ''
+                    item['error'] = f'Could not extract message text: {str(e)}'
+                
+                if 'error' not in item:
+                    if len(content.strip()) < config.MIN_CONTENT_LENGTH:
+                        item['error'] = 'Email content too short for classification'
+                    else:
+                        item['content'] = content
+                
+                pending.append(item)
+                if len(pending) >= config.MAILBOX_BATCH_SIZE:
+                    yield from flush()
+            
+            yield from flush()
+        except Exception as e:
+            logger.error("Mailbox classification failed: %s", e, exc_info=True)
+            yield encode({'error': f'Mailbox classification failed: {str(e)}'})
+        
+        logger.info("Mailbox classification completed - Messages: %d, Failed: %d, Truncated: %s", total, failed, truncated)
+        summary = {'done': True, 'total': total, 'succeeded': total - failed, 'failed': failed}
+        if truncated:
+            summary['truncated'] = True
+            summary['error'] = (f'Mailbox limit of {config.MAILBOX_MAX_MESSAGES} messages reached; '
+                                'send larger archives in parts or through POST /jobs')
+        yield encode(summary)
+    
+    mimetype = 'text/event-stream' if use_sse else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
+def _run_job(payload: Dict) -> Dict:
+    """Classify a queued job (runner thread, outside any request)"""
+    fields = set(payload['fields']) if payload.get('fields') is not None else None
+    with app.app_context():
+        try:
+            if 'emails' in payload:
+                return classify_batch_items(payload['emails'], payload['cache'], fields)
+            return _select_fields(classify_with_cache(payload['content'], payload['cache'], fields), fields)
+        except Overloaded as e:
+            # Sem cliente à espera: o job volta para a fila em vez de falhar
+            raise RetryLater(e.retry_after)
+
+job_queue = None
+job_runner = None
+if config.JOBS_ENABLED:
+    job_queue = JobQueue(config.JOBS_DB_PATH, config.JOBS_RESULT_TTL, config.JOBS_LEASE_SECONDS,
+                         config.JOBS_MAX_ATTEMPTS)
+    job_runner = JobRunner(job_queue, _run_job, config.JOBS_RUNNER_THREADS, config.JOBS_POLL_INTERVAL,
+                           config.JOBS_CALLBACK_HOSTS)
+    # O gunicorn para o runner no worker_exit através da app já carregada (gunicorn.conf.py)
+    app.extensions['job_runner'] = job_runner
+    
+    # Cada processo que serve pedidos drena a fila: nos workers do gunicorn logo
+    # após o fork, ou no primeiro pedido (python app.py)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=job_runner.start)
+    
+    @app.before_request
+    def _ensure_job_runner():
+        job_runner.start()
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Endpoint to queue a classification (single email or batch) and return its job id right away"""
+    if job_queue is None:
+        return jsonify({'error': 'Asynchronous jobs are disabled (JOBS_ENABLED=false)'}), 503
+    
+    try:
+        data = request.get_json()
+        
+        if not data or ('content' not in data and 'emails' not in data):
+            return jsonify({'error': 'Email content or a list of emails is required'}), 400
+        
+        if 'emails' in data:
+            emails = data['emails']
+            if not isinstance(emails, list) or not emails:
+                return jsonify({'error': 'A non-empty list of emails is required'}), 400
+            if len(emails) > config.MAX_BATCH_ITEMS:
+                return jsonify({'error': f'Too many emails in batch (maximum {config.MAX_BATCH_ITEMS})'}), 400
+            payload = {'emails': emails}
+        else:
+            content = data['content']
+            if not isinstance(content, str) or len(content.strip()) < config.MIN_CONTENT_LENGTH:
+                return jsonify({'error': f'Email content too short for classification (minimum {config.MIN_CONTENT_LENGTH} characters)'}), 400
+            payload = {'content': content}
+        
+        try:
+            fields = _requested_fields(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        callback_url = data.get('callbackUrl')
+        if callback_url is not None and (not isinstance(callback_url, str) or not job_runner.allowed_callback(callback_url)):
+            return jsonify({'error': f"callbackUrl must be an http(s) URL on one of: {', '.join(config.JOBS_CALLBACK_HOSTS)}"}), 400
+        
+        payload['fields'] = sorted(fields) if fields is not None else None
+        payload['cache'] = _cache_requested(data)
+        
+        job_id = job_queue.enqueue(payload, callback_url)
+        job_runner.notify()
+        
+        logger.info("Job %s queued - Emails: %d, Callback: %s", job_id, len(payload.get('emails', [None])), bool(callback_url))
+        
+        status_url = f'/jobs/{job_id}'
+        response = jsonify({'jobId': job_id, 'status': 'queued', 'statusUrl': status_url})
+        response.headers['Location'] = status_url
+        return response, 202
+    
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    
+    except Exception as e:
+        logger.error("Job creation failed: %s", e, exc_info=True)
+        return jsonify({'error': f'Job creation failed: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Endpoint with the status of a job and, once finished, its result or error"""
+    if job_queue is None:
+        return jsonify({'error': 'Asynchronous jobs are disabled (JOBS_ENABLED=false)'}), 503
+    
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -407,12 +738,56 @@ def health_check():
         'version': '2.0.0',
         'timestamp': datetime.now().isoformat(),
         'ai_model_enabled': classifier.use_ai_model,
-        'classification_method': 'AI + NLP' if classifier.use_ai_model else 'Keywords + NLP'
+        'model_state': classifier.model_state,
+        'classification_method': 'AI + NLP' if classifier.use_ai_model else 'Keywords + NLP',
+        'startup_timings': {name: round(seconds, 3) for name, seconds in classifier.startup_timings.items()},
+        'result_cache': result_cache.stats() if result_cache is not None else {'enabled': False},
+        'near_duplicates': near_duplicates.stats() if near_duplicates is not None else {'enabled': False},
+        'classification_mode': config.CLASSIFICATION_MODE,
+        'admission': admission.snapshot() if admission is not None else {'enabled': False},
+        'jobs': job_queue.stats() if job_queue is not None else {'enabled': False},
+        'logging': {'level': config.LOG_LEVEL, 'sample_rate': config.LOG_SAMPLE_RATE, 'dropped': dropped_records()},
+        'memory': {'mode': config.MODEL_MEMORY_MODE, **process_memory()}
     }
     
+    if config.CLASSIFICATION_MODE == 'cascade':
+        health_status['cascade'] = classifier.cascade_stats.snapshot()
+    
     logger.info("Health check requested")
     return jsonify(health_status)
 
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the process is up and answering"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe.
+    
+    The keyword engine serves traffic as soon as the process starts, so this is
+    ready even while the model loads. With ?require_model=true it only reports
+    ready once the AI model is loaded (with INFERENCE_MODE=server, once the
+    inference server answers a ping).
+    """
+    require_model = request.args.get('require_model', 'false').lower() == 'true'
+    ready = classifier.model_ready() or not require_model
+    
+    return jsonify({
+        'status': 'ready' if ready else 'not ready',
+        'model_state': classifier.model_state,
+        'classification_method': 'AI + NLP' if classifier.use_ai_model else 'Keywords + NLP'
+    }), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics, aggregated across all worker processes"""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics unavailable (set METRICS_ENABLED=true and install prometheus_client)'}), 503
+    
+    payload, content_type = metrics.render()
+    return Response(payload, content_type=content_type)
+
 @app.route('/info', methods=['GET'])
 def serve_frontend():
     """Root endpoint with API information"""
@@ -429,7 +804,15 @@ def serve_frontend():
         ],
         'endpoints': {
             'POST /classify': 'Classify email content',
+            'POST /classify/batch': 'Classify a list of emails in one batch',
+            'GET /metrics': 'Prometheus metrics (classifications, stage latencies, fallbacks, model state)',
+            'POST /classify/upload': 'Classify an uploaded .pdf, .eml or .txt document (multipart/form-data)',
+            'POST /classify/mailbox': 'Stream-classify an mbox or multi-.eml upload (NDJSON/SSE results)',
+            'POST /jobs': 'Queue an asynchronous classification (optional local callbackUrl)',
+            'GET /jobs/<id>': 'Status and result of an asynchronous job',
             'GET /health': 'Health check',
+            'GET /health/live': 'Liveness probe',
+            'GET /health/ready': 'Readiness probe',
             'GET /': 'API information'
         },
         'example_request': {
@@ -441,20 +824,26 @@ def serve_frontend():
 
 @app.errorhandler(404)
 def not_found(error):
-    logger.warning(f"404 error: {request.url}")
+    logger.warning("404 error: %s", request.url)
     return jsonify({'error': 'Endpoint not found'}), 404
 
 @app.errorhandler(500)
 def internal_error(error):
-    logger.error(f"500 error: {str(error)}")
+    logger.error("500 error: %s", error)
     return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
     debug = os.environ.get('DEBUG', 'True').lower() == 'true'
     
-    logger.info(f"Starting Email Classifier API on port {port}")
-    logger.info(f"Debug mode: {debug}")
-    logger.info(f"AI Model: {'Enabled' if classifier.use_ai_model else 'Disabled (using keywords)'}")
+    logger.info("Starting Email Classifier API on port %s", port)
+    logger.info("Debug mode: %s", debug)
+    logger.info("AI Model: %s", 'Enabled' if classifier.use_ai_model else 'Disabled (using keywords)')
+    
+    if config.STARTUP_MODE == 'lazy':
+        classifier.start_background_load()
+    
+    if job_runner is not None:
+        job_runner.start()
     
     app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=False)
\ No newline at end of file
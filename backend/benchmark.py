@@ -0,0 +1,268 @@
+"""
+Per-stage micro-benchmarks for the classification pipeline.
+
+Times each stage of EmailClassifier on its own (preprocess_text,
+find_keywords, classify_with_keywords, classify_with_ai, the hybrid spam
+rule, generate_response, generate_reasoning) plus the end-to-end
+classify_email, over a seeded synthetic PT/EN corpus in short, medium and
+long sizes. Reports ops/sec and latency percentiles and saves them as JSON
+so runs can be compared between commits.
+
+Usage:
+    python backend/benchmark.py --output bench.json [--no-model] [--compare baseline.json]
+
+With --compare, exits with status 1 if any stage's median latency is more
+than --max-regression slower than in the baseline file.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_config
+
+config = get_config()
+
+STAGES = ['preprocess_text', 'find_keywords', 'classify_with_keywords', 'classify_with_ai',
+          'hybrid_rule', 'generate_response', 'generate_reasoning', 'classify_email']
+
+# Número aproximado de palavras de cada tamanho de email
+SIZES = {'short': 25, 'medium': 150, 'long': 1500}
+
+PRODUCTIVE_SENTENCES = [
+    "Podemos agendar uma reunião na próxima semana para discutir o projeto?",
+    "Segue em anexo o relatório mensal para a sua revisão e aprovação.",
+    "O prazo de entrega do módulo foi adiado para sexta-feira.",
+    "Por favor revise a proposta do cliente antes da apresentação.",
+    "A equipe precisa do cronograma atualizado até amanhã.",
+    "Can we schedule a meeting to review the project budget?",
+    "Please find attached the contract draft for your approval.",
+    "The deadline for the quarterly report has moved to Thursday.",
+    "Let's discuss the delivery plan with the supplier next week.",
+    "I need your feedback on the presentation before the client call."
+]
+
+UNPRODUCTIVE_SENTENCES = [
+    "Promoção imperdível! Ganhe 50% de desconto em todos os produtos.",
+    "Parabéns, você ganhou um prêmio exclusivo, clique aqui para resgatar.",
+    "Oportunidade única de investimento com lucro garantido.",
+    "Renda extra fácil trabalhando de casa, cadastre-se já.",
+    "Oferta por tempo limitado, compre agora e economize.",
+    "Congratulations! You have won the international lottery.",
+    "Limited time offer: buy one get one free on all items.",
+    "Earn money fast from home, click here to start today.",
+    "Exclusive discount for subscribers only, act now.",
+    "Claim your free prize before this opportunity expires."
+]
+
+FILLER_SENTENCES = [
+    "Olá, tudo bem?",
+    "Espero que esteja tudo certo por aí.",
+    "Qualquer dúvida estou à disposição.",
+    "Hi, I hope you are doing well.",
+    "Let me know if you have any questions.",
+    "Obrigado desde já pela atenção."
+]
+
+
+def build_corpus(seed: int, emails_per_size: int) -> Dict[str, List[str]]:
+    """Seeded synthetic corpus: for each size, half productive and half unproductive emails"""
+    rng = random.Random(seed)
+    corpus = {}
+    for size, target_words in SIZES.items():
+        emails = []
+        for i in range(emails_per_size):
+            topic = PRODUCTIVE_SENTENCES if i % 2 == 0 else UNPRODUCTIVE_SENTENCES
+            sentences = []
+            words = 0
+            while words < target_words:
+                pool = topic if rng.random() < 0.7 else FILLER_SENTENCES
+                sentence = rng.choice(pool)
+                sentences.append(sentence)
+                words += len(sentence.split())
+            emails.append(' '.join(sentences))
+        corpus[size] = emails
+    return corpus
+
+
+def time_stage(func: Callable, inputs: List, min_time: float, min_iterations: int, warmup: int) -> Dict:
+    """Call func over inputs (cycling) and return ops/sec and latency percentiles in ms"""
+    for i in range(warmup):
+        func(inputs[i % len(inputs)])
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        i = 0
+        while i < min_iterations or time.perf_counter() - start < min_time:
+            item = inputs[i % len(inputs)]
+            call_start = time.perf_counter_ns()
+            func(item)
+            samples.append(time.perf_counter_ns() - call_start)
+            i += 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    samples.sort()
+    total_seconds = sum(samples) / 1e9
+
+    def percentile(p: float) -> float:
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))] / 1e6, 6)
+
+    return {
+        'iterations': len(samples),
+        'ops_per_sec': round(len(samples) / total_seconds, 2) if total_seconds else None,
+        'mean_ms': round(statistics.fmean(samples) / 1e6, 6),
+        'min_ms': round(samples[0] / 1e6, 6),
+        'p50_ms': percentile(50),
+        'p90_ms': percentile(90),
+        'p99_ms': percentile(99),
+        'max_ms': round(samples[-1] / 1e6, 6)
+    }
+
+
+def stage_functions(classifier, contents: List[str]) -> Dict[str, tuple]:
+    """(function, inputs) for every stage; inputs are prepared outside the timed call"""
+    matches = [classifier.scan_content(content) for content in contents]
+    tokens = [classifier.preprocess_text(content) for content in contents]
+    keyword_results = [classifier.classify_with_keywords(content, item_matches)
+                       for content, item_matches in zip(contents, matches)]
+
+    # A regra híbrida só atua sobre decisões Produtivas da IA
+    hybrid_inputs = [({'category': 'Produtivo', 'confidence': 0.8, 'method': 'AI', 'found_keywords': []}, item_matches)
+                     for item_matches in matches]
+
+    stages = {
+        'preprocess_text': (classifier.preprocess_text, contents),
+        'find_keywords': (lambda item_tokens: classifier.find_keywords(item_tokens, classifier.productive_keywords),
+                          tokens),
+        'classify_with_keywords': (classifier.classify_with_keywords, contents),
+        'hybrid_rule': (lambda item: classifier.apply_hybrid_rule(dict(item[0]), item[1]), hybrid_inputs),
+        'generate_response': (lambda item: classifier.generate_response(item[0], item[1]),
+                              [(result['category'], content) for result, content in zip(keyword_results, contents)]),
+        'generate_reasoning': (lambda result: classifier.generate_reasoning(result['category'], result['found_keywords'],
+                                                                           result['method']),
+                               keyword_results),
+        'classify_email': (classifier.classify_email, contents)
+    }
+    if classifier.use_ai_model:
+        stages['classify_with_ai'] = (classifier.classify_with_ai, contents)
+    return stages
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(classifier, stages: List[str], sizes: List[str], seed: int, emails_per_size: int,
+                   min_time: float, min_iterations: int, warmup: int) -> Dict:
+    corpus = build_corpus(seed, emails_per_size)
+    results: Dict[str, Dict[str, Dict]] = {}
+    for size in sizes:
+        available = stage_functions(classifier, corpus[size])
+        for stage in stages:
+            if stage not in available:
+                print(f"Skipping {stage} ({size}): AI model not available", file=sys.stderr)
+                continue
+            func, inputs = available[stage]
+            stats = time_stage(func, inputs, min_time, min_iterations, warmup)
+            results.setdefault(stage, {})[size] = stats
+            print(f"{stage:<24} {size:<7} {stats['ops_per_sec']:>12} ops/s  "
+                  f"p50 {stats['p50_ms']:.4f} ms  p99 {stats['p99_ms']:.4f} ms", file=sys.stderr)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'emails_per_size': emails_per_size,
+            'model': classifier.model_version if classifier.use_ai_model else None,
+            'classification_mode': config.CLASSIFICATION_MODE
+        },
+        'results': results
+    }
+
+
+def compare(baseline: Dict, current: Dict, max_regression: float) -> List[Dict]:
+    """Median-latency change of every stage/size present in both runs"""
+    rows = []
+    for stage, by_size in current['results'].items():
+        for size, stats in by_size.items():
+            reference = baseline.get('results', {}).get(stage, {}).get(size)
+            if not reference or not reference['p50_ms']:
+                continue
+            change = stats['p50_ms'] / reference['p50_ms'] - 1
+            rows.append({
+                'stage': stage,
+                'size': size,
+                'baseline_p50_ms': reference['p50_ms'],
+                'p50_ms': stats['p50_ms'],
+                'change': round(change, 4),
+                'regression': change > max_regression
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage micro-benchmarks of the classification pipeline')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    parser.add_argument('--seed', type=int, default=42, help='seed of the synthetic corpus')
+    parser.add_argument('--emails', type=int, default=20, help='emails per size')
+    parser.add_argument('--min-time', type=float, default=1.0, help='minimum seconds per stage and size')
+    parser.add_argument('--min-iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--no-model', action='store_true', help='do not load the AI model')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON from a previous run')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='allowed relative p50 slowdown against the baseline')
+    args = parser.parse_args()
+
+    # Sem modelo: o modo lazy nunca inicia o carregamento
+    config.STARTUP_MODE = 'lazy' if args.no_model else 'eager'
+    from classifier import EmailClassifier
+    classifier = EmailClassifier()
+
+    report = run_benchmarks(classifier, args.stages, args.sizes, args.seed, args.emails,
+                            args.min_time, args.min_iterations, args.warmup)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if not args.compare:
+        print(json.dumps(report, indent=2))
+        return
+
+    with open(args.compare, encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare(baseline, report, args.max_regression)
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['stage']:<24} {row['size']:<7} {row['baseline_p50_ms']:>10.3f} -> {row['p50_ms']:>10.3f} ms "
+              f"({row['change']:+.1%}){flag}")
+    sys.exit(1 if any(row['regression'] for row in rows) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Offline bulk classification of stored emails, without the HTTP API.
+
+Classifies a directory of .txt/.eml files or a JSONL file (one object per
+line with "content", or "title"/"body" as in requests.jsonl) with
+EmailClassifier, sharded across a process pool. Results are streamed to a
+JSONL file as they complete; the output file doubles as the checkpoint, so
+rerunning the same command after an interruption skips the emails already
+classified. Emails whose result was an error are classified again on resume.
+
+Usage:
+    python backend/bulk_classify.py INPUT --output results.jsonl [--workers 4] [--threads 1]
+
+Use --restart to re-score everything (e.g. after a keyword change) instead of
+resuming.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from email import policy
+from email.parser import BytesParser
+from typing import Dict, Iterator, List, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_config
+
+config = get_config()
+
+INPUT_EXTENSIONS = ('.txt', '.eml')
+
+# Classificador de cada processo do pool, criado pelo initializer
+_classifier = None
+
+
+def _init_worker(threads: int):
+    """Build one EmailClassifier per worker process, limited to `threads` CPU threads"""
+    global _classifier
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    # Sem servidor HTTP não há pedidos a atender enquanto o modelo carrega
+    config.STARTUP_MODE = 'eager'
+    from classifier import EmailClassifier
+    _classifier = EmailClassifier()
+
+
+def _classify_shard(shard: List[Tuple[str, str]]) -> List[Dict]:
+    """Classify one shard of (id, content) pairs in the worker process"""
+    from classifier import AI_FALLBACK_FIELD
+    # Mesma validação do /classify: textos curtos demais não chegam ao classificador
+    results = [None] * len(shard)
+    valid_indexes = []
+    valid_contents = []
+    for index, (_, content) in enumerate(shard):
+        if len(content.strip()) < config.MIN_CONTENT_LENGTH:
+            results[index] = {'error': f'Email content too short for classification (minimum {config.MIN_CONTENT_LENGTH} characters)'}
+        else:
+            valid_indexes.append(index)
+            valid_contents.append(content)
+
+    if valid_contents:
+        try:
+            classified = _classifier.classify_emails(valid_contents)
+        except Exception as e:
+            classified = [{'error': f'Classification failed: {str(e)}'}] * len(valid_contents)
+        for index, result in zip(valid_indexes, classified):
+            results[index] = result
+
+    records = []
+    for (item_id, _), result in zip(shard, results):
+        result = dict(result)
+        result.pop('originalContent', None)
+        result.pop(AI_FALLBACK_FIELD, None)
+        records.append({'id': item_id, **result})
+    return records
+
+
+def _read_email_file(path: str) -> str:
+    if path.endswith('.eml'):
+        from mailbox_stream import extract_text
+        with open(path, 'rb') as f:
+            return extract_text(BytesParser(policy=policy.default).parse(f))
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def _json_content(record: Dict) -> str:
+    if 'content' in record:
+        return str(record['content'])
+    title = str(record.get('title') or '')
+    body = str(record.get('body') or '')
+    return f"{title}\n\n{body}".strip() if title else body
+
+
+def iter_inputs(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (id, content) pairs from a directory of .txt/.eml files or a JSONL file"""
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(INPUT_EXTENSIONS):
+                    file_path = os.path.join(root, name)
+                    yield os.path.relpath(file_path, path), _read_email_file(file_path)
+        return
+
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            item_id = record.get('id', record.get('request_id', line_number))
+            yield str(item_id), _json_content(record)
+
+
+def count_inputs(path: str) -> int:
+    """Number of emails in the input, for progress reporting"""
+    if os.path.isdir(path):
+        return sum(1 for _, _, files in os.walk(path) for name in files if name.lower().endswith(INPUT_EXTENSIONS))
+    with open(path, encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """Ids already classified successfully in the output file.
+
+    Ids whose latest record is an error are left out, so a resumed run tries
+    them again and appends the new record after the failed one. A partially
+    written last line (interrupted run) is cut off so the file stays valid
+    JSONL when new results are appended.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    valid_size = 0
+    with open(output_path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if 'error' in record:
+                done.discard(str(record['id']))
+            else:
+                done.add(str(record['id']))
+            valid_size += len(line)
+
+    if valid_size != os.path.getsize(output_path):
+        with open(output_path, 'r+b') as f:
+            f.truncate(valid_size)
+    return done
+
+
+def iter_shards(items: Iterator[Tuple[str, str]], done: Set[str], shard_size: int) -> Iterator[List[Tuple[str, str]]]:
+    shard = []
+    for item_id, content in items:
+        if item_id in done:
+            continue
+        shard.append((item_id, content))
+        if len(shard) >= shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+class ThroughputReporter:
+    """Prints progress, rate and ETA to stderr at most every `interval` seconds"""
+
+    def __init__(self, total: int, already_done: int, interval: float):
+        self.total = total
+        self.already_done = already_done
+        self.interval = interval
+        self.processed = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+
+    def update(self, records: List[Dict]):
+        self.processed += len(records)
+        self.failed += sum(1 for record in records if 'error' in record)
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def report(self, final: bool = False):
+        elapsed = time.perf_counter() - self.start
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        done = self.already_done + self.processed
+        remaining = max(self.total - done, 0)
+        eta = f", ETA {remaining / rate:.0f}s" if rate and not final else ''
+        print(f"{'Finished' if final else 'Progress'}: {done}/{self.total} emails "
+              f"({self.processed} this run, {self.failed} failed) - {rate:.1f} emails/s{eta}",
+              file=sys.stderr, flush=True)
+
+
+def run(input_path: str, output_path: str, workers: int, threads: int, shard_size: int,
+        restart: bool, report_interval: float) -> Dict:
+    """Classify every input email not yet in the output file; returns run statistics"""
+    if restart and os.path.exists(output_path):
+        os.remove(output_path)
+    done = load_checkpoint(output_path)
+    total = count_inputs(input_path)
+    if done:
+        print(f"Resuming: {len(done)} emails already classified in {output_path}", file=sys.stderr)
+
+    reporter = ThroughputReporter(total, len(done), report_interval)
+    shards = iter_shards(iter_inputs(input_path), done, shard_size)
+
+    with open(output_path, 'a', encoding='utf-8') as output, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        # Mantém poucos shards em voo para não carregar o corpus inteiro em memória
+        in_flight = set()
+        for shard in shards:
+            in_flight.add(pool.submit(_classify_shard, shard))
+            if len(in_flight) >= workers * 2:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                _write_finished(finished, output, reporter)
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            _write_finished(finished, output, reporter)
+
+    reporter.report(final=True)
+    elapsed = time.perf_counter() - reporter.start
+    return {
+        'total': total,
+        'processed': reporter.processed,
+        'failed': reporter.failed,
+        'skipped': len(done),
+        'seconds': round(elapsed, 2),
+        'emails_per_second': round(reporter.processed / elapsed, 2) if elapsed > 0 else 0.0
+    }
+
+
+def _write_finished(futures, output, reporter: ThroughputReporter):
+    for future in futures:
+        records = future.result()
+        for record in records:
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+        # Cada shard fica gravado em disco antes de contar como feito (checkpoint)
+        output.flush()
+        os.fsync(output.fileno())
+        reporter.update(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify stored emails offline with a process pool')
+    parser.add_argument('input', help='directory of .txt/.eml files or a .jsonl file')
+    parser.add_argument('--output', required=True, help='JSONL results file (also used to resume)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='CPU threads per worker process')
+    parser.add_argument('--shard-size', type=int, default=config.AI_BATCH_SIZE * 4, help='emails per task')
+    parser.add_argument('--restart', action='store_true', help='discard previous results instead of resuming')
+    parser.add_argument('--report-interval', type=float, default=5.0, help='seconds between progress lines')
+    args = parser.parse_args()
+
+    summary = run(args.input, args.output, max(1, args.workers), max(1, args.threads),
+                  max(1, args.shard_size), args.restart, args.report_interval)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Statistics for the confidence-gated classification cascade
+"""
+import math
+import os
+import threading
+from typing import Dict
+
+import metrics
+
+STAGES = ('rules', 'keywords', 'model')
+
+
+class CascadeStats:
+    """Counts which cascade stage decided each email and how often the keyword
+    stage agrees with the model, bucketed by keyword confidence.
+
+    Agreement is recorded whenever both stages ran on the same email: for every
+    email that reached the model, and for the audited sample of emails the
+    keyword stage decided on its own. Buckets at or above the threshold with a
+    low agreement rate mean the threshold is too permissive.
+
+    The counts kept here belong to this worker; every event is also counted in
+    the clearbox_cascade_* Prometheus counters, which /metrics sums across workers.
+    """
+
+    BUCKET_WIDTH = 0.05
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.decisions = {stage: 0 for stage in STAGES}
+        self.audits = 0
+        self._buckets: Dict[str, Dict[str, int]] = {}
+
+    def _bucket(self, confidence: float) -> str:
+        lower = math.floor(confidence / self.BUCKET_WIDTH + 1e-9) * self.BUCKET_WIDTH
+        return f"{lower:.2f}"
+
+    def record_decision(self, stage: str):
+        with self._lock:
+            self.decisions[stage] += 1
+        metrics.CASCADE_DECISIONS.labels(stage=stage).inc()
+
+    def record_agreement(self, keyword_confidence: float, agreed: bool, audit: bool = False):
+        name = self._bucket(keyword_confidence)
+        with self._lock:
+            bucket = self._buckets.setdefault(name, {'samples': 0, 'agreed': 0})
+            bucket['samples'] += 1
+            bucket['agreed'] += int(agreed)
+            if audit:
+                self.audits += 1
+        metrics.CASCADE_AGREEMENT.labels(bucket=name, outcome='agreed' if agreed else 'disagreed').inc()
+        if audit:
+            metrics.CASCADE_AUDITS.inc()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            decisions = dict(self.decisions)
+            buckets = {name: dict(values) for name, values in self._buckets.items()}
+            audits = self.audits
+
+        total = sum(decisions.values())
+        samples = sum(bucket['samples'] for bucket in buckets.values())
+        agreed = sum(bucket['agreed'] for bucket in buckets.values())
+        return {
+            'threshold': self.threshold,
+            'worker_pid': os.getpid(),
+            'decisions': decisions,
+            'skip_rate': round((total - decisions['model']) / total, 4) if total else 0.0,
+            'audits': audits,
+            'agreement': {
+                'samples': samples,
+                'rate': round(agreed / samples, 4) if samples else None,
+                'by_keyword_confidence': {
+                    name: {
+                        'samples': bucket['samples'],
+                        'rate': round(bucket['agreed'] / bucket['samples'], 4)
+                    }
+                    for name, bucket in sorted(buckets.items())
+                }
+            }
+        }
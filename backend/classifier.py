@@ -0,0 +1,862 @@
+"""
+Email classification engine: NLP preprocessing, keyword index and zero-shot model
+"""
+import os
+import re
+import random
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Set
+
+from config import Config, get_config
+from matcher import KeywordIndex
+from inference import InferenceClient, load_zero_shot_pipeline
+from cascade import CascadeStats
+from process_memory import describe, process_memory
+import metrics
+from text_budget import TokenBudget, aggregate_chunk_results, strip_quoted_text
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+# Configurar diretório de cache seguro para Hugging Face
+hf_cache_dir = config.HF_CACHE_DIR
+os.makedirs(hf_cache_dir, exist_ok=True)
+os.environ["TRANSFORMERS_CACHE"] = hf_cache_dir
+os.environ["HF_HOME"] = hf_cache_dir
+os.environ["HF_DATASETS_CACHE"] = hf_cache_dir
+
+nltk_data_dir = "/tmp/nltk_data"
+
+nltk_packages = ['punkt', 'stopwords', 'rslp', 'punkt_tab']
+
+# Só letras (incluindo acentuadas) e espaços sobrevivem à limpeza do texto
+_NON_LETTER_RE = re.compile(r'[^a-záàâãéèêíïóôõöúçñ\s]')
+
+# Contrações que o tokenizador Treebank do NLTK separa em duas palavras
+_SPLIT_CONTRACTIONS = {
+    'cannot': ('can', 'not'),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    'wanna': ('wan', 'na')
+}
+
+
+def fast_word_tokenize(text: str, language: str = None) -> List[str]:
+    """Tokenize text that only contains letters and whitespace.
+    
+    Gives the same tokens as NLTK's word_tokenize on such text: without
+    punctuation Punkt finds a single sentence and the Treebank rules reduce to
+    a whitespace split plus a few contraction splits. `language` is accepted
+    for signature compatibility and ignored.
+    """
+    tokens = []
+    for token in text.split():
+        parts = _SPLIT_CONTRACTIONS.get(token)
+        if parts is None:
+            tokens.append(token)
+        else:
+            tokens.extend(parts)
+    return tokens
+
+
+# Campos da resposta de classificação (selecionáveis com ?fields=)
+RESPONSE_FIELDS = (
+    'category', 'confidence', 'suggestedResponse', 'reasoning', 'processingTime', 'highlightedKeywords',
+    'originalContent', 'classificationMethod', 'decisionStage', 'label'
+)
+
+# Campo privado (não faz parte da resposta) de um resultado de palavras-chave usado porque o
+# modelo falhou; quem chama o classificador retira-o antes de responder ou de guardar no cache
+AI_FALLBACK_FIELD = '_aiFallback'
+
+
+class EmailClassifier:
+    def __init__(self, startup_timings: Dict[str, float] = None):
+        # Duração (s) de cada fase de arranque, para o relatório de startup
+        self.startup_timings = dict(startup_timings or {})
+        
+        with self._startup_phase('nltk'):
+            self._load_nltk()
+        
+        self.ai_classifier = None
+        self.model_name = config.AI_MODEL_NAME
+        self.use_ai_model = False
+        # pending (lazy, ainda não iniciado) | loading | ready | failed
+        self.model_state = 'pending'
+        self._loader_pid = None
+        self._loader_lock = threading.Lock()
+        
+        if config.STARTUP_MODE != 'lazy':
+            self.use_ai_model = self._initialize_ai_model()
+        
+        self.productive_keywords = {
+            'reuniao', 'projeto', 'prazo', 'entrega', 'relatorio', 'apresentacao',
+            'meeting', 'project', 'deadline', 'delivery', 'report', 'presentation',
+            'trabalho', 'tarefa', 'responsabilidade', 'objetivo', 'meta', 'agenda',
+            'cronograma', 'planejamento', 'estrategia', 'desenvolvimento', 'analise',
+            'proposta', 'orcamento', 'contrato', 'negociacao', 'cliente', 'fornecedor',
+            'colaboracao', 'equipe', 'time', 'departamento', 'gerencia', 'diretoria',
+            'solucao', 'problema', 'discussao', 'feedback', 'revisao', 'aprovacao'
+        }
+        
+        self.unproductive_keywords = {
+            'spam', 'promocao', 'desconto', 'oferta', 'gratis', 'ganhe', 'premio',
+            'promotion', 'discount', 'offer', 'free', 'win', 'prize', 'lottery',
+            'clique', 'click', 'urgente', 'urgent', 'limitado', 'limited',
+            'exclusivo', 'exclusive', 'oportunidade', 'opportunity', 'dinheiro',
+            'money', 'renda', 'income', 'investimento', 'investment', 'lucro',
+            'profit', 'ganhar', 'earn', 'facil', 'easy', 'rapido', 'quick',
+            'compre', 'buy', 'venda', 'sale', 'barato', 'cheap', 'economize'
+        }
+        
+        self.cascade_stats = CascadeStats(config.CASCADE_CONFIDENCE_THRESHOLD)
+        
+        self.keyword_index = None
+        self._keyword_index_lock = threading.Lock()
+        with self._startup_phase('keyword_index'):
+            self.reload_keywords()
+        
+        logger.info("EmailClassifier initialized. AI Model: %s%s",
+                    'Enabled' if self.use_ai_model else 'Disabled',
+                    ' (loading in background)' if config.STARTUP_MODE == 'lazy' else '')
+        self._log_startup_timings()
+
+    @contextmanager
+    def _startup_phase(self, name: str):
+        """Record the duration of one startup phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[name] = time.perf_counter() - start
+
+    def _log_startup_timings(self):
+        """Log the per-phase startup time breakdown"""
+        breakdown = ', '.join(f"{name}={seconds:.2f}s" for name, seconds in self.startup_timings.items())
+        logger.info("Startup time breakdown: %s (total %.2fs)", breakdown, sum(self.startup_timings.values()))
+
+    def _load_nltk(self):
+        """Import NLTK and make sure its data packages are available"""
+        import nltk
+        from nltk.corpus import stopwords
+        from nltk.stem import RSLPStemmer
+        from nltk.tokenize import word_tokenize
+        
+        os.makedirs(nltk_data_dir, exist_ok=True)
+        if nltk_data_dir not in nltk.data.path:
+            nltk.data.path.insert(0, nltk_data_dir)
+        
+        for pkg_id in nltk_packages:
+            try:
+                # Tenta encontrar o pacote
+                if pkg_id == 'rslp':
+                    nltk.data.find(f'stemmers/{pkg_id}')
+                elif pkg_id == 'stopwords':
+                    nltk.data.find(f'corpora/{pkg_id}')
+                else:
+                    nltk.data.find(f'tokenizers/{pkg_id}')
+                logger.info("NLTK package '%s' already downloaded.", pkg_id)
+            except LookupError:
+                logger.info("Downloading NLTK package '%s' to %s...", pkg_id, nltk_data_dir)
+                # Descarrega para o diretório temporário
+                nltk.download(pkg_id, download_dir=nltk_data_dir)
+        
+        self.stemmer = RSLPStemmer()
+        # O mesmo vocabulário repete-se entre emails: cada palavra é reduzida uma única vez
+        self.stem = lru_cache(maxsize=config.STEM_CACHE_SIZE)(self.stemmer.stem)
+        self.stop_words = set(stopwords.words('portuguese') + stopwords.words('english'))
+        self._word_tokenize = fast_word_tokenize if config.FAST_TOKENIZER else word_tokenize
+
+    def start_background_load(self):
+        """Load the AI model in a background thread (STARTUP_MODE=lazy).
+        
+        Safe to call many times: starts at most one load per process. Until the
+        model is ready, requests are served by the keyword engine.
+        """
+        if self._loader_pid == os.getpid():
+            return
+        with self._loader_lock:
+            if self._loader_pid == os.getpid() or self.model_state != 'pending':
+                return
+            self._loader_pid = os.getpid()
+        
+        threading.Thread(target=self._background_load, name='model-loader', daemon=True).start()
+
+    def _background_load(self):
+        self.model_state = 'loading'
+        self.use_ai_model = self._initialize_ai_model()
+        self._log_startup_timings()
+
+    def _initialize_embedding_engine(self):
+        """Initialize the embedding engine (always in-process: the model is small)"""
+        try:
+            from embedding_engine import load_embedding_engine
+            
+            logger.info("Initializing embedding classification engine '%s'...", config.EMBEDDING_MODEL_NAME)
+            with self._startup_phase('model_load'):
+                self.ai_classifier = load_embedding_engine(
+                    config.EMBEDDING_MODEL_NAME,
+                    config.EMBEDDING_LABELS_FILE,
+                    hf_cache_dir,
+                    config.EMBEDDING_TEMPERATURE
+                )
+            self.model_name = config.EMBEDDING_MODEL_NAME
+            
+            logger.info("Embedding engine loaded with %d labels", len(self.ai_classifier.label_names))
+            
+            with self._startup_phase('warmup'):
+                self._warm_up()
+            
+            self.model_state = 'ready'
+            return True
+            
+        except Exception as e:
+            self.model_state = 'failed'
+            logger.warning("Failed to initialize embedding engine: %s", e)
+            logger.info("Falling back to keyword-based classification")
+            return False
+
+    def _model_source(self) -> str:
+        """Model id to load, or a pre-baked local snapshot without hub lookups"""
+        if config.MODEL_SNAPSHOT_DIR:
+            os.environ["HF_HUB_OFFLINE"] = "1"
+            os.environ["TRANSFORMERS_OFFLINE"] = "1"
+            return config.MODEL_SNAPSHOT_DIR
+        return self.model_name
+
+    # Emails usados para aquecer o modelo logo após o carregamento
+    warmup_emails = [
+        "Olá, gostaria de agendar uma reunião para discutir o projeto.",
+        "Promoção imperdível! Ganhe 50% de desconto em todos os produtos, clique aqui.",
+        "Hi team, please review the attached report before the deadline.",
+        "Congratulations! You have won a prize, click here to claim it."
+    ]
+
+    def _warm_up(self):
+        """Run a small batch through the model to prime kernels and allocator"""
+        if config.WARMUP_BATCH_SIZE <= 0:
+            return
+        emails = [self.warmup_emails[i % len(self.warmup_emails)] for i in range(config.WARMUP_BATCH_SIZE)]
+        self.ai_classifier(emails, self.candidate_labels, multi_label=False, batch_size=config.AI_BATCH_SIZE)
+
+    def model_ready(self) -> bool:
+        """Whether the AI model can answer now; in server mode the inference server is pinged"""
+        if isinstance(self.ai_classifier, InferenceClient):
+            self.model_state = 'ready' if self.ai_classifier.ping() else 'unreachable'
+        return self.use_ai_model and self.model_state == 'ready'
+
+    def _initialize_ai_model(self):
+        """Initialize the AI model for zero-shot classification"""
+        if config.CLASSIFIER_ENGINE == 'embedding':
+            return self._initialize_embedding_engine()
+        
+        if config.INFERENCE_MODE == 'server':
+            # O modelo vive no processo do servidor de inferência (inference_server.py)
+            if not config.INFERENCE_SERVER_AUTHKEY:
+                logger.warning("INFERENCE_SERVER_AUTHKEY is not set; the inference server cannot be reached")
+                self.model_state = 'failed'
+                return False
+            self.ai_classifier = InferenceClient(
+                config.INFERENCE_SERVER_ADDRESS,
+                config.INFERENCE_SERVER_AUTHKEY.encode(),
+                processes=config.INFERENCE_SERVER_PROCESSES,
+                timeout=config.INFERENCE_TIMEOUT
+            )
+            logger.info("Using inference server at %s for model '%s'", config.INFERENCE_SERVER_ADDRESS, self.model_name)
+            # Pronto só quando o servidor responder (com autostart ainda pode estar a carregar o modelo)
+            self.model_ready()
+            return True
+        
+        try:
+            logger.info("Initializing AI classification model...")
+            # Usando o modelo  que é mais pequeno e adequado para o plano gratuito
+            with self._startup_phase('model_load'):
+                self.ai_classifier = load_zero_shot_pipeline(
+                    self._model_source(),
+                    hf_cache_dir,
+                    backend=config.INFERENCE_BACKEND,
+                    onnx_dir=config.ONNX_MODEL_DIR,
+                    memory_mode=config.MODEL_MEMORY_MODE
+                )
+            
+            logger.info("AI model '%s' loaded successfully (%s backend)", self.model_name, config.INFERENCE_BACKEND)
+            logger.info("Memory after model load (%s mode), %s", config.MODEL_MEMORY_MODE, describe(process_memory()))
+            
+            with self._startup_phase('warmup'):
+                self._warm_up()
+            
+            self.model_state = 'ready'
+            return True
+            
+        except Exception as e:
+            self.model_state = 'failed'
+            logger.warning("Failed to initialize AI model: %s", e)
+            logger.info("Falling back to keyword-based classification")
+            return False
+
+    # Palavras-gatilho de spam de alta certeza (PT e EN, incluindo expressões compostas)
+    spam_triggers = {
+        'investimento', 'renda', 'lucro', 'ganhar dinheiro', 'gratis', 'oportunidade unica', 'clique aqui', 'promocao',
+        'lottery', 'prize', 'winner', 'click here', 'urgent', 'confidential', 'agent', 'claim your prize', 'selected as a winner',
+        'contact our agent', 'provide your details', 'annual international lottery', 'you have won', 'usd', 'premio', 'ganhe', 'oferta'
+    }
+    
+    # Gatilhos dos modelos de resposta, na ordem de prioridade usada em generate_response
+    response_triggers = {
+        'meeting': ['reuniao', 'meeting', 'encontro', 'agenda'],
+        'project': ['projeto', 'project', 'proposta', 'desenvolvimento'],
+        'document': ['relatorio', 'report', 'analise', 'documento'],
+        'deadline': ['prazo', 'deadline', 'entrega', 'urgente']
+    }
+
+    def reload_keywords(self) -> bool:
+        """Merge keyword overrides from the environment and rebuild the keyword index.
+        
+        The new index is built aside and swapped in with a single assignment, so
+        concurrent requests always see a complete index. Returns True if rebuilt.
+        """
+        with self._keyword_index_lock:
+            Config.load_keywords_from_env()
+            if self.keyword_index is not None and self.keyword_index.version == Config.KEYWORDS_VERSION:
+                return False
+            
+            extra_productive, extra_unproductive = Config.keywords_from_env()
+            productive_keywords = self.productive_keywords | extra_productive
+            unproductive_keywords = self.unproductive_keywords | extra_unproductive
+            
+            phrase_groups = {'spam': self.spam_triggers}
+            phrase_groups.update(self.response_triggers)
+            
+            keyword_index = KeywordIndex(
+                {'productive': productive_keywords, 'unproductive': unproductive_keywords},
+                phrase_groups,
+                self.stem,
+                version=Config.KEYWORDS_VERSION
+            )
+            
+            self.productive_keywords = productive_keywords
+            self.unproductive_keywords = unproductive_keywords
+            self.keyword_index = keyword_index
+        
+        logger.info("Keyword index built (version %s)", keyword_index.version)
+        return True
+
+    def _get_keyword_index(self) -> KeywordIndex:
+        """Return the current keyword index, rebuilding it if the Config sets changed"""
+        if self.keyword_index.version != Config.KEYWORDS_VERSION:
+            self.reload_keywords()
+        return self.keyword_index
+
+    def scan_content(self, content: str) -> Dict:
+        """Preprocess the email once and collect every keyword and trigger hit"""
+        with metrics.stage_timer('preprocessing'):
+            tokens = self.preprocess_text(content)
+        with metrics.stage_timer('keyword_scan'):
+            return self._get_keyword_index().scan(content, tokens)
+
+    def scan_contents(self, contents: List[str]) -> List[Dict]:
+        """scan_content for many emails, preprocessing them in one call"""
+        keyword_index = self._get_keyword_index()
+        with metrics.stage_timer('preprocessing'):
+            tokens = self.preprocess_texts(contents)
+        with metrics.stage_timer('keyword_scan'):
+            return [keyword_index.scan(content, item_tokens) for content, item_tokens in zip(contents, tokens)]
+
+    def preprocess_text(self, text: str) -> List[str]:
+        """Preprocess email text for classification"""
+        text = _NON_LETTER_RE.sub(' ', text.lower())
+        
+        tokens = self._word_tokenize(text, language='portuguese')
+        
+        stop_words = self.stop_words
+        stem = self.stem
+        return [stem(token) for token in tokens if token not in stop_words and len(token) > 2]
+
+    def preprocess_texts(self, texts: List[str]) -> List[List[str]]:
+        """Preprocess many emails in one call (same tokens as preprocess_text)"""
+        return [self.preprocess_text(text) for text in texts]
+
+
+    # RÓTULOS FINAIS E OTIMIZADOS
+    candidate_labels = [
+        "E-mail de trabalho sobre tarefa, projeto ou reunião",
+        "E-mail de marketing, spam, propaganda ou anúncio"
+    ]
+
+    def classify_with_ai(self, content: str, matches: Dict = None) -> Dict:
+        """Classify email using AI model"""
+        try:
+            result = self._run_ai_model(self.prepare_model_input(content))
+            
+            # Saída bruta do modelo, só com LOG_LEVEL=DEBUG
+            logger.debug("AI Model Raw Output: %s", result)
+            
+            return self._build_ai_result(content, result, matches)
+            
+        except Exception as e:
+            logger.error("AI classification failed: %s", e)
+            metrics.AI_FALLBACKS.labels(mode='single').inc()
+            return dict(self.classify_with_keywords(content, matches), ai_fallback=True)
+
+    def classify_with_ai_batch(self, contents: List[str], matches: List[Dict] = None) -> List[Dict]:
+        """Classify several emails with a single batched call to the AI model"""
+        try:
+            model_inputs = [self.prepare_model_input(content) for content in contents]
+            if config.LONG_TEXT_STRATEGY == 'chunk':
+                # Cada email tem as suas próprias janelas e saída antecipada
+                results = [self._classify_chunks(model_input) for model_input in model_inputs]
+            else:
+                with metrics.stage_timer('model_inference_batch'):
+                    results = self.ai_classifier(
+                        model_inputs,
+                        self.candidate_labels,
+                        multi_label=False,
+                        batch_size=config.AI_BATCH_SIZE
+                    )
+            # O pipeline devolve um dict (e não uma lista) para uma única sequência
+            if isinstance(results, dict):
+                results = [results]
+            
+            logger.debug("AI Model Raw Output (batch of %d): %s", len(contents), results)
+            
+            if matches is None:
+                matches = self.scan_contents(contents)
+            
+            return [self._build_ai_result(content, result, item_matches)
+                    for content, result, item_matches in zip(contents, results, matches)]
+            
+        except Exception as e:
+            logger.error("Batched AI classification failed: %s", e)
+            metrics.AI_FALLBACKS.labels(mode='batch').inc()
+            if matches is None:
+                return [self.classify_with_ai(content) for content in contents]
+            return [self.classify_with_ai(content, item_matches) for content, item_matches in zip(contents, matches)]
+
+    @property
+    def model_version(self) -> str:
+        """Identifies every setting that changes the classification output"""
+        if not self.use_ai_model:
+            return 'keywords'
+        backend = 'embedding' if config.CLASSIFIER_ENGINE == 'embedding' else config.INFERENCE_BACKEND
+        version = (f"{self.model_name}@{backend}"
+                   f"/{config.LONG_TEXT_STRATEGY}:{config.MAX_INPUT_TOKENS}:{int(config.STRIP_QUOTED_TEXT)}")
+        if config.CLASSIFICATION_MODE == 'cascade':
+            version += f"/cascade:{config.CASCADE_CONFIDENCE_THRESHOLD}"
+        return version
+
+    def _token_budget(self) -> TokenBudget:
+        """Token counter using the in-process model tokenizer when there is one"""
+        tokenizer = getattr(self.ai_classifier, 'tokenizer', None)
+        budget = getattr(self, '_budget', None)
+        if budget is None or budget.tokenizer is not tokenizer:
+            budget = self._budget = TokenBudget(tokenizer)
+        return budget
+
+    def prepare_model_input(self, content: str) -> str:
+        """Apply the configured long-text handling before the text reaches the model"""
+        if config.STRIP_QUOTED_TEXT:
+            # Se só houver histórico citado, mantém o texto original
+            content = strip_quoted_text(content) or content
+        
+        if config.LONG_TEXT_STRATEGY == 'truncate':
+            content = self._token_budget().truncate(content, config.MAX_INPUT_TOKENS, config.TRUNCATE_HEAD_RATIO)
+        
+        return content
+
+    def _run_ai_model(self, model_input: str) -> Dict:
+        """Run the zero-shot model on one prepared input"""
+        if config.LONG_TEXT_STRATEGY == 'chunk':
+            return self._classify_chunks(model_input)
+        with metrics.stage_timer('model_inference'):
+            return self.ai_classifier(model_input, self.candidate_labels, multi_label=False)
+
+    def _classify_chunks(self, text: str) -> Dict:
+        """Classify sliding windows of the text within MAX_INPUT_TOKENS.
+        
+        Stops at the first window whose top score reaches
+        CHUNK_EARLY_EXIT_CONFIDENCE and returns that window's result; otherwise
+        returns the length-weighted average over all windows.
+        """
+        windows = self._token_budget().chunks(text, config.CHUNK_TOKENS, config.CHUNK_OVERLAP, config.MAX_INPUT_TOKENS)
+        
+        results, weights = [], []
+        for chunk, token_count in windows:
+            with metrics.stage_timer('model_inference'):
+                result = self.ai_classifier(chunk, self.candidate_labels, multi_label=False)
+            results.append(result)
+            weights.append(token_count)
+            if result['scores'][0] >= config.CHUNK_EARLY_EXIT_CONFIDENCE:
+                logger.info("Chunked classification exited early after %d/%d chunks", len(results), len(windows))
+                return dict(result, chunks=len(results))
+        
+        return aggregate_chunk_results(results, weights)
+
+    def _build_ai_result(self, content: str, result: Dict, matches: Dict = None) -> Dict:
+        """Map the raw zero-shot output of one email to a classification result"""
+        top_label = result['labels'][0]
+        confidence = result['scores'][0]
+        
+        categorize = getattr(self.ai_classifier, 'categorize', None)
+        if categorize is not None:
+            # Motor de embeddings: vários rótulos finos, cada um ligado a uma categoria
+            category, confidence, top_label = categorize(result)
+        elif top_label == self.candidate_labels[0]:
+            category = "Produtivo"
+        else:
+            category = "Improdutivo"
+        
+        if matches is None:
+            matches = self.scan_content(content)
+        if category == "Produtivo":
+            found_keywords = matches["keywords"]["productive"]
+        else:
+            found_keywords = matches["keywords"]["unproductive"]
+        
+        ai_result = {
+            "category": category,
+            "confidence": confidence,
+            "method": "AI",
+            "found_keywords": found_keywords[:10]
+        }
+        if categorize is not None:
+            ai_result["label"] = top_label
+        return ai_result
+
+    def classify_with_keywords(self, content: str, matches: Dict = None) -> Dict:
+        """Fallback keyword-based classification"""
+        if matches is None:
+            matches = self.scan_content(content)
+        with metrics.stage_timer('keywords'):
+            return self._score_keywords(matches)
+
+    def _score_keywords(self, matches: Dict) -> Dict:
+        found_productive = matches["keywords"]["productive"]
+        found_unproductive = matches["keywords"]["unproductive"]
+        
+        productive_score = len(found_productive)
+        unproductive_score = len(found_unproductive)
+        
+        if productive_score > unproductive_score:
+            category = "Produtivo"
+            confidence = min(0.95, max(0.6, (productive_score + 1) / (productive_score + unproductive_score + 2)))
+            found_keywords = found_productive
+        elif unproductive_score > productive_score:
+            category = "Improdutivo"
+            confidence = min(0.95, max(0.6, (unproductive_score + 1) / (productive_score + unproductive_score + 2)))
+            found_keywords = found_unproductive
+        else:
+            category = "Produtivo"
+            confidence = 0.5
+            found_keywords = found_productive if found_productive else []
+        
+        return {
+            "category": category,
+            "confidence": confidence,
+            "method": "Keywords",
+            "found_keywords": found_keywords[:10]  
+        }
+
+
+    def classify_email(self, content: str, fields: Set[str] = None, use_model: bool = True) -> Dict:
+        """Main classification method with Hybrid Logic.
+        
+        With `fields`, suggestedResponse and reasoning are only generated if
+        listed there; every other field is always present. use_model=False
+        classifies with keywords only (load shedding).
+        """
+        start_time = datetime.now()
+        
+        logger.info("Classifying email with %d characters", len(content))
+        
+        matches = self.scan_content(content)
+        
+        # PASSO 1: Classificação inicial com IA
+        if self.use_ai_model and use_model and config.CLASSIFICATION_MODE == 'cascade':
+            classification_result = self._cascade_cheap_stage(content, matches)
+            if classification_result is None:
+                classification_result = self._cascade_model_stage(content, matches)
+        elif self.use_ai_model and use_model:
+            classification_result = self.classify_with_ai(content, matches)
+        else:
+            classification_result = self.classify_with_keywords(content, matches)
+        
+        return self._finalize_result(content, classification_result, matches, start_time, fields)
+
+    def classify_emails(self, contents: List[str], fields: Set[str] = None, use_model: bool = True) -> List[Dict]:
+        """Classify a batch of emails, running the AI model once for the whole batch.
+
+        Returns one entry per email, in order. Each entry has the same shape as
+        the result of classify_email, or is {"error": ...} if that email failed.
+        """
+        start_time = datetime.now()
+        
+        logger.info("Classifying batch of %d emails", len(contents))
+        
+        matches = self.scan_contents(contents)
+        
+        if self.use_ai_model and use_model and config.CLASSIFICATION_MODE == 'cascade':
+            classification_results = [self._cascade_cheap_stage(content, item_matches)
+                                      for content, item_matches in zip(contents, matches)]
+            # Só os emails não decididos pelas regras/palavras-chave vão ao modelo, num único lote
+            pending = [index for index, result in enumerate(classification_results) if result is None]
+            if pending:
+                model_results = self._cascade_model_stage_batch(
+                    [contents[index] for index in pending],
+                    [matches[index] for index in pending]
+                )
+                for index, result in zip(pending, model_results):
+                    classification_results[index] = result
+        elif self.use_ai_model and use_model:
+            classification_results = self.classify_with_ai_batch(contents, matches)
+        else:
+            classification_results = [self.classify_with_keywords(content, item_matches)
+                                      for content, item_matches in zip(contents, matches)]
+        
+        results = []
+        for content, classification_result, item_matches in zip(contents, classification_results, matches):
+            try:
+                results.append(self._finalize_result(content, classification_result, item_matches, start_time, fields))
+            except Exception as e:
+                logger.error("Batch item classification failed: %s", e, exc_info=True)
+                results.append({"error": f"Classification failed: {str(e)}"})
+        
+        return results
+
+    def _cascade_cheap_stage(self, content: str, matches: Dict) -> Dict:
+        """First cascade stages: spam-trigger rule, then keywords.
+        
+        Returns the decided result, or None when the keyword confidence is
+        below CASCADE_CONFIDENCE_THRESHOLD and the model must decide.
+        """
+        if matches["phrases"]["spam"]:
+            # Com gatilhos de spam a regra híbrida tornaria qualquer resultado da IA Improdutivo
+            self.cascade_stats.record_decision('rules')
+            return {
+                "category": "Improdutivo",
+                "confidence": 0.95,
+                "method": "Rules",
+                "stage": "rules",
+                "found_keywords": matches["keywords"]["unproductive"][:10]
+            }
+        
+        keyword_result = self.classify_with_keywords(content, matches)
+        if keyword_result["confidence"] < config.CASCADE_CONFIDENCE_THRESHOLD:
+            return None
+        
+        self.cascade_stats.record_decision('keywords')
+        if config.CASCADE_AUDIT_RATE > 0 and random.random() < config.CASCADE_AUDIT_RATE:
+            self._audit_keyword_decision(content, matches, keyword_result)
+        
+        return dict(keyword_result, stage="keywords")
+
+    def _cascade_model_stage(self, content: str, matches: Dict) -> Dict:
+        """Last cascade stage: the transformer decides, and agreement is recorded"""
+        keyword_result = self.classify_with_keywords(content, matches)
+        result = self.classify_with_ai(content, matches)
+        return self._record_model_decision(keyword_result, result)
+
+    def _cascade_model_stage_batch(self, contents: List[str], matches: List[Dict]) -> List[Dict]:
+        """Batched variant of _cascade_model_stage"""
+        keyword_results = [self.classify_with_keywords(content, item_matches)
+                           for content, item_matches in zip(contents, matches)]
+        results = self.classify_with_ai_batch(contents, matches)
+        return [self._record_model_decision(keyword_result, result)
+                for keyword_result, result in zip(keyword_results, results)]
+
+    def _record_model_decision(self, keyword_result: Dict, result: Dict) -> Dict:
+        if result["method"] != "AI":
+            # A IA falhou e o resultado já veio das palavras-chave
+            self.cascade_stats.record_decision('keywords')
+            return dict(result, stage="keywords")
+        
+        self.cascade_stats.record_decision('model')
+        self.cascade_stats.record_agreement(keyword_result["confidence"],
+                                            keyword_result["category"] == result["category"])
+        return dict(result, stage="model")
+
+    def _audit_keyword_decision(self, content: str, matches: Dict, keyword_result: Dict):
+        """Also run the model on a sample of keyword decisions to measure agreement"""
+        audit_result = self.classify_with_ai(content, matches)
+        if audit_result["method"] == "AI":
+            self.cascade_stats.record_agreement(keyword_result["confidence"],
+                                                keyword_result["category"] == audit_result["category"],
+                                                audit=True)
+
+    def _finalize_result(self, content: str, classification_result: Dict, matches: Dict, start_time: datetime,
+                         fields: Set[str] = None) -> Dict:
+        """Apply the hybrid rule and build the response payload for one email"""
+        with metrics.stage_timer('hybrid_rule'):
+            self.apply_hybrid_rule(classification_result, matches)
+        
+        result = {
+            "category": classification_result["category"],
+            "confidence": classification_result["confidence"],
+            "highlightedKeywords": classification_result["found_keywords"],
+            "originalContent": content,
+            "classificationMethod": classification_result["method"],
+            "decisionStage": classification_result.get("stage", "model" if classification_result["method"].startswith("AI") else "keywords")
+        }
+        
+        if "label" in classification_result:
+            result["label"] = classification_result["label"]
+        if classification_result.get("ai_fallback"):
+            result[AI_FALLBACK_FIELD] = True
+        
+        with metrics.stage_timer('response_generation'):
+            self.add_generated_fields(content, result, fields, matches)
+        
+        processing_time = (datetime.now() - start_time).total_seconds()
+        result["processingTime"] = processing_time
+        
+        logger.info("Classification completed: %s (%.2f confidence) in %.2fs using %s",
+                    result['category'], result['confidence'], processing_time, result['classificationMethod'])
+        
+        return result
+
+    def add_generated_fields(self, content: str, result: Dict, fields: Set[str] = None, matches: Dict = None) -> Dict:
+        """Generate suggestedResponse and reasoning, if requested and not already in the result"""
+        if (fields is None or 'suggestedResponse' in fields) and 'suggestedResponse' not in result:
+            result["suggestedResponse"] = self.generate_response(result["category"], content, matches)
+        
+        if (fields is None or 'reasoning' in fields) and 'reasoning' not in result:
+            result["reasoning"] = self.generate_reasoning(
+                result["category"],
+                result["highlightedKeywords"],
+                result["classificationMethod"]
+            )
+        return result
+
+    def apply_hybrid_rule(self, classification_result: Dict, matches: Dict) -> Dict:
+        """Override a Productive AI decision when spam trigger phrases are present"""
+        # PASSO 2: LÓGICA HÍBRIDA (REDE DE SEGURANÇA)
+
+        # para garantir que não seja um spam disfarçado.
+        if classification_result["category"] == "Produtivo" and classification_result["method"] == "AI":
+            # Se alguma palavra-gatilho de spam for encontrada...
+            if matches["phrases"]["spam"]:
+                logger.info("Hybrid Logic Triggered: AI classified as Productive, but spam keywords were found. Overriding to Improductive.")
+                # Inverte a classificação para Improdutivo
+                classification_result["category"] = "Improdutivo"
+                # Inverte a confiança para refletir a certeza da regra
+                classification_result["confidence"] = 0.95 
+                classification_result["method"] = "AI + Hybrid Rule"
+                # O rótulo fino do motor de embeddings já não corresponde à categoria
+                classification_result.pop("label", None)
+        return classification_result
+
+    def generate_response(self, category: str, content: str, matches: Dict = None) -> str:
+        """Generate appropriate response based on classification"""
+        if category == "Produtivo":
+            if matches is None:
+                phrases = self._get_keyword_index().match_phrases(content)
+            else:
+                phrases = matches["phrases"]
+            
+            if phrases['meeting']:
+                return """Obrigado pelo seu email.
+
+Recebi sua solicitação de reunião e vou verificar minha agenda. Retornarei em breve com minha disponibilidade.
+
+Caso seja urgente, não hesite em entrar em contato por telefone.
+
+Atenciosamente,
+[Seu Nome]"""
+            
+            elif phrases['project']:
+                return """Obrigado pelo contato.
+
+Recebi as informações sobre o projeto e vou analisar os detalhes fornecidos. Retornarei com um feedback detalhado em até 2 dias úteis.
+
+Caso tenha alguma dúvida adicional, fique à vontade para entrar em contato.
+
+Atenciosamente,
+[Seu Nome]"""
+            
+            elif phrases['document']:
+                return """Obrigado pelo envio.
+
+Recebi o documento e vou proceder com a análise. Caso tenha alguma observação específica ou prazo para retorno, por favor me informe.
+
+Retornarei com meus comentários em breve.
+
+Atenciosamente,
+[Seu Nome]"""
+            
+            elif phrases['deadline']:
+                return """Obrigado pelo contato.
+
+Entendi a urgência da solicitação e vou priorizar esta demanda. Retornarei com uma resposta o mais breve possível.
+
+Caso precise de esclarecimentos adicionais, estou à disposição.
+
+Atenciosamente,
+[Seu Nome]"""
+            
+            else:
+                return """Obrigado pelo seu email.
+
+Recebi sua mensagem e vou analisar as informações fornecidas. Retornarei com uma resposta detalhada em breve.
+
+Caso seja urgente, não hesite em entrar em contato por telefone.
+
+Atenciosamente,
+[Seu Nome]"""
+        
+        else:  # Improdutivo
+            return """Obrigado pelo contato.
+
+No momento, não tenho interesse na proposta apresentada. Caso tenha algo mais específico relacionado ao meu trabalho, fique à vontade para entrar em contato novamente.
+
+Para remover meu email de sua lista de contatos, responda com "REMOVER" no assunto.
+
+Atenciosamente,
+[Seu Nome]"""
+
+    def generate_reasoning(self, category: str, found_keywords: List[str], method: str) -> str:
+        """Generate reasoning for the classification"""
+        
+        if category == "Produtivo":
+            reasoning = f"""Este email foi classificado como PRODUTIVO usando {method}.
+
+Indicadores encontrados:
+• {len(found_keywords)} palavras-chave relacionadas a trabalho e produtividade"""
+            
+            if found_keywords:
+                reasoning += f"\n• Palavras identificadas: {', '.join(found_keywords[:5])}"
+                if len(found_keywords) > 5:
+                    reasoning += f" (e mais {len(found_keywords) - 5})"
+            
+            reasoning += "\n\nA análise identificou termos associados a atividades profissionais, projetos, reuniões ou assuntos corporativos relevantes, indicando que este email requer atenção e resposta adequada."
+        
+        else:
+            reasoning = f"""Este email foi classificado como IMPRODUTIVO usando {method}.
+
+Indicadores encontrados:
+• {len(found_keywords)} palavras-chave relacionadas a spam/promoções"""
+            
+            if found_keywords:
+                reasoning += f"\n• Palavras identificadas: {', '.join(found_keywords[:5])}"
+                if len(found_keywords) > 5:
+                    reasoning += f" (e mais {len(found_keywords) - 5})"
+            
+            reasoning += "\n\nA análise identificou padrões típicos de emails promocionais, spam ou conteúdo não relacionado a atividades profissionais, sugerindo que pode ser tratado com menor prioridade."
+        
+        return reasoning
+
+    def find_keywords(self, tokens, keyword_set):
+        """Identifica palavras-chave usando stemming e correspondência parcial"""
+        keyword_index = self._get_keyword_index()
+        for group, keywords in keyword_index.keyword_groups.items():
+            if keywords == keyword_set:
+                return keyword_index.match_tokens(tokens)[group]
+        
+        # Conjunto arbitrário: indexa só para esta chamada
+        return KeywordIndex({'custom': keyword_set}, {}, self.stem).match_tokens(tokens)['custom']
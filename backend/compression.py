@@ -0,0 +1,167 @@
+"""
+HTTP compression: negotiated response encoding and compressed request bodies
+"""
+import gzip
+import io
+import json
+import zlib
+from typing import Callable, Optional
+
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import get_input_stream
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'text/plain', 'text/html', 'text/css', 'text/javascript'
+}
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # bom compromisso entre taxa de compressão e CPU para respostas dinâmicas
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_DECOMPRESSION_ERRORS = (zlib.error,) + ((brotli.error,) if brotli is not None else ())
+
+# Só o brotli >= 1.2 limita a saída de cada process(); sem isso um corpo br pequeno
+# pode expandir-se para gigabytes numa única chamada, e esses pedidos são recusados
+BROTLI_REQUESTS = brotli is not None and hasattr(brotli.Decompressor, 'can_accept_more_data')
+
+
+def available_encodings():
+    """Response encodings supported here, in order of preference"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """Best supported encoding for the request's Accept-Encoding header (q-values respected)"""
+    return accept_encodings.best_match(available_encodings())
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, accept_encodings, min_size: int):
+    """Compress a buffered response body in place when the client accepts it"""
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    encoding = negotiate_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class _DecompressingReader(io.RawIOBase):
+    """Decompresses a request body stream as it is read, up to max_size bytes"""
+
+    def __init__(self, raw, encoding: str, max_size: int):
+        self._raw = raw
+        self._max_size = max_size
+        self._size = 0
+        self._buffer = b''
+        self._tail = b''
+        # Saída ainda retida no descompressor brotli: é lida antes de mais entrada
+        self._draining = False
+        self._eof = False
+        if encoding == 'br':
+            decompressor = brotli.Decompressor()
+
+            def decompress(data: bytes) -> bytes:
+                out = decompressor.process(data, output_buffer_limit=READ_CHUNK_SIZE)
+                self._draining = not decompressor.can_accept_more_data() and not decompressor.is_finished()
+                return out
+
+            self._decompress: Callable[[bytes], bytes] = decompress
+        else:
+            # gzip: cabeçalho gzip; deflate: fluxo zlib
+            wbits = zlib.MAX_WBITS if encoding == 'deflate' else 16 + zlib.MAX_WBITS
+            decompressor = zlib.decompressobj(wbits)
+
+            def decompress(data: bytes) -> bytes:
+                # Saída limitada por chamada: o resto fica em unconsumed_tail (protege contra zip bombs)
+                out = decompressor.decompress(data, READ_CHUNK_SIZE)
+                self._tail = decompressor.unconsumed_tail
+                return out
+
+            self._decompress = decompress
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self):
+        if self._draining:
+            data = b''
+        else:
+            data = self._tail or self._raw.read(READ_CHUNK_SIZE)
+            self._tail = b''
+            if not data:
+                self._eof = True
+                return
+        try:
+            out = self._decompress(data)
+        except _DECOMPRESSION_ERRORS as e:
+            raise BadRequest(f'Invalid compressed request body: {e}')
+        self._size += len(out)
+        if self._size > self._max_size:
+            raise RequestEntityTooLarge(f'Decompressed request body exceeds {self._max_size} bytes')
+        self._buffer += out
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._eof:
+            self._fill()
+        count = min(len(buffer), len(self._buffer))
+        buffer[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+
+class RequestDecompressionMiddleware:
+    """WSGI middleware accepting gzip, deflate and (with brotli >= 1.2 installed) br request bodies.
+
+    The body is decompressed while the application reads it, so streamed
+    uploads (e.g. /classify/mailbox) stay streamed.
+    """
+
+    def __init__(self, app, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not encoding or encoding == 'identity':
+            return self.app(environ, start_response)
+
+        if encoding == 'x-gzip':
+            encoding = 'gzip'
+        if encoding not in ('gzip', 'deflate') and not (encoding == 'br' and BROTLI_REQUESTS):
+            error = Response(json.dumps({'error': f"Unsupported Content-Encoding '{encoding}'"}),
+                             status=415, mimetype='application/json')
+            return error(environ, start_response)
+
+        raw = get_input_stream(environ)
+        environ['wsgi.input'] = io.BufferedReader(_DecompressingReader(raw, encoding, self.max_size),
+                                                  buffer_size=READ_CHUNK_SIZE)
+        # O tamanho descomprimido é desconhecido: o corpo termina quando o fluxo acaba
+        environ['wsgi.input_terminated'] = True
+        environ.pop('CONTENT_LENGTH', None)
+        del environ['HTTP_CONTENT_ENCODING']
+        return self.app(environ, start_response)
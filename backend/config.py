@@ -2,7 +2,7 @@
 Configuration file for Email Classifier
 """
 import os
-from typing import Set
+from typing import Set, Tuple
 
 class Config:
     """Main configuration class"""
@@ -15,14 +15,128 @@ class Config:
     # AI Model Configuration
     AI_MODEL_NAME = os.environ.get('AI_MODEL_NAME', 'facebook/bart-large-mnli')
     USE_GPU = os.environ.get('USE_GPU', 'auto')  # auto, true, false
+    HF_CACHE_DIR = os.environ.get('HF_CACHE_DIR', '/tmp/hf_cache')
+    
+    # Startup Configuration
+    STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')  # eager, lazy (background model load)
+    MODEL_SNAPSHOT_DIR = os.environ.get('MODEL_SNAPSHOT_DIR')  # pre-baked local model, no hub lookups
+    WARMUP_BATCH_SIZE = int(os.environ.get('WARMUP_BATCH_SIZE', 2))  # 0 disables warm-up
+    # shared: weights memory-mapped from MODEL_SNAPSHOT_DIR (safetensors), frozen model, gc.freeze() before fork
+    MODEL_MEMORY_MODE = os.environ.get('MODEL_MEMORY_MODE', 'default')  # default, shared
+    
+    # Classification Engine
+    CLASSIFIER_ENGINE = os.environ.get('CLASSIFIER_ENGINE', 'zero-shot')  # zero-shot, embedding
+    EMBEDDING_MODEL_NAME = os.environ.get('EMBEDDING_MODEL_NAME', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+    EMBEDDING_LABELS_FILE = os.environ.get('EMBEDDING_LABELS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'labels.json'))
+    EMBEDDING_TEMPERATURE = float(os.environ.get('EMBEDDING_TEMPERATURE', 0.05))
+    
+    # Inference Configuration
+    INFERENCE_MODE = os.environ.get('INFERENCE_MODE', 'local')  # local, server
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'torch')  # torch, torch-int8, onnx
+    ONNX_MODEL_DIR = os.environ.get('ONNX_MODEL_DIR')  # default: <HF_CACHE_DIR>/onnx/<model>
+    INFERENCE_SERVER_ADDRESS = os.environ.get('INFERENCE_SERVER_ADDRESS', '/tmp/clearbox_inference.sock')
+    INFERENCE_SERVER_AUTHKEY = os.environ.get('INFERENCE_SERVER_AUTHKEY', '')  # required; generated by gunicorn's autostart if unset
+    INFERENCE_SERVER_PROCESSES = int(os.environ.get('INFERENCE_SERVER_PROCESSES', 1))
+    INFERENCE_SERVER_THREADS = int(os.environ.get('INFERENCE_SERVER_THREADS', 0))  # 0 = torch default
+    INFERENCE_SERVER_AUTOSTART = os.environ.get('INFERENCE_SERVER_AUTOSTART', 'True').lower() == 'true'
+    INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 16))
+    INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 10))
+    INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 25))  # seconds
     
     # Classification Configuration
     MIN_CONTENT_LENGTH = int(os.environ.get('MIN_CONTENT_LENGTH', 10))
     MAX_KEYWORDS_DISPLAY = int(os.environ.get('MAX_KEYWORDS_DISPLAY', 10))
     
+    # Classification Mode
+    CLASSIFICATION_MODE = os.environ.get('CLASSIFICATION_MODE', 'model')  # model, cascade
+    CASCADE_CONFIDENCE_THRESHOLD = float(os.environ.get('CASCADE_CONFIDENCE_THRESHOLD', 0.8))
+    CASCADE_AUDIT_RATE = float(os.environ.get('CASCADE_AUDIT_RATE', 0.0))  # fraction of skipped emails also sent to the model
+    
+    # Long Email Handling (applied to the text sent to the AI model)
+    LONG_TEXT_STRATEGY = os.environ.get('LONG_TEXT_STRATEGY', 'none')  # none, truncate, chunk
+    STRIP_QUOTED_TEXT = os.environ.get('STRIP_QUOTED_TEXT', 'False').lower() == 'true'
+    MAX_INPUT_TOKENS = int(os.environ.get('MAX_INPUT_TOKENS', 512))  # hard budget per email
+    TRUNCATE_HEAD_RATIO = float(os.environ.get('TRUNCATE_HEAD_RATIO', 0.7))
+    CHUNK_TOKENS = int(os.environ.get('CHUNK_TOKENS', 256))
+    CHUNK_OVERLAP = int(os.environ.get('CHUNK_OVERLAP', 32))
+    CHUNK_EARLY_EXIT_CONFIDENCE = float(os.environ.get('CHUNK_EARLY_EXIT_CONFIDENCE', 0.9))
+    
+    # Batch Configuration
+    AI_BATCH_SIZE = int(os.environ.get('AI_BATCH_SIZE', 8))
+    MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 100))
+    
+    # Metrics Configuration
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    # Diretório partilhado pelos workers do gunicorn para agregar as métricas
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR', '/tmp/clearbox_metrics')
+    
+    # Preprocessing Configuration
+    FAST_TOKENIZER = os.environ.get('FAST_TOKENIZER', 'true').lower() == 'true'  # false: NLTK word_tokenize
+    STEM_CACHE_SIZE = int(os.environ.get('STEM_CACHE_SIZE', 100000))  # distinct tokens with memoized stems
+    
+    # Response/Request Compression Configuration
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes; smaller bodies go as is
+    MAX_DECOMPRESSED_REQUEST_BYTES = int(os.environ.get('MAX_DECOMPRESSED_REQUEST_BYTES', 20 * 1024 * 1024))
+    
+    # Admission Control Configuration
+    INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', 0))  # torch threads per worker; 0 = cores / workers
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'false').lower() == 'true'  # opt-in: may answer 429
+    ADMISSION_MAX_CONCURRENCY = int(os.environ.get('ADMISSION_MAX_CONCURRENCY', 0))  # 0 = cores / threads per worker
+    ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 16))  # requests waiting for a slot before 429
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 20))  # seconds, below gunicorn timeout
+    ADMISSION_DEFAULT_MODEL_SECONDS = float(os.environ.get('ADMISSION_DEFAULT_MODEL_SECONDS', 1.0))
+    DEADLINE_HEADER = os.environ.get('DEADLINE_HEADER', 'X-Request-Deadline-Ms')  # remaining client budget in ms
+    
+    # Asynchronous Jobs Configuration (queue persisted in a SQLite file shared by all workers)
+    JOBS_ENABLED = os.environ.get('JOBS_ENABLED', 'False').lower() == 'true'  # opt-in: runner threads in every worker
+    JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', '/tmp/clearbox_jobs/jobs.sqlite3')
+    JOBS_RUNNER_THREADS = int(os.environ.get('JOBS_RUNNER_THREADS', 1))  # per worker process
+    JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 1.0))  # seconds between idle queue checks
+    JOBS_LEASE_SECONDS = int(os.environ.get('JOBS_LEASE_SECONDS', 300))  # a job is retried if not done by then
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 3))
+    JOBS_RESULT_TTL = int(os.environ.get('JOBS_RESULT_TTL', 24 * 60 * 60))  # seconds
+    JOBS_CALLBACK_HOSTS = os.environ.get('JOBS_CALLBACK_HOSTS', 'localhost,127.0.0.1,::1').split(',')
+    
+    # Document Upload Configuration (POST /classify/upload)
+    UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 20 * 1024 * 1024))
+    UPLOAD_SPOOL_MEMORY_BYTES = int(os.environ.get('UPLOAD_SPOOL_MEMORY_BYTES', 1024 * 1024))  # then a temp file
+    UPLOAD_MAX_TEXT_CHARS = int(os.environ.get('UPLOAD_MAX_TEXT_CHARS', 0))  # 0 = derived from MAX_INPUT_TOKENS
+    
+    # Request Profiling Configuration (opt-in)
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+    PROFILE_HEADER = os.environ.get('PROFILE_HEADER', 'X-Profile')  # 1: stage timings, full: also cProfile
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))  # fraction of requests run under cProfile
+    PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 1000))  # sampled profiles are kept above this
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/clearbox_profiles')
+    PROFILE_DIR_MAX_BYTES = int(os.environ.get('PROFILE_DIR_MAX_BYTES', 50 * 1024 * 1024))
+    
+    # Mailbox Ingestion Configuration
+    MAILBOX_CHUNK_SIZE = int(os.environ.get('MAILBOX_CHUNK_SIZE', 64 * 1024))  # bytes read per step
+    MAILBOX_MAX_MESSAGE_BYTES = int(os.environ.get('MAILBOX_MAX_MESSAGE_BYTES', 5 * 1024 * 1024))
+    MAILBOX_BATCH_SIZE = int(os.environ.get('MAILBOX_BATCH_SIZE', 8))  # messages classified together
+    # Mensagens por pedido (0 = sem limite); com workers sync o pedido tem de caber no timeout do gunicorn
+    MAILBOX_MAX_MESSAGES = int(os.environ.get('MAILBOX_MAX_MESSAGES', 200))
+    
+    # Result Cache Configuration (shared by all workers through a SQLite file)
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'False').lower() == 'true'
+    RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', '/tmp/clearbox_cache/results.sqlite3')
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 10000))
+    RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 24 * 60 * 60))  # seconds
+    
+    # Near-duplicate reuse (SimHash over the preprocessed tokens, kept per worker)
+    NEAR_DUPLICATE_ENABLED = os.environ.get('NEAR_DUPLICATE_ENABLED', 'False').lower() == 'true'
+    NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.95))  # 1 - hamming distance / 64
+    NEAR_DUPLICATE_MAX_ENTRIES = int(os.environ.get('NEAR_DUPLICATE_MAX_ENTRIES', 5000))
+    NEAR_DUPLICATE_TTL = int(os.environ.get('NEAR_DUPLICATE_TTL', 60 * 60))  # seconds
+    NEAR_DUPLICATE_MIN_TOKENS = int(os.environ.get('NEAR_DUPLICATE_MIN_TOKENS', 20))
+    
     # Logging Configuration
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
-    LOG_FILE = os.environ.get('LOG_FILE', 'email_classifier.log')
+    LOG_FILE = os.environ.get('LOG_FILE', '')  # empty: console only
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # json, text
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))  # fraction of requests whose INFO/DEBUG lines are kept
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))  # records beyond this are dropped, never block
     
     # Keywords for classification (can be overridden via environment)
     PRODUCTIVE_KEYWORDS: Set[str] = {
@@ -61,26 +175,48 @@ class Config:
         'register', 'subscribe', 'participate', 'enjoy', 'unmissable'
     }
     
-    @classmethod
-    def load_keywords_from_env(cls):
-        """Load keywords from environment variables if provided"""
+    # Bumped whenever the keyword sets change, so derived indexes know to rebuild
+    KEYWORDS_VERSION = 0
+    
+    @staticmethod
+    def keywords_from_env() -> Tuple[Set[str], Set[str]]:
+        """Return the (productive, unproductive) keywords given in the environment"""
         productive_env = os.environ.get('PRODUCTIVE_KEYWORDS')
-        if productive_env:
-            cls.PRODUCTIVE_KEYWORDS.update(productive_env.split(','))
-        
         unproductive_env = os.environ.get('UNPRODUCTIVE_KEYWORDS')
-        if unproductive_env:
-            cls.UNPRODUCTIVE_KEYWORDS.update(unproductive_env.split(','))
+        return (
+            set(productive_env.split(',')) if productive_env else set(),
+            set(unproductive_env.split(',')) if unproductive_env else set()
+        )
+    
+    @classmethod
+    def load_keywords_from_env(cls) -> bool:
+        """Load keywords from environment variables if provided.
+        
+        Returns True (and bumps KEYWORDS_VERSION) if any keyword set changed.
+        """
+        productive_env, unproductive_env = cls.keywords_from_env()
+        changed = False
+        
+        if not productive_env <= cls.PRODUCTIVE_KEYWORDS:
+            cls.PRODUCTIVE_KEYWORDS.update(productive_env)
+            changed = True
+        
+        if not unproductive_env <= cls.UNPRODUCTIVE_KEYWORDS:
+            cls.UNPRODUCTIVE_KEYWORDS.update(unproductive_env)
+            changed = True
+        
+        if changed:
+            cls.KEYWORDS_VERSION += 1
+        return changed
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
-    LOG_LEVEL = 'DEBUG'
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
-    LOG_LEVEL = 'WARNING'
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING')
     
     # Production-specific settings
     API_HOST = '0.0.0.0'
@@ -89,7 +225,6 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Testing configuration"""
     DEBUG = True
-    LOG_LEVEL = 'DEBUG'
     MIN_CONTENT_LENGTH = 5  # Lower threshold for testing
 
 # Configuration mapping
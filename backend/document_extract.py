@@ -0,0 +1,208 @@
+"""
+Streaming upload spooling and budgeted text extraction for .pdf, .eml and .txt documents
+"""
+import codecs
+import os
+import tempfile
+from email import policy
+from email.feedparser import BytesFeedParser
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from mailbox_stream import extract_text
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+DOCUMENT_TYPES = ('pdf', 'eml', 'txt')
+
+_EXTENSIONS = {'.pdf': 'pdf', '.eml': 'eml', '.txt': 'txt'}
+_MIMETYPES = {'application/pdf': 'pdf', 'message/rfc822': 'eml', 'text/plain': 'txt'}
+
+# Campos de formulário aceites junto do arquivo são pequenos (fields, compact, cache)
+MAX_FORM_FIELD_BYTES = 4096
+
+
+class UnsupportedDocument(ValueError):
+    """The upload is not a supported document, or cannot be read"""
+
+
+class SpooledUpload:
+    """The file part of a multipart upload, spooled to memory then to a temp file"""
+
+    def __init__(self, filename: Optional[str], content_type: Optional[str], file, size: int, form: Dict[str, str]):
+        self.filename = filename
+        self.content_type = content_type
+        self.file = file
+        self.size = size
+        self.form = form
+
+    def close(self):
+        self.file.close()
+
+
+def spool_upload(stream: BinaryIO, boundary: str, chunk_size: int, max_bytes: int,
+                 memory_bytes: int) -> SpooledUpload:
+    """Read a multipart body, spooling its first file part and keeping small form fields.
+
+    The file stays in memory up to memory_bytes and moves to a temp file
+    beyond that; more than max_bytes raises RequestEntityTooLarge. Any further
+    file parts are skipped.
+    """
+    # O limite do decoder vale para o buffer de dados recebidos ainda não consumidos
+    decoder = MultipartDecoder(boundary.encode('latin-1'), max_form_memory_size=chunk_size + MAX_FORM_FIELD_BYTES)
+    spooled = tempfile.SpooledTemporaryFile(max_size=memory_bytes)
+    form = {}
+    filename = content_type = None
+    found_file = False
+    size = 0
+    current = None  # ('file', None), ('field', name) ou None para partes ignoradas
+    field_data = b''
+
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            decoder.receive_data(chunk or None)
+
+            while True:
+                event = decoder.next_event()
+                if isinstance(event, (NeedData, Epilogue)):
+                    break
+                if isinstance(event, File):
+                    if not found_file:
+                        found_file = True
+                        filename = event.filename
+                        content_type = event.headers.get('Content-Type')
+                        current = ('file', None)
+                    else:
+                        current = None
+                elif isinstance(event, Field):
+                    current = ('field', event.name)
+                    field_data = b''
+                elif isinstance(event, Data) and current is not None:
+                    if current[0] == 'file':
+                        size += len(event.data)
+                        if size > max_bytes:
+                            raise RequestEntityTooLarge(f'Uploaded document exceeds {max_bytes} bytes')
+                        spooled.write(event.data)
+                        if not event.more_data:
+                            current = None
+                    else:
+                        field_data += event.data
+                        if len(field_data) > MAX_FORM_FIELD_BYTES:
+                            raise RequestEntityTooLarge(f'Form field {current[1]!r} exceeds {MAX_FORM_FIELD_BYTES} bytes')
+                        if not event.more_data:
+                            form[current[1]] = field_data.decode('utf-8', errors='replace')
+                            current = None
+
+            if not chunk or isinstance(event, Epilogue):
+                break
+    except BaseException:
+        spooled.close()
+        raise
+
+    if not found_file:
+        spooled.close()
+        raise BadRequest('No file found in the upload')
+
+    spooled.seek(0)
+    return SpooledUpload(filename, content_type, spooled, size, form)
+
+
+def detect_type(filename: Optional[str], content_type: Optional[str], head: bytes) -> str:
+    """Document type from the file extension, then the part's Content-Type, then the content"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in _EXTENSIONS:
+        return _EXTENSIONS[extension]
+
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    if mimetype in _MIMETYPES:
+        return _MIMETYPES[mimetype]
+
+    if head.startswith(b'%PDF-'):
+        return 'pdf'
+    raise UnsupportedDocument(f"Unsupported document type (use {', '.join('.' + t for t in DOCUMENT_TYPES)})")
+
+
+def extract_pdf(file: BinaryIO, max_chars: int) -> Tuple[str, Dict]:
+    """Text of the PDF page by page, stopping at the first page that fills the budget"""
+    if pypdf is None:
+        raise UnsupportedDocument('PDF extraction is unavailable on this server (install pypdf)')
+
+    try:
+        reader = pypdf.PdfReader(file)
+        page_count = len(reader.pages)
+        pages = []
+        chars = 0
+        for page in reader.pages:
+            text = page.extract_text() or ''
+            pages.append(text)
+            chars += len(text) + 1
+            if chars >= max_chars:
+                break
+    except (pypdf.errors.PyPdfError, ValueError) as e:
+        raise UnsupportedDocument(f'Invalid PDF: {e}')
+
+    text = '\n'.join(pages)
+    return text[:max_chars], {'pages': page_count, 'pagesRead': len(pages), 'truncated': len(text) > max_chars or len(pages) < page_count}
+
+
+def extract_eml(file: BinaryIO, max_chars: int, chunk_size: int) -> Tuple[str, Dict]:
+    """Subject and body of the message; attachments are never decoded"""
+    parser = BytesFeedParser(policy=policy.default)
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        parser.feed(chunk)
+    message = parser.close()
+
+    text = extract_text(message)
+    return text[:max_chars], {'parts': sum(1 for _ in message.walk()), 'truncated': len(text) > max_chars}
+
+
+def extract_txt(file: BinaryIO, max_chars: int, chunk_size: int) -> Tuple[str, Dict]:
+    """Decode UTF-8 text chunk by chunk, reading no further than the budget"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    parts = []
+    chars = 0
+    truncated = False
+    while chars < max_chars:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            parts.append(decoder.decode(b'', final=True))
+            break
+        text = decoder.decode(chunk)
+        parts.append(text)
+        chars += len(text)
+    else:
+        truncated = bool(file.read(1))
+
+    text = ''.join(parts)
+    return text[:max_chars], {'truncated': truncated or len(text) > max_chars}
+
+
+def extract_document(upload: SpooledUpload, max_chars: int, chunk_size: int) -> Tuple[str, Dict]:
+    """Extracted text (at most max_chars) and a summary of what was read"""
+    head = upload.file.read(8)
+    upload.file.seek(0)
+    doc_type = detect_type(upload.filename, upload.content_type, head)
+
+    if doc_type == 'pdf':
+        text, info = extract_pdf(upload.file, max_chars)
+    elif doc_type == 'eml':
+        text, info = extract_eml(upload.file, max_chars, chunk_size)
+    else:
+        text, info = extract_txt(upload.file, max_chars, chunk_size)
+
+    return text, {
+        'filename': upload.filename,
+        'type': doc_type,
+        'size': upload.size,
+        'extractedChars': len(text),
+        **info
+    }
@@ -0,0 +1,123 @@
+"""
+Embedding-based classification engine with precomputed label prototypes
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingEngine:
+    """Classifies emails by similarity to precomputed label embeddings.
+
+    Each email is encoded once with a small sentence-embedding model and
+    compared, with a single matrix product, against the embeddings of every
+    label's description and examples. A label's similarity is the best match
+    among its exemplars; label probabilities are a softmax over those
+    similarities. Cost no longer grows with one forward pass per label, so the
+    label set (labels.json) can grow freely.
+
+    Exemplar embeddings are cached on disk, keyed by the model name and the
+    label definitions.
+
+    Calls mirror the zero-shot pipeline (``engine(sequences, candidate_labels)``
+    returns dicts with ``labels`` and ``scores``); candidate_labels are ignored
+    because the engine always scores its own label set.
+    """
+
+    def __init__(self, model_name: str, labels: Dict[str, Dict], cache_dir: str, temperature: float = 0.05):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.labels = labels
+        self.temperature = temperature
+        self.label_names = list(labels)
+        self.label_categories = {name: definition['category'] for name, definition in labels.items()}
+
+        self.model = SentenceTransformer(model_name, device='cpu', cache_folder=cache_dir)
+        self.tokenizer = self.model.tokenizer
+        self._exemplars, self._owners = self._load_exemplars(os.path.join(cache_dir, 'embeddings'))
+
+        # Posição inicial de cada rótulo na matriz de exemplares (já ordenada por rótulo)
+        self._segments = np.searchsorted(self._owners, np.arange(len(self.label_names)))
+
+    def _exemplar_texts(self) -> Tuple[List[str], List[int]]:
+        texts, owners = [], []
+        for index, name in enumerate(self.label_names):
+            definition = self.labels[name]
+            for text in [definition['description']] + list(definition.get('examples', [])):
+                texts.append(text)
+                owners.append(index)
+        return texts, owners
+
+    def _load_exemplars(self, cache_dir: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode the label exemplars, or load them from the on-disk cache"""
+        texts, owners = self._exemplar_texts()
+        key = hashlib.sha1(json.dumps([self.model_name, self.label_names, texts]).encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(cache_dir, f"prototypes-{key}.npz")
+
+        if os.path.exists(path):
+            cached = np.load(path)
+            logger.info("Loaded %d label exemplar embeddings from %s", len(texts), path)
+            return cached['embeddings'], cached['owners']
+
+        logger.info("Encoding %d label exemplars for %d labels...", len(texts), len(self.label_names))
+        embeddings = self.encode(texts)
+        owners = np.asarray(owners)
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(path, embeddings=embeddings, owners=owners)
+        return embeddings, owners
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """L2-normalized embeddings, one row per text"""
+        return self.model.encode(texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True)
+
+    def score(self, texts: List[str]) -> np.ndarray:
+        """Label probabilities, one row per text and one column per label"""
+        similarities = self.encode(texts) @ self._exemplars.T
+        label_similarities = np.maximum.reduceat(similarities, self._segments, axis=1)
+        logits = label_similarities / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def __call__(self, sequences: Union[str, List[str]], candidate_labels: List[str] = None,
+                 multi_label: bool = False, **kwargs) -> Union[Dict, List[Dict]]:
+        single = isinstance(sequences, str)
+        texts = [sequences] if single else list(sequences)
+
+        results = []
+        for text, probabilities in zip(texts, self.score(texts)):
+            order = np.argsort(-probabilities)
+            results.append({
+                'sequence': text,
+                'labels': [self.label_names[i] for i in order],
+                'scores': [float(probabilities[i]) for i in order]
+            })
+        return results[0] if single else results
+
+    def categorize(self, result: Dict) -> Tuple[str, float, str]:
+        """Map label scores to (category, confidence, top label of that category).
+
+        The category confidence is the summed probability of its labels.
+        """
+        totals: Dict[str, float] = {}
+        for label, score in zip(result['labels'], result['scores']):
+            category = self.label_categories[label]
+            totals[category] = totals.get(category, 0.0) + score
+
+        category = max(totals, key=totals.get)
+        top_label = next(label for label in result['labels'] if self.label_categories[label] == category)
+        return category, totals[category], top_label
+
+
+def load_embedding_engine(model_name: str, labels_file: str, cache_dir: str, temperature: float) -> EmbeddingEngine:
+    """Load the label definitions and build the embedding engine"""
+    with open(labels_file, encoding='utf-8') as f:
+        labels = json.load(f)
+    return EmbeddingEngine(model_name, labels, cache_dir, temperature)
@@ -2,7 +2,24 @@
 Gunicorn configuration for production deployment
 """
 import os
+import sys
+import secrets
+import subprocess
 import multiprocessing
+from importlib.util import find_spec
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_config
+
+app_config = get_config()
+
+# Sem INFERENCE_SERVER_AUTHKEY definida, gera uma chave por arranque: os servidores de
+# inferência herdam-na pelo ambiente e os workers (preload) leem-na de app_config
+if (app_config.INFERENCE_MODE == 'server' and app_config.INFERENCE_SERVER_AUTOSTART
+        and not app_config.INFERENCE_SERVER_AUTHKEY):
+    os.environ['INFERENCE_SERVER_AUTHKEY'] = secrets.token_hex(32)
+    app_config.INFERENCE_SERVER_AUTHKEY = os.environ['INFERENCE_SERVER_AUTHKEY']
 
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
@@ -38,4 +55,89 @@ tmp_upload_dir = None
 
 # SSL (if needed)
 keyfile = None
-certfile = None
\ No newline at end of file
+certfile = None
+
+# Prometheus metrics: every worker writes its samples to a shared directory that
+# /metrics aggregates. It must be set before the app (and prometheus_client) loads.
+# Without prometheus_client installed the metrics are no-ops and nothing is set up.
+if app_config.METRICS_ENABLED and find_spec('prometheus_client') is not None:
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', app_config.METRICS_MULTIPROC_DIR)
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    # Amostras de uma execução anterior não podem somar-se às novas
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, name))
+
+def pre_fork(server, worker):
+    # Modo shared: os objetos criados no preload passam para a geração permanente do gc,
+    # que deixa de os percorrer (e de sujar as suas páginas) nos workers
+    if app_config.MODEL_MEMORY_MODE == 'shared':
+        import gc
+        gc.collect()
+        gc.freeze()
+
+def post_fork(server, worker):
+    # Cada worker usa só a sua parte dos núcleos, para os workers não disputarem a CPU
+    from admission import apply_thread_budget, thread_budget
+    threads = thread_budget(server.cfg.workers, app_config.INFERENCE_THREADS)
+    apply_thread_budget(threads)
+    server.log.info(f"Worker {worker.pid}: {threads} inference thread(s)")
+
+def post_worker_init(worker):
+    from process_memory import describe, process_memory
+    worker.log.info(f"Worker memory ({app_config.MODEL_MEMORY_MODE} mode), {describe(process_memory())}")
+
+def worker_exit(server, worker):
+    # Worker reciclado (max_requests) ou a terminar: os jobs em curso voltam logo para a fila.
+    # O runner vem da app que este worker carregou; importar o módulo app aqui carregaria
+    # uma segunda cópia quando a app é indicada como backend.app:app.
+    wsgi = getattr(worker, 'wsgi', None)
+    job_runner = getattr(wsgi, 'extensions', {}).get('job_runner')
+    if job_runner is not None:
+        job_runner.stop(timeout=min(10, server.cfg.timeout / 2))
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+    # Um worker morto por SIGKILL (timeout, OOM) não liberta as vagas de inferência que
+    # ocupava; o master, que partilha o controle de admissão desde o preload, devolve-as.
+    # Sem preload cada worker tem o seu próprio controle e não há nada a devolver.
+    wsgi = getattr(server.app, 'callable', None) if server.cfg.preload_app else None
+    admission = getattr(wsgi, 'extensions', {}).get('admission')
+    if admission is not None:
+        freed = admission.reclaim(worker.pid)
+        if freed:
+            server.log.warning(f"Reclaimed {freed} inference slot(s) held by dead worker {worker.pid}")
+
+# Inference server (INFERENCE_MODE=server): one process pool owns the model and
+# micro-batches requests from all workers. See inference_server.py.
+inference_processes = []
+
+def on_starting(server):
+    # Com a app já carregada (preload) e antes do fork: uma vaga de inferência por cada
+    # conjunto de threads que post_fork dá a um worker, para as vagas ocuparem os núcleos
+    wsgi = getattr(server.app, 'callable', None)
+    admission = getattr(wsgi, 'extensions', {}).get('admission')
+    if admission is not None and not app_config.ADMISSION_MAX_CONCURRENCY:
+        from admission import thread_budget
+        threads = thread_budget(server.cfg.workers, app_config.INFERENCE_THREADS)
+        admission.set_max_concurrency((os.cpu_count() or 1) // threads)
+        server.log.info(f"Admission control: {admission.max_concurrency} inference slot(s)")
+
+    if app_config.INFERENCE_MODE != 'server' or not app_config.INFERENCE_SERVER_AUTOSTART:
+        return
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_server.py')
+    for index in range(app_config.INFERENCE_SERVER_PROCESSES):
+        process = subprocess.Popen([sys.executable, script, '--index', str(index)])
+        inference_processes.append(process)
+        server.log.info(f"Started inference server {index} (pid {process.pid})")
+
+def on_exit(server):
+    for process in inference_processes:
+        process.terminate()
+    for process in inference_processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
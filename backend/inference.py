@@ -0,0 +1,229 @@
+"""
+Zero-shot inference backends: in-process pipeline or remote inference server
+"""
+import logging
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from typing import Dict, List, Union
+
+logger = logging.getLogger(__name__)
+
+
+INFERENCE_BACKENDS = ('torch', 'torch-int8', 'onnx')
+
+
+MEMORY_MODES = ('default', 'shared')
+
+
+def load_shared_weights_model(snapshot_dir: str):
+    """Sequence-classification model whose weights are memory-mapped from a local safetensors snapshot.
+
+    The model is built on the meta device and its parameters are assigned the
+    mmap-backed tensors directly, without copying. Read-only file pages are
+    shared through the page cache by every process that maps them, so forked
+    (or separately started) workers don't each hold a private copy of the
+    weights.
+    """
+    import json
+
+    import torch
+    from safetensors.torch import load_file
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    index_path = os.path.join(snapshot_dir, 'model.safetensors.index.json')
+    if os.path.exists(index_path):
+        with open(index_path, encoding='utf-8') as f:
+            files = sorted(set(json.load(f)['weight_map'].values()))
+    elif os.path.exists(os.path.join(snapshot_dir, 'model.safetensors')):
+        files = ['model.safetensors']
+    else:
+        raise FileNotFoundError(f"No safetensors weights in {snapshot_dir}")
+
+    model_config = AutoConfig.from_pretrained(snapshot_dir)
+    with torch.device('meta'):
+        model = AutoModelForSequenceClassification.from_config(model_config)
+
+    for name in files:
+        model.load_state_dict(load_file(os.path.join(snapshot_dir, name)), strict=False, assign=True)
+    # Os embeddings partilhados (ex.: encoder/decoder do BART) não estão repetidos no arquivo
+    model.tie_weights()
+
+    unloaded = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers()) if tensor.is_meta]
+    if unloaded:
+        raise ValueError(f"Weights missing from the snapshot: {', '.join(unloaded[:5])}")
+    return model
+
+
+def freeze_for_inference(model):
+    """Evaluation mode with gradients disabled: no autograd state is ever attached to the weights"""
+    model.eval()
+    model.requires_grad_(False)
+    return model
+
+
+def load_zero_shot_pipeline(model_name: str, cache_dir: str, backend: str = 'torch', onnx_dir: str = None,
+                            memory_mode: str = 'default'):
+    """Load the zero-shot classification pipeline on CPU.
+
+    backend selects how the NLI model runs:
+      - 'torch': full-precision PyTorch model (default)
+      - 'torch-int8': PyTorch model with Linear layers dynamically quantized to int8
+      - 'onnx': model exported to ONNX and run by ONNX Runtime (needs optimum[onnxruntime])
+
+    With memory_mode='shared' and a local safetensors snapshot as model_name,
+    the 'torch' weights are memory-mapped and shared between processes
+    (see load_shared_weights_model).
+
+    All backends are wrapped in the same transformers zero-shot pipeline, so
+    hypothesis construction and score normalization are identical.
+    """
+    from transformers import pipeline
+
+    if backend == 'torch' and memory_mode == 'shared':
+        from transformers import AutoTokenizer
+
+        try:
+            model = load_shared_weights_model(model_name)
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("Shared-weights loading unavailable (%s), loading a private copy of the model", e)
+        else:
+            logger.info("Model weights memory-mapped from %s", model_name)
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            return pipeline("zero-shot-classification", model=freeze_for_inference(model), tokenizer=tokenizer,
+                            device=-1)
+
+    if backend == 'torch':
+        classifier = pipeline(
+            "zero-shot-classification",
+            model=model_name,
+            device=-1,  # Força o uso de CPU
+            cache_dir=cache_dir  # Força o cache para a pasta com permissão
+        )
+        if memory_mode == 'shared':
+            freeze_for_inference(classifier.model)
+        return classifier
+
+    if backend == 'torch-int8':
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name, cache_dir=cache_dir)
+        model.eval()
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if memory_mode == 'shared':
+            freeze_for_inference(model)
+        return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer, device=-1)
+
+    if backend == 'onnx':
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError:
+            raise ImportError("The 'onnx' inference backend requires: pip install optimum[onnxruntime]")
+        from transformers import AutoTokenizer
+
+        if onnx_dir is None:
+            onnx_dir = os.path.join(cache_dir, 'onnx', model_name.replace('/', '--'))
+
+        if os.path.exists(os.path.join(onnx_dir, 'model.onnx')):
+            model = ORTModelForSequenceClassification.from_pretrained(onnx_dir)
+            tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        else:
+            # Primeira execução: exporta o grafo ONNX e guarda-o para as próximas
+            logger.info("Exporting '%s' to ONNX at %s...", model_name, onnx_dir)
+            model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True, cache_dir=cache_dir)
+            tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+            model.save_pretrained(onnx_dir)
+            tokenizer.save_pretrained(onnx_dir)
+        return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer)
+
+    raise ValueError(f"Unknown inference backend '{backend}' (expected one of {', '.join(INFERENCE_BACKENDS)})")
+
+
+def server_address(base_address: str, index: int) -> str:
+    """Socket path of the index-th inference server process"""
+    return f"{base_address}.{index}"
+
+
+class InferenceClient:
+    """Drop-in replacement for the zero-shot pipeline that forwards calls to
+    the inference server (see inference_server.py) over a local socket.
+
+    Each process/thread keeps its own persistent connection. With several
+    server processes, each web worker sticks to one of them by pid.
+    """
+
+    def __init__(self, base_address: str, authkey: bytes, processes: int = 1, timeout: float = 30.0):
+        self.base_address = base_address
+        self.authkey = authkey
+        self.processes = max(1, processes)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            address = server_address(self.base_address, os.getpid() % self.processes)
+            conn = Client(address, family='AF_UNIX', authkey=self.authkey)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        self._local.conn = None
+
+    def __call__(self, sequences: Union[str, List[str]], candidate_labels: List[str],
+                 multi_label: bool = False, **kwargs) -> Union[Dict, List[Dict]]:
+        single = isinstance(sequences, str)
+        request = ('classify', [sequences] if single else list(sequences), list(candidate_labels), multi_label)
+
+        # Reconecta uma vez se o servidor foi reiniciado desde a última chamada. Só se repete
+        # o envio: depois de o pedido seguir, repetir faria o servidor calculá-lo duas vezes
+        # e o worker esperaria dois timeouts em vez de cair para as palavras-chave.
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(request)
+                break
+            except OSError as e:
+                self._reset()
+                if attempt:
+                    raise ConnectionError(f"Inference server unavailable: {e}")
+        
+        try:
+            answered = conn.poll(self.timeout)
+            if answered:
+                status, payload = conn.recv()
+        except (OSError, EOFError) as e:
+            self._reset()
+            raise ConnectionError(f"Inference server connection lost: {e}")
+        if not answered:
+            # A resposta atrasada chegaria a um pedido seguinte: a ligação é descartada
+            self._reset()
+            raise TimeoutError(f"Inference server did not answer within {self.timeout}s")
+
+        if status != 'ok':
+            raise RuntimeError(f"Inference server error: {payload}")
+        return payload[0] if single else payload
+
+    def ping(self, timeout: float = 2.0) -> bool:
+        """Whether this process's inference server accepts the authkey and answers within `timeout`.
+
+        Uses a short-lived connection of its own, so a probe never leaves a
+        reply behind on the connection that carries classification requests.
+        """
+        address = server_address(self.base_address, os.getpid() % self.processes)
+        try:
+            with Client(address, family='AF_UNIX', authkey=self.authkey) as conn:
+                conn.send(('ping', [], [], False))
+                return conn.poll(timeout) and conn.recv() == ('ok', 'pong')
+        except (OSError, EOFError, AuthenticationError):
+            return False
@@ -0,0 +1,180 @@
+"""
+Dedicated inference server process with dynamic micro-batching.
+
+Owns the zero-shot model so that web workers don't each load it and compete
+for the same cores. Requests from all workers arrive over a local Unix socket
+and are grouped into micro-batches bounded by INFERENCE_MAX_BATCH_SIZE and
+INFERENCE_MAX_WAIT_MS before a single forward pass.
+
+Usage:
+    python backend/inference_server.py [--index N]
+"""
+import argparse
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Listener
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_config
+from inference import load_zero_shot_pipeline, server_address
+from logging_setup import configure_logging
+
+config = get_config()
+
+configure_logging(config)
+logger = logging.getLogger('inference_server')
+
+
+class MicroBatcher:
+    """Collects single-sequence requests and runs them through the model in batches.
+
+    A batch is closed when it reaches max_batch_size sequences or when the
+    oldest request has waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(self, model, max_batch_size: int, max_wait_ms: float):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.sequences = 0
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, sequences: List[str], candidate_labels: List[str], multi_label: bool) -> List[Future]:
+        """Queue sequences for classification; returns one future per sequence"""
+        futures = []
+        labels = tuple(candidate_labels)
+        for sequence in sequences:
+            future = Future()
+            self._queue.put((sequence, labels, multi_label, future))
+            futures.append(future)
+        return futures
+
+    def _collect(self) -> List:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # Só sequências com os mesmos rótulos podem partilhar um forward pass
+            groups = {}
+            for sequence, labels, multi_label, future in batch:
+                groups.setdefault((labels, multi_label), []).append((sequence, future))
+
+            for (labels, multi_label), items in groups.items():
+                sequences = [sequence for sequence, _ in items]
+                try:
+                    results = self.model(sequences, list(labels), multi_label=multi_label,
+                                         batch_size=self.max_batch_size)
+                    if isinstance(results, dict):
+                        results = [results]
+                    for (_, future), result in zip(items, results):
+                        future.set_result(result)
+                except Exception as e:
+                    logger.error("Batch inference failed: %s", e)
+                    for _, future in items:
+                        future.set_exception(e)
+
+            self.batches += 1
+            self.sequences += len(batch)
+            logger.debug("Micro-batch of %d sequences done (avg %.1f per batch)",
+                         len(batch), self.sequences / self.batches)
+
+
+def handle_connection(conn, batcher: MicroBatcher):
+    """Serve one web worker connection until it is closed"""
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                command, sequences, candidate_labels, multi_label = message
+                if command == 'ping':
+                    reply = ('ok', 'pong')
+                elif command == 'classify':
+                    futures = batcher.submit(sequences, candidate_labels, multi_label)
+                    reply = ('ok', [future.result() for future in futures])
+                else:
+                    raise ValueError(f"Unknown command '{command}'")
+            except Exception as e:
+                reply = ('error', str(e))
+
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+
+
+def serve(index: int = 0):
+    """Load the model and serve classification requests forever"""
+    if not config.INFERENCE_SERVER_AUTHKEY:
+        # Sem chave qualquer utilizador local poderia enviar mensagens pickle ao servidor
+        sys.exit('INFERENCE_SERVER_AUTHKEY is required (gunicorn generates one when it starts the servers)')
+
+    if config.INFERENCE_SERVER_THREADS > 0:
+        import torch
+        torch.set_num_threads(config.INFERENCE_SERVER_THREADS)
+
+    logger.info("Loading AI model '%s' (%s backend) for inference server %s...",
+                config.AI_MODEL_NAME, config.INFERENCE_BACKEND, index)
+    model = load_zero_shot_pipeline(
+        config.MODEL_SNAPSHOT_DIR or config.AI_MODEL_NAME,
+        config.HF_CACHE_DIR,
+        backend=config.INFERENCE_BACKEND,
+        onnx_dir=config.ONNX_MODEL_DIR,
+        memory_mode=config.MODEL_MEMORY_MODE
+    )
+    batcher = MicroBatcher(model, config.INFERENCE_MAX_BATCH_SIZE, config.INFERENCE_MAX_WAIT_MS)
+
+    address = server_address(config.INFERENCE_SERVER_ADDRESS, index)
+    if os.path.exists(address):
+        os.remove(address)
+
+    # O socket nasce já só com permissões do dono: não há intervalo antes de um chmod
+    previous_umask = os.umask(0o177)
+    try:
+        listener = Listener(address, family='AF_UNIX', authkey=config.INFERENCE_SERVER_AUTHKEY.encode())
+    finally:
+        os.umask(previous_umask)
+
+    with listener:
+        logger.info("Inference server listening on %s (max batch %s, max wait %sms)",
+                    address, config.INFERENCE_MAX_BATCH_SIZE, config.INFERENCE_MAX_WAIT_MS)
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Ex.: cliente com authkey errada
+                logger.warning("Rejected inference connection: %s", e)
+                continue
+            threading.Thread(target=handle_connection, args=(conn, batcher), daemon=True).start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ClearBox zero-shot inference server')
+    parser.add_argument('--index', type=int, default=0, help='server index within the pool')
+    args = parser.parse_args()
+    serve(args.index)
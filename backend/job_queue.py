@@ -0,0 +1,311 @@
+"""
+Persistent local job queue for asynchronous classification
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+import uuid
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ('queued', 'running', 'done', 'failed')
+
+# Jobs que um runner pode tomar: na fila e disponíveis, ou a correr com a concessão expirada
+_RUNNABLE = "(status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_until < ?)"
+
+
+class RetryLater(Exception):
+    """Raised by a job handler to put the job back in the queue for `delay` seconds"""
+
+    def __init__(self, delay: float):
+        super().__init__(f'Retry in {delay}s')
+        self.delay = delay
+
+
+class JobQueue:
+    """Classification jobs and their results in a local SQLite file.
+
+    Every worker process opens its own connection, so any worker can enqueue,
+    run or report on any job. A running job holds a lease: if the worker
+    running it dies or is recycled, the lease runs out and another worker
+    picks the job up again (up to max_attempts runs). Finished jobs are
+    deleted ttl_seconds after they finish.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, lease_seconds: int, max_attempts: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, callback_url TEXT, "
+                "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, available_at REAL NOT NULL, lease_until REAL, "
+                "started_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, available_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection of the current process and thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # isolation_level=None: as transações são abertas explicitamente (BEGIN IMMEDIATE)
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, payload: Dict, callback_url: str = None) -> str:
+        """Persist a new job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, status, payload, callback_url, created_at, available_at) "
+            "VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, json.dumps(payload), callback_url, now, now)
+        )
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Take the oldest runnable job (queued, or running with an expired lease)"""
+        now = time.time()
+        conn = self._connection()
+        # Verificação só de leitura: com a fila vazia nenhum runner toma o lock de escrita
+        if conn.execute("SELECT 1 FROM jobs WHERE " + _RUNNABLE + " LIMIT 1", (now, now)).fetchone() is None:
+            return None
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, payload, callback_url, attempts FROM jobs WHERE " + _RUNNABLE +
+                " ORDER BY created_at LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            job_id, payload, callback_url, attempts = row
+            if attempts >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+                    (f'Job abandoned after {attempts} attempts', now, job_id)
+                )
+                conn.execute("COMMIT")
+                return {'id': job_id, 'callback_url': callback_url, 'abandoned': True}
+
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, "
+                "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (now + self.lease_seconds, now, job_id)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return {'id': job_id, 'payload': json.loads(payload), 'callback_url': callback_url}
+
+    def complete(self, job_id: str, result: Dict):
+        self._finish(job_id, 'done', result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, 'failed', error=error)
+
+    def _finish(self, job_id: str, status: str, result: str = None, error: str = None):
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+            (status, result, error, time.time(), job_id)
+        )
+
+    def retry_later(self, job_id: str, delay: float = 0):
+        """Put a claimed job back in the queue without counting the attempt"""
+        self._connection().execute(
+            "UPDATE jobs SET status = 'queued', attempts = attempts - 1, available_at = ?, lease_until = NULL "
+            "WHERE id = ? AND status = 'running'",
+            (time.time() + delay, job_id)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Status and, once finished, result or error of a job (None if unknown or expired)"""
+        row = self._connection().execute(
+            "SELECT status, result, error, attempts, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        status, result, error, attempts, created_at, started_at, finished_at = row
+        if finished_at is not None and time.time() - finished_at > self.ttl_seconds:
+            return None
+
+        job = {
+            'jobId': job_id,
+            'status': status,
+            'attempts': attempts,
+            'createdAt': created_at,
+            'startedAt': started_at,
+            'finishedAt': finished_at
+        }
+        if result is not None:
+            job['result'] = json.loads(result)
+        if error is not None:
+            job['error'] = error
+        return job
+
+    def purge_expired(self) -> int:
+        """Delete jobs whose results outlived the TTL"""
+        cursor = self._connection().execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (time.time() - self.ttl_seconds,)
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict:
+        """Number of jobs in each status"""
+        try:
+            counts = dict(self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        except sqlite3.Error as e:
+            logger.warning("Job queue stats failed: %s", e)
+            return {'enabled': True, 'error': str(e)}
+        return {'enabled': True, **{status: counts.get(status, 0) for status in STATUSES}}
+
+
+class JobRunner:
+    """Background threads that drain the job queue in the current process.
+
+    Safe to start many times: runs at most one set of threads per process, so
+    it can be started after every fork and on the first request.
+    """
+
+    PURGE_INTERVAL = 300  # seconds
+
+    def __init__(self, queue: JobQueue, handler: Callable[[Dict], Dict], threads: int, poll_interval: float,
+                 callback_hosts):
+        self.queue = queue
+        self.handler = handler
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.callback_hosts = set(callback_hosts)
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._running = {}  # thread name -> id of the job it is running
+        self._last_purge = 0.0
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # O estado herdado do processo pai não vale neste processo: recomeça do zero
+            self._wakeup = threading.Event()
+            self._stopping = threading.Event()
+            self._running = {}
+            self._threads = [threading.Thread(target=self._run, name=f'job-runner-{index}', daemon=True)
+                             for index in range(self.threads)]
+
+        for thread in self._threads:
+            thread.start()
+        logger.info("Job runner started with %d thread(s) in process %d", self.threads, os.getpid())
+
+    def stop(self, timeout: float):
+        """Let running jobs finish for up to `timeout` seconds, then give the rest back to the queue.
+
+        Called when a worker exits (e.g. recycled after max_requests), so its
+        jobs are picked up by another worker right away instead of after the lease.
+        """
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        for job_id in list(self._running.values()):
+            logger.warning("Job %s interrupted by worker shutdown, returning it to the queue", job_id)
+            self.queue.retry_later(job_id)
+
+    def notify(self):
+        """Wake the runner threads of this process (a job was just enqueued here)"""
+        self._wakeup.set()
+
+    def allowed_callback(self, url: str) -> bool:
+        """Callbacks may only target the configured local hosts"""
+        parsed = urlparse(url)
+        return parsed.scheme in ('http', 'https') and parsed.hostname in self.callback_hosts
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                if time.time() - self._last_purge > self.PURGE_INTERVAL:
+                    self._last_purge = time.time()
+                    purged = self.queue.purge_expired()
+                    if purged:
+                        logger.info("Purged %d expired job(s)", purged)
+
+                job = self.queue.claim()
+                if job is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                name = threading.current_thread().name
+                self._running[name] = job['id']
+                try:
+                    self._process(job)
+                finally:
+                    self._running.pop(name, None)
+            except Exception as e:
+                logger.error("Job runner error: %s", e, exc_info=True)
+                time.sleep(self.poll_interval)
+
+    def _process(self, job: Dict):
+        job_id = job['id']
+        if job.get('abandoned'):
+            logger.warning("Job %s abandoned after too many attempts", job_id)
+            self._callback(job)
+            return
+
+        logger.info("Running job %s", job_id)
+        try:
+            result = self.handler(job['payload'])
+        except RetryLater as e:
+            logger.info("Job %s postponed for %ss", job_id, e.delay)
+            self.queue.retry_later(job_id, e.delay)
+            return
+        except Exception as e:
+            logger.error("Job %s failed: %s", job_id, e, exc_info=True)
+            self.queue.fail(job_id, f'Classification failed: {str(e)}')
+        else:
+            self.queue.complete(job_id, result)
+            logger.info("Job %s completed", job_id)
+        self._callback(job)
+
+    def _callback(self, job: Dict):
+        url = job.get('callback_url')
+        if not url:
+            return
+        body = json.dumps(self.queue.get(job['id'])).encode('utf-8')
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                logger.info("Job %s callback to %s: HTTP %s", job['id'], url, response.status)
+        except Exception as e:
+            logger.warning("Job %s callback to %s failed: %s", job['id'], url, e)
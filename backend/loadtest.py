@@ -0,0 +1,507 @@
+"""
+End-to-end load test against the gunicorn deployment.
+
+Starts the API with the real gunicorn.conf.py (optionally overriding workers,
+timeout, max_requests and backlog) or targets a server that is already running,
+then replays a traffic mix of short and long emails, PDF uploads and
+cache-friendly duplicates. Two load shapes are supported:
+
+- closed loop (--concurrency 1 4 8 16): each stage keeps N clients busy,
+  every client sending its next request as soon as the previous one answers
+- open loop (--rate 5 10 20): each stage sends requests at a fixed rate per
+  second whatever the server's latency; latency is measured from the scheduled
+  send time, so client-side queueing behind a slow server is counted
+
+Each stage reports throughput, latency percentiles (overall and per kind of
+request), error and timeout rates and, when the harness started the server,
+the RSS/PSS of every gunicorn worker sampled during the stage. The report is
+saved as JSON so server configurations can be compared.
+
+Usage:
+    python backend/loadtest.py --workers 4 --concurrency 1 4 8 16 --output load.json
+    python backend/loadtest.py --url http://localhost:8000 --rate 5 10 20 --duration 60
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import FILLER_SENTENCES, PRODUCTIVE_SENTENCES, UNPRODUCTIVE_SENTENCES, git_commit
+from process_memory import process_memory
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+KINDS = ('short', 'long', 'pdf', 'duplicate')
+DEFAULT_MIX = 'short=50,long=20,pdf=10,duplicate=20'
+
+# Número aproximado de palavras por tipo de pedido
+WORDS = {'short': 30, 'long': 1500}
+
+# Variáveis de ambiente que mudam o comportamento do servidor e entram no relatório
+SERVER_ENV_KEYS = ('INFERENCE_MODE', 'INFERENCE_BACKEND', 'CLASSIFICATION_MODE', 'STARTUP_MODE',
+                   'MODEL_MEMORY_MODE', 'RESULT_CACHE_ENABLED', 'INFERENCE_THREADS',
+                   'ADMISSION_MAX_CONCURRENCY', 'ADMISSION_MAX_QUEUE')
+
+
+def build_email(rng: random.Random, words: int) -> str:
+    topic = PRODUCTIVE_SENTENCES if rng.random() < 0.5 else UNPRODUCTIVE_SENTENCES
+    sentences = []
+    count = 0
+    while count < words:
+        sentence = rng.choice(topic if rng.random() < 0.7 else FILLER_SENTENCES)
+        sentences.append(sentence)
+        count += len(sentence.split())
+    return ' '.join(sentences)
+
+
+def build_pdf(pages: List[str]) -> bytes:
+    """Minimal PDF with one line of Helvetica text per page"""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>']
+    kids = ' '.join(f'{3 + 2 * i} 0 R' for i in range(len(pages)))
+    objects.append(f'<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>'.encode())
+    font_id = 3 + 2 * len(pages)
+    for i, text in enumerate(pages):
+        escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        stream = f'BT /F1 10 Tf 40 760 Td ({escaped}) Tj ET'.encode('latin-1', errors='replace')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R '
+                       f'/Resources << /Font << /F1 {font_id} 0 R >> >> >>'.encode())
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        out += f'{offset:010d} 00000 n \n'.encode()
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return bytes(out)
+
+
+class TrafficMix:
+    """Builds the requests of each kind; all but duplicates are unique so they miss the result cache"""
+
+    def __init__(self, base_url: str, mix: Dict[str, int], seed: int, pdf_pages: int, duplicate_pool: int):
+        self.base_url = base_url.rstrip('/')
+        self.kinds = [kind for kind, weight in mix.items() if weight > 0]
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.pdf_pages = pdf_pages
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sequence = itertools.count()
+        self.duplicates = [build_email(self.rng, WORDS['short']) for _ in range(max(1, duplicate_pool))]
+
+    def _json_request(self, path: str, payload: Dict) -> urllib.request.Request:
+        return urllib.request.Request(self.base_url + path, data=json.dumps(payload).encode('utf-8'),
+                                      headers={'Content-Type': 'application/json'}, method='POST')
+
+    def _upload_request(self, filename: str, content: bytes) -> urllib.request.Request:
+        boundary = uuid.uuid4().hex
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="compact"\r\n\r\ntrue\r\n'
+                f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                f'Content-Type: application/pdf\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+        return urllib.request.Request(self.base_url + '/classify/upload', data=body,
+                                      headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+                                      method='POST')
+
+    def next_request(self) -> Tuple[str, urllib.request.Request]:
+        with self.lock:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            number = next(self.sequence)
+            if kind == 'duplicate':
+                return kind, self._json_request('/classify', {'content': self.rng.choice(self.duplicates),
+                                                              'source': 'loadtest'})
+            if kind == 'pdf':
+                pages = [build_email(self.rng, 60) for _ in range(self.pdf_pages)]
+            else:
+                content = build_email(self.rng, WORDS[kind])
+
+        # A referência única garante uma falha no cache de resultados
+        if kind == 'pdf':
+            pages[0] = f'Ref {number}. {pages[0]}'
+            return kind, self._upload_request(f'loadtest-{number}.pdf', build_pdf(pages))
+        return kind, self._json_request('/classify', {'content': f'Ref {number}. {content}', 'source': 'loadtest'})
+
+
+def send(request: urllib.request.Request, timeout: float) -> str:
+    """Outcome of one request: 'ok', the HTTP status of an error, 'timeout' or 'connection'"""
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return 'ok'
+    except urllib.error.HTTPError as e:
+        e.read()
+        return str(e.code)
+    except urllib.error.URLError as e:
+        return 'timeout' if isinstance(e.reason, socket.timeout) else 'connection'
+    except socket.timeout:
+        return 'timeout'
+    except (ConnectionError, OSError):
+        # Worker morto pelo timeout do gunicorn ou reciclado a meio do pedido
+        return 'connection'
+
+
+def worker_pids(master_pid: int) -> List[int]:
+    """Pids of the gunicorn master's child processes"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # O nome do processo pode conter espaços: os campos seguem o último ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == master_pid:
+            pids.append(int(entry))
+    return pids
+
+
+class MemorySampler:
+    """Samples the memory of every gunicorn worker in the background during a stage"""
+
+    def __init__(self, master_pid: Optional[int], interval: float):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.workers: Dict[int, Dict] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.master_pid is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        for pid in worker_pids(self.master_pid):
+            info = process_memory(pid)
+            if 'rssMb' not in info:
+                continue
+            worker = self.workers.setdefault(pid, {'pid': pid, 'samples': 0, 'maxRssMb': 0.0})
+            worker['samples'] += 1
+            worker['maxRssMb'] = max(worker['maxRssMb'], info['rssMb'])
+            worker.update({key: info[key] for key in ('rssMb', 'pssMb', 'sharedMb', 'privateMb') if key in info})
+
+    def report(self) -> Optional[Dict]:
+        if self.master_pid is None:
+            return None
+        workers = sorted(self.workers.values(), key=lambda worker: worker['pid'])
+        return {
+            'master': process_memory(self.master_pid),
+            # Mais pids do que workers configurados indica reciclagem (max_requests) ou timeouts
+            'workersSeen': len(workers),
+            'totalPssMb': round(sum(worker.get('pssMb', 0) for worker in workers), 1),
+            'workers': workers
+        }
+
+
+class StageRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results: List[Tuple[str, str, float]] = []
+
+    def record(self, kind: str, outcome: str, latency: float):
+        with self.lock:
+            self.results.append((kind, outcome, latency))
+
+
+def percentiles(latencies: List[float]) -> Dict:
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    latencies = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 2)
+
+    return {'p50_ms': percentile(50), 'p95_ms': percentile(95), 'p99_ms': percentile(99),
+            'max_ms': round(latencies[-1] * 1000, 2)}
+
+
+def summarize(results: List[Tuple[str, str, float]], elapsed: float) -> Dict:
+    total = len(results)
+    ok = [latency for _, outcome, latency in results if outcome == 'ok']
+    outcomes: Dict[str, int] = {}
+    for _, outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    by_kind = {}
+    for kind in KINDS:
+        kind_results = [(outcome, latency) for item_kind, outcome, latency in results if item_kind == kind]
+        if kind_results:
+            by_kind[kind] = {
+                'requests': len(kind_results),
+                'errors': sum(1 for outcome, _ in kind_results if outcome != 'ok'),
+                **percentiles([latency for outcome, latency in kind_results if outcome == 'ok'])
+            }
+
+    return {
+        'requests': total,
+        'ok': len(ok),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else None,
+        'error_rate': round((total - len(ok)) / total, 4) if total else None,
+        'timeout_rate': round(outcomes.get('timeout', 0) / total, 4) if total else None,
+        'outcomes': outcomes,
+        **percentiles(ok),
+        'by_kind': by_kind
+    }
+
+
+def run_closed_stage(mix: TrafficMix, concurrency: int, duration: float, timeout: float) -> Tuple[StageRecorder, float]:
+    recorder = StageRecorder()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            kind, request = mix.next_request()
+            start = time.perf_counter()
+            outcome = send(request, timeout)
+            recorder.record(kind, outcome, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - start
+
+
+def run_open_stage(mix: TrafficMix, rate: float, duration: float, timeout: float,
+                   max_clients: int) -> Tuple[StageRecorder, float]:
+    recorder = StageRecorder()
+
+    def fire(scheduled: float):
+        kind, request = mix.next_request()
+        outcome = send(request, timeout)
+        recorder.record(kind, outcome, time.perf_counter() - scheduled)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_clients) as executor:
+        for i in range(int(rate * duration)):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(fire, scheduled)
+    return recorder, time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, port: int, pidfile: str) -> subprocess.Popen:
+    """gunicorn with the project's gunicorn.conf.py; command-line options override the file"""
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+               '--chdir', BACKEND_DIR, '--bind', f'127.0.0.1:{port}', '--pid', pidfile]
+    for option, value in (('--workers', args.workers), ('--timeout', args.timeout),
+                          ('--max-requests', args.max_requests), ('--backlog', args.backlog)):
+        if value is not None:
+            command += [option, str(value)]
+    command += args.gunicorn_arg or []
+    command.append('app:app')
+
+    env = dict(os.environ)
+    for item in args.env or []:
+        key, _, value = item.partition('=')
+        env[key] = value
+
+    print(f"Starting: {' '.join(command)}", file=sys.stderr)
+    log = open(args.server_log, 'ab') if args.server_log else subprocess.DEVNULL
+    return subprocess.Popen(command, env=env, stdout=log, stderr=log)
+
+
+def wait_ready(base_url: str, timeout: float, require_model: bool, server: Optional[subprocess.Popen]):
+    url = f"{base_url}/health/ready{'?require_model=true' if require_model else ''}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode} during startup')
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f'Server not ready after {timeout}s ({url})')
+
+
+def server_settings(args, base_url: str) -> Dict:
+    """What the harness knows about the server under test, for comparing reports"""
+    settings = {'url': base_url, 'started_by_harness': args.url is None}
+    if args.url is None:
+        import multiprocessing
+        settings.update({
+            'workers': args.workers or multiprocessing.cpu_count() * 2 + 1,
+            'timeout': args.timeout or 30,
+            'max_requests': args.max_requests if args.max_requests is not None else 1000,
+            'backlog': args.backlog or 2048,
+            'gunicorn_args': args.gunicorn_arg or []
+        })
+    env = dict(os.environ)
+    env.update(dict(item.partition('=')[::2] for item in args.env or []))
+    settings['env'] = {key: env[key] for key in SERVER_ENV_KEYS if key in env}
+    try:
+        with urllib.request.urlopen(f'{base_url}/health', timeout=5) as response:
+            health = json.load(response)
+        settings['model_state'] = health.get('model_state')
+        settings['classification_mode'] = health.get('classification_mode')
+    except (urllib.error.URLError, OSError, ValueError):
+        pass
+    return settings
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for item in value.split(','):
+        kind, _, weight = item.partition('=')
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"unknown kind '{kind}' (use {', '.join(KINDS)})")
+        try:
+            mix[kind] = int(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight for '{kind}': {weight!r}")
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError('the mix needs at least one kind with a positive weight')
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end load test of the gunicorn deployment')
+    target = parser.add_argument_group('server')
+    target.add_argument('--url', help='test a running server instead of starting gunicorn')
+    target.add_argument('--workers', type=int, help='override gunicorn workers')
+    target.add_argument('--timeout', type=int, help='override gunicorn worker timeout (s)')
+    target.add_argument('--max-requests', type=int, help='override gunicorn max_requests (0 disables recycling)')
+    target.add_argument('--backlog', type=int, help='override gunicorn backlog')
+    target.add_argument('--gunicorn-arg', action='append', help='extra gunicorn argument (repeatable)')
+    target.add_argument('--env', action='append', help='KEY=VALUE for the server environment (repeatable)')
+    target.add_argument('--server-log', help='append the gunicorn output to this file')
+    target.add_argument('--startup-timeout', type=float, default=300)
+    target.add_argument('--require-model', action='store_true',
+                        help='wait for the AI model before starting the load')
+
+    load = parser.add_argument_group('load')
+    shape = load.add_mutually_exclusive_group()
+    shape.add_argument('--concurrency', type=int, nargs='+', help='closed-loop stages: concurrent clients')
+    shape.add_argument('--rate', type=float, nargs='+', help='open-loop stages: requests per second')
+    load.add_argument('--duration', type=float, default=30, help='seconds per stage')
+    load.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                      help=f'weights of each kind of request (default {DEFAULT_MIX})')
+    load.add_argument('--pdf-pages', type=int, default=20)
+    load.add_argument('--duplicate-pool', type=int, default=5, help='distinct emails reused by duplicates')
+    load.add_argument('--request-timeout', type=float, default=60, help='client timeout per request (s)')
+    load.add_argument('--max-clients', type=int, default=256, help='open loop: maximum requests in flight')
+    load.add_argument('--memory-interval', type=float, default=2.0, help='seconds between worker memory samples')
+    load.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    if args.url is None and not sys.platform.startswith('linux'):
+        parser.error('starting gunicorn requires Linux; use --url against a running server')
+    stages = [('rate', rate) for rate in args.rate] if args.rate else \
+        [('concurrency', concurrency) for concurrency in (args.concurrency or [1, 4, 8])]
+
+    server = None
+    pidfile = None
+    master_pid = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            port = free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            pidfile = os.path.join(tempfile.gettempdir(), f'loadtest-gunicorn-{os.getpid()}.pid')
+            server = start_server(args, port, pidfile)
+            master_pid = server.pid
+
+        started = time.perf_counter()
+        wait_ready(base_url, args.startup_timeout, args.require_model, server)
+        startup_seconds = time.perf_counter() - started
+        print(f"Server ready in {startup_seconds:.1f}s", file=sys.stderr)
+
+        mix = TrafficMix(base_url, args.mix, args.seed, args.pdf_pages, args.duplicate_pool)
+        results = []
+        for mode, level in stages:
+            with MemorySampler(master_pid, args.memory_interval) as sampler:
+                if mode == 'rate':
+                    recorder, elapsed = run_open_stage(mix, level, args.duration, args.request_timeout,
+                                                       args.max_clients)
+                else:
+                    recorder, elapsed = run_closed_stage(mix, level, args.duration, args.request_timeout)
+            stage = {mode: level, **summarize(recorder.results, elapsed), 'memory': sampler.report()}
+            results.append(stage)
+            print(f"{mode} {level:<6} {stage['throughput_rps']:>8} req/s  p50 {stage['p50_ms']} ms  "
+                  f"p95 {stage['p95_ms']} ms  p99 {stage['p99_ms']} ms  errors {stage['error_rate']:.2%}  "
+                  f"timeouts {stage['timeout_rate']:.2%}", file=sys.stderr)
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'seed': args.seed,
+                'mix': args.mix,
+                'pdf_pages': args.pdf_pages,
+                'duration_s': args.duration,
+                'request_timeout_s': args.request_timeout,
+                'startup_s': round(startup_seconds, 3)
+            },
+            'server': server_settings(args, base_url),
+            'stages': results
+        }
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if pidfile and os.path.exists(pidfile):
+            os.remove(pidfile)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
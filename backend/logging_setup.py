@@ -0,0 +1,161 @@
+"""
+Non-blocking structured logging: records go through a bounded queue to a background thread
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# Se os registos INFO/DEBUG do pedido em curso são emitidos; fora de pedidos tudo é emitido
+_request_sampled: ContextVar[bool] = ContextVar('log_request_sampled', default=True)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def sample_request(rate: float) -> bool:
+    """Decide whether the current request's verbose records are logged (call once per request)"""
+    sampled = rate >= 1 or random.random() < rate
+    _request_sampled.set(sampled)
+    return sampled
+
+
+def reset_request_sampling():
+    _request_sampled.set(True)
+
+
+class RequestSamplingFilter(logging.Filter):
+    """Drops INFO and DEBUG records of requests left out of the sample; warnings always pass"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.INFO or _request_sampled.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, pid and the exception if any"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves the line formatting to the listener thread.
+
+    prepare() only runs for records that passed the level and sampling checks.
+    It merges msg and args there, in the caller's thread, because the args may
+    be mutable objects that change before the listener gets to them; the
+    tracebacks are rendered too, since they refer to live frames. Building
+    the JSON or text line and writing it happen in the listener. When the
+    queue is full, records are dropped and counted instead of blocking.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AsyncLogging:
+    """Root QueueHandler plus the QueueListener thread that owns the real handlers.
+
+    Threads do not survive fork(), so each child process (gunicorn workers
+    forked after preload) gets a fresh queue and its own listener thread.
+    """
+
+    def __init__(self, handlers, queue_size: int):
+        self.handlers = handlers
+        self.queue_size = queue_size
+        self.handler = LazyQueueHandler(queue.Queue(queue_size))
+        self.listener = None
+
+    def start(self):
+        self.listener = logging.handlers.QueueListener(self.handler.queue, *self.handlers,
+                                                       respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _after_fork_in_child(self):
+        # O thread do listener e o conteúdo da fila ficaram no processo pai
+        self.listener = None
+        self.handler.queue = queue.Queue(self.queue_size)
+        self.handler.dropped = 0
+        self.start()
+
+
+_async_logging = None
+
+
+def configure_logging(config) -> AsyncLogging:
+    """Route the root logger through a background queue, with Config's level, file and format.
+
+    LOG_LEVEL sets the root level, so disabled records are never created.
+    LOG_FILE, when set, adds a file next to the console output. LOG_FORMAT
+    chooses json or text lines. LOG_SAMPLE_RATE is applied per request, through
+    sample_request() at the start of each request.
+    """
+    global _async_logging
+    if _async_logging is not None:
+        return _async_logging
+
+    formatter = JsonFormatter() if config.LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if config.LOG_FILE:
+        handlers.append(logging.FileHandler(config.LOG_FILE, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    async_logging = AsyncLogging(handlers, config.LOG_QUEUE_SIZE)
+    async_logging.handler.addFilter(RequestSamplingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(async_logging.handler)
+    root.setLevel(getattr(logging, str(config.LOG_LEVEL).upper(), logging.INFO))
+
+    async_logging.start()
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=async_logging._after_fork_in_child)
+    # Esvazia a fila antes de o processo terminar
+    atexit.register(async_logging.stop)
+
+    _async_logging = async_logging
+    return async_logging
+
+
+def dropped_records() -> int:
+    return _async_logging.handler.dropped if _async_logging is not None else 0
@@ -0,0 +1,160 @@
+"""
+Incremental parsing of mbox streams and multi-.eml uploads
+"""
+import html
+import re
+from email import policy
+from email.feedparser import BytesFeedParser
+from email.message import EmailMessage
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+_FROM_LINE_RE = re.compile(rb'^>+From ')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_HTML_SKIP_RE = re.compile(r'<(script|style)\b.*?</\1>', re.IGNORECASE | re.DOTALL)
+
+
+class MboxSplitter:
+    """Splits an mbox byte stream into messages as the bytes arrive.
+
+    Messages start at "From " separator lines (at the start of the stream or
+    after a blank line); ">From " escaped lines are unescaped. A stream without
+    any separator is treated as a single message, so plain .eml data works too.
+    Only max_message_bytes of each message are kept; the rest is skipped, so
+    memory stays flat regardless of the archive size.
+    """
+
+    def __init__(self, max_message_bytes: int):
+        self.max_message_bytes = max_message_bytes
+        self._pending = b''
+        self._parser: Optional[BytesFeedParser] = None
+        self._size = 0
+        self._previous_blank = True
+
+    def feed(self, data: bytes) -> Iterator[EmailMessage]:
+        """Consume a chunk of bytes, yielding every message completed by it"""
+        self._pending += data
+        lines = self._pending.split(b'\n')
+        self._pending = lines.pop()
+        for line in lines:
+            message = self._feed_line(line + b'\n')
+            if message is not None:
+                yield message
+        if len(self._pending) > self.max_message_bytes:
+            # Linha gigante sem quebra (ex.: base64 contínuo): não a acumula em memória
+            message = self._feed_line(self._pending)
+            self._pending = b''
+            if message is not None:
+                yield message
+
+    def close(self) -> Iterator[EmailMessage]:
+        """Flush the last message at the end of the stream"""
+        if self._pending:
+            message = self._feed_line(self._pending)
+            self._pending = b''
+            if message is not None:
+                yield message
+        message = self._finish()
+        if message is not None:
+            yield message
+
+    def _feed_line(self, line: bytes) -> Optional[EmailMessage]:
+        finished = None
+        if line.startswith(b'From ') and self._previous_blank:
+            finished = self._finish()
+            self._start()
+            self._previous_blank = False
+            return finished
+
+        if self._parser is None:
+            self._start()
+        if _FROM_LINE_RE.match(line):
+            line = line[1:]
+        if self._size < self.max_message_bytes:
+            self._parser.feed(line[:self.max_message_bytes - self._size])
+            self._size += len(line)
+        self._previous_blank = line.strip() == b''
+        return finished
+
+    def _start(self):
+        self._parser = BytesFeedParser(policy=policy.default)
+        self._size = 0
+
+    def _finish(self) -> Optional[EmailMessage]:
+        if self._parser is None or self._size == 0:
+            self._parser = None
+            return None
+        message = self._parser.close()
+        self._parser = None
+        return message
+
+
+def iter_mbox_messages(stream: BinaryIO, chunk_size: int, max_message_bytes: int) -> Iterator[Tuple[Optional[str], EmailMessage]]:
+    """Yield (filename, message) pairs from a raw mbox (or single .eml) stream"""
+    splitter = MboxSplitter(max_message_bytes)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        for message in splitter.feed(chunk):
+            yield None, message
+    for message in splitter.close():
+        yield None, message
+
+
+def iter_multipart_messages(stream: BinaryIO, boundary: str, chunk_size: int,
+                            max_message_bytes: int) -> Iterator[Tuple[Optional[str], EmailMessage]]:
+    """Yield (filename, message) pairs from a multipart upload of .eml/.mbox files.
+
+    The multipart body is decoded incrementally; every file part is split into
+    messages as its bytes arrive, without spooling the upload to disk.
+    """
+    decoder = MultipartDecoder(boundary.encode('latin-1'), max_form_memory_size=max_message_bytes)
+    splitter = None
+    filename = None
+
+    while True:
+        chunk = stream.read(chunk_size)
+        decoder.receive_data(chunk or None)
+
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                break
+            if isinstance(event, Epilogue):
+                return
+            if isinstance(event, File):
+                filename = event.filename
+                splitter = MboxSplitter(max_message_bytes)
+            elif isinstance(event, Data) and splitter is not None:
+                for message in splitter.feed(event.data):
+                    yield filename, message
+                if not event.more_data:
+                    for message in splitter.close():
+                        yield filename, message
+                    splitter = None
+
+        if not chunk:
+            return
+
+
+def extract_text(message: EmailMessage) -> str:
+    """Subject plus the plain-text body of a message (HTML is stripped as a fallback)"""
+    subject = str(message.get('subject', '') or '')
+    try:
+        part = message.get_body(preferencelist=('plain', 'html'))
+    except (KeyError, LookupError):
+        part = None
+
+    body = ''
+    if part is not None:
+        try:
+            body = part.get_content()
+        except (KeyError, LookupError, UnicodeDecodeError):
+            payload = part.get_payload(decode=True) or b''
+            body = payload.decode('utf-8', errors='replace')
+        if part.get_content_type() == 'text/html':
+            body = html.unescape(_HTML_TAG_RE.sub(' ', _HTML_SKIP_RE.sub(' ', body)))
+
+    return f"{subject}\n\n{body}".strip() if subject else body.strip()
@@ -0,0 +1,143 @@
+"""
+Precompiled multi-pattern index for keywords, spam triggers and response templates
+"""
+import hashlib
+import re
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+Label = Tuple[str, str]
+
+
+class PatternMatcher:
+    """Finds every pattern that occurs in a text with a single regex scan.
+
+    The patterns are compiled into a trie-shaped regex inside a lookahead, so
+    the scan reports a (possibly overlapping) match at every position. At each
+    position the regex yields the longest pattern; every shorter pattern that
+    also matches there is a prefix of it and is added back from a precomputed
+    prefix table.
+    """
+
+    def __init__(self, patterns: Dict[str, Set[Label]]):
+        patterns = {pattern: labels for pattern, labels in patterns.items() if pattern}
+        self._labels: Dict[str, frozenset] = {}
+        for pattern in patterns:
+            labels = set()
+            for other, other_labels in patterns.items():
+                if pattern.startswith(other):
+                    labels.update(other_labels)
+            self._labels[pattern] = frozenset(labels)
+
+        self._regex = None
+        if patterns:
+            self._regex = re.compile('(?=(' + self._trie_pattern(patterns) + '))')
+
+    @staticmethod
+    def _trie_pattern(words: Iterable[str]) -> str:
+        """Build a regex alternation shaped like a trie of the given words"""
+        trie: Dict = {}
+        for word in words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def build(node: Dict) -> str:
+            terminal = '' in node
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            if terminal:
+                # Greedy: prefer extending to a longer word, fall back to stopping here
+                return body + '?' if len(branches) == 1 and len(body) == 1 else '(?:' + body + ')?'
+            return body
+
+        return build(trie)
+
+    def findall(self, text: str) -> Set[Label]:
+        """Return the labels of all patterns occurring anywhere in the text"""
+        if self._regex is None:
+            return set()
+        matched = {match.group(1) for match in self._regex.finditer(text)}
+        found: Set[Label] = set()
+        for pattern in matched:
+            found.update(self._labels[pattern])
+        return found
+
+
+class KeywordIndex:
+    """Immutable index of keyword groups (matched against stemmed tokens) and
+    phrase groups (matched against the raw lowercased content).
+
+    A keyword matches a token when the keyword or its stem is a substring of the
+    token, or the token is a substring of the keyword or its stem, exactly like
+    the original nested-loop matching in EmailClassifier.find_keywords.
+    Instances are never mutated, so a rebuilt index can be swapped in with a
+    single attribute assignment.
+    """
+
+    def __init__(self, keyword_groups: Dict[str, Iterable[str]], phrase_groups: Dict[str, Iterable[str]],
+                 stem: Callable[[str], str], version: int = 0):
+        self.keyword_groups = {name: frozenset(words) for name, words in keyword_groups.items()}
+        self.phrase_groups = {name: tuple(phrases) for name, phrases in phrase_groups.items()}
+        self.version = version
+        self.fingerprint = self._fingerprint()
+
+        # Substrings searched inside tokens, and tokens that are substrings of a keyword form
+        token_patterns: Dict[str, Set[Label]] = defaultdict(set)
+        self._token_fragments: Dict[str, Set[Label]] = defaultdict(set)
+        for group, words in self.keyword_groups.items():
+            for keyword in words:
+                label = (group, keyword)
+                for form in {keyword, stem(keyword)}:
+                    token_patterns[form].add(label)
+                    for start in range(len(form)):
+                        for end in range(start + 1, len(form) + 1):
+                            self._token_fragments[form[start:end]].add(label)
+        self._token_matcher = PatternMatcher(token_patterns)
+
+        phrase_patterns: Dict[str, Set[Label]] = defaultdict(set)
+        for group, phrases in self.phrase_groups.items():
+            for phrase in phrases:
+                phrase_patterns[phrase].add((group, phrase))
+        self._phrase_matcher = PatternMatcher(phrase_patterns)
+
+    def _fingerprint(self) -> str:
+        """Stable hash of the indexed words, identical across processes"""
+        digest = hashlib.sha1()
+        for groups in (self.keyword_groups, self.phrase_groups):
+            for name in sorted(groups):
+                digest.update(name.encode('utf-8'))
+                for word in sorted(groups[name]):
+                    digest.update(b'\0' + word.encode('utf-8'))
+                digest.update(b'\1')
+        return digest.hexdigest()[:16]
+
+    def match_tokens(self, tokens: List[str]) -> Dict[str, List[str]]:
+        """Return the keywords of each group found in the preprocessed tokens"""
+        unique_tokens = set(tokens)
+        # Tokens never contain NUL, so no pattern can match across two tokens
+        hits = self._token_matcher.findall('\0'.join(unique_tokens))
+        for token in unique_tokens:
+            hits.update(self._token_fragments.get(token, ()))
+
+        found = {group: set() for group in self.keyword_groups}
+        for group, keyword in hits:
+            found[group].add(keyword)
+        return {group: list(keywords) for group, keywords in found.items()}
+
+    def match_phrases(self, content: str) -> Dict[str, Set[str]]:
+        """Return the phrases of each group occurring in the content"""
+        found = {group: set() for group in self.phrase_groups}
+        for group, phrase in self._phrase_matcher.findall(content.lower()):
+            found[group].add(phrase)
+        return found
+
+    def scan(self, content: str, tokens: List[str]) -> Dict:
+        """Collect all keyword and phrase hits for one email"""
+        return {
+            "keywords": self.match_tokens(tokens),
+            "phrases": self.match_phrases(content)
+        }
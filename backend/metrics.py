@@ -0,0 +1,162 @@
+"""
+Prometheus metrics for the classification pipeline.
+
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(set up in gunicorn.conf.py) and /metrics aggregates all of them, whichever
+worker answers the scrape. Without that variable (python app.py) the default
+single-process registry is used. prometheus_client is optional: without it
+every metric is a no-op and /metrics reports that it is unavailable.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+import profiling
+from config import get_config
+
+config = get_config()
+
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client import multiprocess
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:
+    prometheus_client = None
+
+enabled = config.METRICS_ENABLED and prometheus_client is not None
+
+# Latência por etapa: de sub-milissegundo (palavras-chave) a dezenas de segundos (modelo)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LENGTH_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+    def set(self, value: float):
+        pass
+
+
+if enabled:
+    CLASSIFICATIONS = Counter('clearbox_classifications_total', 'Classified emails by category and method',
+                              ['category', 'method'])
+    STAGE_LATENCY = Histogram('clearbox_stage_duration_seconds', 'Duration of each classification pipeline stage',
+                              ['stage'], buckets=STAGE_BUCKETS)
+    INPUT_LENGTH = Histogram('clearbox_input_length_chars', 'Length of the classified emails in characters',
+                             buckets=LENGTH_BUCKETS)
+    AI_FALLBACKS = Counter('clearbox_ai_fallbacks_total', 'AI classifications that failed and fell back to keywords',
+                           ['mode'])
+    NEAR_DUPLICATE_LOOKUPS = Counter('clearbox_near_duplicate_lookups_total',
+                                     'Near-duplicate index lookups by outcome', ['outcome'])
+    CASCADE_DECISIONS = Counter('clearbox_cascade_decisions_total', 'Emails decided by each cascade stage',
+                                ['stage'])
+    CASCADE_AGREEMENT = Counter('clearbox_cascade_agreement_total',
+                                'Keyword/model comparisons by keyword confidence bucket and outcome',
+                                ['bucket', 'outcome'])
+    CASCADE_AUDITS = Counter('clearbox_cascade_audits_total', 'Keyword decisions re-checked by the model')
+    # liveall: uma série por worker vivo, para ver qual ainda não tem o modelo
+    MODEL_LOADED = Gauge('clearbox_model_loaded', '1 when the AI model is loaded in the worker process',
+                         multiprocess_mode='liveall')
+else:
+    CLASSIFICATIONS = STAGE_LATENCY = INPUT_LENGTH = AI_FALLBACKS = NEAR_DUPLICATE_LOOKUPS = MODEL_LOADED = _NoopMetric()
+    CASCADE_DECISIONS = CASCADE_AGREEMENT = CASCADE_AUDITS = _NoopMetric()
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Observe the duration of the enclosed block in the stage latency histogram.
+
+    The duration also goes to the current request's profile, when it is being profiled.
+    """
+    profile_stages = profiling.current_stages()
+    if not enabled and profile_stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if enabled:
+            STAGE_LATENCY.labels(stage=stage).observe(elapsed)
+        if profile_stages is not None:
+            profiling.record(profile_stages, stage, elapsed)
+
+
+def record_classification(content: str, result: Dict):
+    """Count one classified email by category and method, and its input length"""
+    if 'error' in result:
+        return
+    CLASSIFICATIONS.labels(category=result['category'], method=result['classificationMethod']).inc()
+    INPUT_LENGTH.observe(len(content))
+
+
+def set_model_loaded(loaded: bool):
+    MODEL_LOADED.set(1 if loaded else 0)
+
+
+class AdmissionCollector:
+    """Reads the admission controller's shared counters at scrape time.
+
+    Those counters already live in memory shared by every worker, so they are
+    exported as-is instead of through the per-process sample files.
+    """
+
+    def __init__(self, admission):
+        self.admission = admission
+
+    def collect(self):
+        snapshot = self.admission.snapshot()
+        yield GaugeMetricFamily('clearbox_admission_queue_depth', 'Requests waiting for an inference slot',
+                                value=snapshot['queue_depth'])
+        yield GaugeMetricFamily('clearbox_admission_active', 'Inferences currently running',
+                                value=snapshot['active'])
+        yield GaugeMetricFamily('clearbox_admission_model_seconds', 'Moving average of model time per email',
+                                value=snapshot['model_seconds_avg'])
+        shed = CounterMetricFamily('clearbox_admission_shed', 'Requests shed by admission control', labels=['reason'])
+        for reason, count in snapshot['shed'].items():
+            shed.add_metric([reason], count)
+        yield shed
+
+
+_admission_collector = None
+
+
+def register_admission(admission):
+    """Export the admission controller's queue depth and shed counts"""
+    global _admission_collector
+    if not enabled:
+        return
+    _admission_collector = AdmissionCollector(admission)
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        prometheus_client.REGISTRY.register(_admission_collector)
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition-format payload and its content type, aggregated across workers"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        if _admission_collector is not None:
+            registry.register(_admission_collector)
+    else:
+        registry = prometheus_client.REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Drop the live-only samples of a worker that exited (gunicorn child_exit hook)"""
+    if enabled and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
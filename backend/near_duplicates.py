@@ -0,0 +1,154 @@
+"""
+Near-duplicate index: reuses the classification of a recently seen, almost identical email
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+FINGERPRINT_BITS = 64
+# Emails longos são comparados só pelos primeiros tokens, o que limita o custo do SimHash
+MAX_FINGERPRINT_TOKENS = 2048
+
+
+def simhash(tokens: List[str]) -> int:
+    """64-bit SimHash of the preprocessed tokens, each weighted by how often it occurs.
+
+    Stems are used on their own rather than as n-gram shingles: variants of the
+    same campaign then differ only by the few swapped names or links, while
+    n-grams would spread each substitution over several features.
+    """
+    features = Counter(tokens[:MAX_FINGERPRINT_TOKENS])
+
+    weights = [0] * FINGERPRINT_BITS
+    for feature, count in features.items():
+        value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class NearDuplicateIndex:
+    """Recent model results indexed by SimHash, looked up by Hamming distance.
+
+    A similarity threshold t allows fingerprints that differ in at most
+    floor(64 * (1 - t)) bits. The fingerprint is split into one more band than
+    that, so any neighbour within the distance shares at least one band exactly
+    and is found through the band buckets without scanning the index.
+
+    Entries are kept per worker process, in insertion order: the oldest are
+    evicted past max_entries, and entries older than ttl_seconds are never
+    reused. Each entry records the model/keywords version it was computed
+    with, and only matches lookups for the same version.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: int, min_tokens: int):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.max_distance = int(FINGERPRINT_BITS * (1 - threshold))
+
+        bands = min(self.max_distance + 1, FINGERPRINT_BITS)
+        width = FINGERPRINT_BITS // bands
+        # A última banda fica com os bits que sobram da divisão
+        self._bands = [(i * width, FINGERPRINT_BITS if i == bands - 1 else (i + 1) * width) for i in range(bands)]
+        self._buckets: List[Dict[int, set]] = [{} for _ in self._bands]
+        self._entries: 'OrderedDict[int, Tuple[int, str, Dict, float]]' = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.reuses = 0
+        self.skipped = 0
+        self.evictions = 0
+
+    def _band_values(self, fingerprint: int):
+        for start, end in self._bands:
+            yield fingerprint >> start & ((1 << (end - start)) - 1)
+
+    def fingerprint(self, tokens: List[str]) -> Optional[int]:
+        """SimHash of the preprocessed tokens, or None when the email is too short to compare"""
+        if len(tokens) < self.min_tokens:
+            with self._lock:
+                self.skipped += 1
+            return None
+        return simhash(tokens)
+
+    def find(self, fingerprint: int, version: str) -> Optional[Tuple[Dict, float]]:
+        """Copy of the closest recent result within the threshold, and its similarity"""
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            self.lookups += 1
+
+            candidates = set()
+            for buckets, value in zip(self._buckets, self._band_values(fingerprint)):
+                candidates.update(buckets.get(value, ()))
+
+            best = None
+            best_distance = self.max_distance + 1
+            for entry_id in candidates:
+                entry_fingerprint, entry_version, result, _ = self._entries[entry_id]
+                if entry_version != version:
+                    continue
+                distance = bin(entry_fingerprint ^ fingerprint).count('1')
+                if distance < best_distance:
+                    best, best_distance = result, distance
+
+            if best is None:
+                return None
+            self.reuses += 1
+        return dict(best), round(1 - best_distance / FINGERPRINT_BITS, 4)
+
+    def add(self, fingerprint: int, version: str, result: Dict):
+        now = time.time()
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (fingerprint, version, dict(result), now)
+            for buckets, value in zip(self._buckets, self._band_values(fingerprint)):
+                buckets.setdefault(value, set()).add(entry_id)
+
+            self._evict_expired(now)
+            while len(self._entries) > self.max_entries:
+                self._remove_oldest()
+
+    def _evict_expired(self, now: float):
+        # Entradas em ordem de inserção: as expiradas estão todas no início
+        while self._entries and now - next(iter(self._entries.values()))[3] > self.ttl_seconds:
+            self._remove_oldest()
+
+    def _remove_oldest(self):
+        entry_id, (fingerprint, _, _, _) = self._entries.popitem(last=False)
+        for buckets, value in zip(self._buckets, self._band_values(fingerprint)):
+            bucket = buckets[value]
+            bucket.discard(entry_id)
+            if not bucket:
+                del buckets[value]
+        self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups, reuses = self.lookups, self.reuses
+            size, skipped, evictions = len(self._entries), self.skipped, self.evictions
+        return {
+            'enabled': True,
+            'worker_pid': os.getpid(),
+            'threshold': self.threshold,
+            'max_distance': self.max_distance,
+            'lookups': lookups,
+            'reuses': reuses,
+            'reuse_rate': round(reuses / lookups, 4) if lookups else 0.0,
+            'skipped_short': skipped,
+            'size': size,
+            'max_entries': self.max_entries,
+            'evictions': evictions,
+            'ttl_seconds': self.ttl_seconds
+        }
@@ -0,0 +1,144 @@
+"""
+Parity check between inference backends.
+
+Runs the zero-shot classification of a sample corpus through the reference
+backend (full-precision torch) and a candidate backend (torch-int8 or onnx)
+and compares top labels and scores, plus per-email latency.
+
+Usage:
+    python backend/parity_check.py --backend onnx [--corpus emails.jsonl] [--output parity.json]
+
+The corpus may be a .jsonl file (one object per line with a "content" or
+"body" field) or a .txt file with one email per line. Exits with status 1 if
+label agreement or score differences are outside the given tolerances.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_config
+from classifier import EmailClassifier
+from inference import INFERENCE_BACKENDS, load_zero_shot_pipeline
+
+config = get_config()
+
+# Os rótulos de produção; como o classify_with_ai, não se passa hypothesis_template,
+# por isso os dois usam o template por omissão do pipeline
+CANDIDATE_LABELS = EmailClassifier.candidate_labels
+
+SAMPLE_CORPUS = [
+    "Olá, gostaria de agendar uma reunião para discutir o projeto na próxima semana.",
+    "Segue em anexo o relatório mensal de vendas para revisão até sexta-feira.",
+    "Prezados, o prazo de entrega do módulo de faturamento foi adiado para dia 15.",
+    "Bom dia equipe, por favor revisem a proposta do cliente antes da reunião de amanhã.",
+    "Hi team, the deadline for the quarterly report has moved to Thursday.",
+    "Can we schedule a meeting to review the project budget with the supplier?",
+    "Please find attached the contract draft for your approval.",
+    "Promoção imperdível! Ganhe 50% de desconto em todos os produtos, clique aqui.",
+    "Parabéns! Você foi selecionado para ganhar um prêmio exclusivo. Cadastre-se já.",
+    "Oportunidade única de investimento com lucro garantido, renda extra fácil.",
+    "Congratulations! You have won the annual international lottery, claim your prize now.",
+    "Limited time offer: buy one get one free, exclusive discount for subscribers.",
+    "Earn money fast working from home, click here to start today.",
+    "Newsletter semanal: confira as novidades e ofertas da nossa loja.",
+    "Lembrete: a apresentação do planejamento estratégico começa às 14h na sala 3.",
+    "Dear customer, your account was selected as a winner, contact our agent with your details."
+]
+
+
+def load_corpus(path: str) -> List[str]:
+    """Read emails from a .jsonl or plain text file"""
+    emails = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith('.jsonl'):
+                item = json.loads(line)
+                emails.append(item.get('content') or item.get('body') or '')
+            else:
+                emails.append(line)
+    return [email for email in emails if email]
+
+
+def run_backend(backend: str, corpus: List[str]) -> Dict:
+    """Classify the corpus one email at a time, like classify_with_ai does"""
+    load_start = time.perf_counter()
+    model = load_zero_shot_pipeline(config.AI_MODEL_NAME, config.HF_CACHE_DIR,
+                                    backend=backend, onnx_dir=config.ONNX_MODEL_DIR)
+    load_time = time.perf_counter() - load_start
+
+    # Aquece kernels antes de medir
+    model(corpus[0], CANDIDATE_LABELS, multi_label=False)
+
+    outputs, latencies = [], []
+    for email in corpus:
+        start = time.perf_counter()
+        result = model(email, CANDIDATE_LABELS, multi_label=False)
+        latencies.append(time.perf_counter() - start)
+        outputs.append(dict(zip(result['labels'], result['scores'])))
+
+    return {'outputs': outputs, 'latencies': latencies, 'load_time': load_time}
+
+
+def compare(reference: Dict, candidate: Dict) -> Dict:
+    """Compare label agreement and score deltas between two backend runs"""
+    agreements = 0
+    deltas = []
+    for ref_scores, cand_scores in zip(reference['outputs'], candidate['outputs']):
+        if max(ref_scores, key=ref_scores.get) == max(cand_scores, key=cand_scores.get):
+            agreements += 1
+        deltas.append(max(abs(ref_scores[label] - cand_scores[label]) for label in ref_scores))
+
+    total = len(deltas)
+    return {
+        'emails': total,
+        'label_agreement': agreements / total,
+        'max_score_delta': max(deltas),
+        'mean_score_delta': statistics.mean(deltas),
+        'reference_mean_latency_ms': statistics.mean(reference['latencies']) * 1000,
+        'candidate_mean_latency_ms': statistics.mean(candidate['latencies']) * 1000,
+        'reference_load_time_s': reference['load_time'],
+        'candidate_load_time_s': candidate['load_time']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare inference backends against the torch reference')
+    parser.add_argument('--backend', required=True, choices=[b for b in INFERENCE_BACKENDS if b != 'torch'])
+    parser.add_argument('--corpus', help='.jsonl or .txt corpus (default: built-in PT/EN sample)')
+    parser.add_argument('--min-agreement', type=float, default=1.0, help='minimum top-label agreement')
+    parser.add_argument('--max-score-delta', type=float, default=0.05, help='maximum absolute score difference')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else SAMPLE_CORPUS
+
+    print(f"Running reference backend 'torch' on {len(corpus)} emails...")
+    reference = run_backend('torch', corpus)
+    print(f"Running candidate backend '{args.backend}'...")
+    candidate = run_backend(args.backend, corpus)
+
+    report = compare(reference, candidate)
+    report['backend'] = args.backend
+    report['model'] = config.AI_MODEL_NAME
+    report['passed'] = (report['label_agreement'] >= args.min_agreement
+                        and report['max_score_delta'] <= args.max_score_delta)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(0 if report['passed'] else 1)
+
+
+if __name__ == '__main__':
+    main()
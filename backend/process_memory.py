@@ -0,0 +1,56 @@
+"""
+Per-process memory figures: how much of a worker's RSS is shared with its siblings
+"""
+import os
+import resource
+from typing import Dict
+
+# Campos de /proc/<pid>/smaps_rollup, em kB
+_SMAPS_FIELDS = {
+    'Rss': 'rssMb',
+    'Pss': 'pssMb',
+    'Shared_Clean': 'sharedCleanMb',
+    'Shared_Dirty': 'sharedDirtyMb',
+    'Private_Clean': 'privateCleanMb',
+    'Private_Dirty': 'privateDirtyMb',
+}
+
+
+def _read_smaps_rollup(pid) -> Dict[str, float]:
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in _SMAPS_FIELDS:
+                values[_SMAPS_FIELDS[name]] = round(int(rest.split()[0]) / 1024, 1)
+    return values
+
+
+def process_memory(pid='self') -> Dict:
+    """RSS, PSS and shared/private split of a process, in MB.
+
+    Shared pages (mmap'd weights, pre-fork heap not yet written to) count once
+    per worker in RSS but are split between them in PSS, so PSS is the figure
+    to add up across workers. Without smaps_rollup (older kernels, non-Linux)
+    only the peak RSS of this process is reported.
+    """
+    info = {'pid': os.getpid() if pid == 'self' else pid}
+    try:
+        info.update(_read_smaps_rollup(pid))
+    except (OSError, ValueError, IndexError):
+        if pid == 'self':
+            # ru_maxrss é em kB no Linux
+            info['maxRssMb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        return info
+
+    info['sharedMb'] = round(info.get('sharedCleanMb', 0) + info.get('sharedDirtyMb', 0), 1)
+    info['privateMb'] = round(info.get('privateCleanMb', 0) + info.get('privateDirtyMb', 0), 1)
+    return info
+
+
+def describe(info: Dict) -> str:
+    """One-line summary for the logs"""
+    if 'rssMb' not in info:
+        return f"pid {info['pid']}: max RSS {info.get('maxRssMb', '?')} MB"
+    return (f"pid {info['pid']}: RSS {info['rssMb']} MB, PSS {info.get('pssMb', '?')} MB, "
+            f"shared {info['sharedMb']} MB, private {info['privateMb']} MB")
@@ -0,0 +1,125 @@
+"""
+Opt-in per-request profiling: stage timings for the response and cProfile captures of slow requests
+"""
+import cProfile
+import itertools
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tempos por etapa do pedido em curso; None quando o pedido não é perfilado
+_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar('profile_stages', default=None)
+
+_UNSAFE_NAME_RE = re.compile(r'[^A-Za-z0-9_.-]+')
+# Distingue perfis do mesmo processo gravados no mesmo segundo
+_sequence = itertools.count()
+
+
+def current_stages() -> Optional[Dict[str, float]]:
+    return _stages.get()
+
+
+def record(stages: Dict[str, float], stage: str, seconds: float):
+    stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block into the current request's breakdown, if it is being profiled"""
+    stages = _stages.get()
+    if stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stages, name, time.perf_counter() - start)
+
+
+class RequestProfile:
+    """Stage timings of one request and, when capture is on, a cProfile of it.
+
+    Stage timings are collected by metrics.stage_timer (and stage()) for
+    whatever runs in the request's thread while the profile is active.
+    """
+
+    def __init__(self, capture: bool):
+        self.stages: Dict[str, float] = {}
+        self.profiler = cProfile.Profile() if capture else None
+        self.total = None
+        self._token = None
+        self._start = None
+
+    def start(self):
+        self._token = _stages.set(self.stages)
+        if self.profiler is not None:
+            try:
+                self.profiler.enable()
+            except ValueError as e:
+                # Outro profiler já ativo neste processo (por exemplo um depurador)
+                logger.warning("cProfile unavailable for this request: %s", e)
+                self.profiler = None
+        self._start = time.perf_counter()
+
+    def stop(self):
+        if self._token is None:
+            return
+        self.total = time.perf_counter() - self._start
+        if self.profiler is not None:
+            self.profiler.disable()
+        _stages.reset(self._token)
+        self._token = None
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={self.total * 1000:.3f}")
+        return ', '.join(entries)
+
+    def save(self, directory: str, max_bytes: int, endpoint: str) -> Optional[str]:
+        """Write the cProfile stats (pstats format) and trim the directory to max_bytes"""
+        if self.profiler is None:
+            return None
+        name = (f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_sequence)}-"
+                f"{_UNSAFE_NAME_RE.sub('_', endpoint or 'unknown')}-{int(self.total * 1000)}ms.prof")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.profiler.dump_stats(os.path.join(directory, name))
+            trim_directory(directory, max_bytes)
+        except OSError as e:
+            logger.warning("Could not save request profile: %s", e)
+            return None
+        return name
+
+
+def trim_directory(directory: str, max_bytes: int):
+    """Delete the oldest .prof files until the directory holds at most max_bytes of them.
+
+    The newest file is always kept, even when it alone is over the cap.
+    """
+    files = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.prof'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files)[:-1]:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Outro worker já o removeu
+            pass
+        total -= size
@@ -0,0 +1,210 @@
+"""
+Classification result cache shared by all worker processes
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Contadores de hits/misses acumulados em memória e gravados em lote
+STATS_FLUSH_LOOKUPS = 100
+STATS_FLUSH_SECONDS = 10
+# accessed_at só é regravado quando tem mais do que isto: a ordem LRU fica com esta resolução
+TOUCH_INTERVAL_SECONDS = 60
+# Expiração e limite de tamanho verificados a cada N escritas ou T segundos, por processo
+EVICTION_CHECK_WRITES = 50
+EVICTION_CHECK_SECONDS = 30
+
+
+class ResultCache:
+    """LRU + TTL cache of classification results backed by a local SQLite file.
+
+    Every gunicorn worker opens its own connection to the same database file,
+    so entries and hit/miss counters are shared across processes. Connections
+    are created lazily per process and thread, which keeps the cache safe to
+    construct before gunicorn forks its workers.
+
+    A hit is a single SELECT in the common case: hit/miss counts are kept per
+    process and flushed in batches, accessed_at is rewritten only when it is
+    older than TOUCH_INTERVAL_SECONDS, and the TTL and size limits are
+    enforced every few writes rather than on each one, so the table can run
+    a little over max_entries between checks.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._pending = {'hits': 0, 'misses': 0}
+        self._last_flush = time.monotonic()
+        self._writes = 0
+        self._last_check = time.monotonic()
+        # Com poucos lugares o limite é verificado mais vezes, para não o ultrapassar muito
+        self._check_every = max(1, min(EVICTION_CHECK_WRITES, max_entries // 20))
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO stats (name, value) VALUES ('hits', 0), ('misses', 0)")
+        atexit.register(self.flush_stats)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection of the current process and thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def make_key(content: str, model_version: str, keywords_version: str) -> str:
+        """Build a cache key from the normalized content and the classifier versions"""
+        normalized = ' '.join(content.split())
+        digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        return f"{model_version}:{keywords_version}:{digest}"
+
+    def _reset_after_fork(self):
+        # Contagens herdadas do processo pai já são dele; cada worker começa do zero
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = {'hits': 0, 'misses': 0}
+            self._writes = 0
+            self._last_flush = self._last_check = time.monotonic()
+
+    def _count(self, conn: sqlite3.Connection, name: str):
+        """Count a hit or miss locally, writing the batch once it is big or old enough"""
+        with self._lock:
+            self._reset_after_fork()
+            self._pending[name] += 1
+            if (sum(self._pending.values()) < STATS_FLUSH_LOOKUPS
+                    and time.monotonic() - self._last_flush < STATS_FLUSH_SECONDS):
+                return
+            pending = self._pending
+            self._pending = {'hits': 0, 'misses': 0}
+            self._last_flush = time.monotonic()
+        self._write_stats(conn, pending)
+
+    @staticmethod
+    def _write_stats(conn: sqlite3.Connection, pending: Dict[str, int]):
+        conn.executemany("UPDATE stats SET value = value + ? WHERE name = ?",
+                         [(count, name) for name, count in pending.items() if count])
+
+    def flush_stats(self):
+        """Write this process's pending hit/miss counts (also run at exit)"""
+        with self._lock:
+            self._reset_after_fork()
+            pending = self._pending
+            self._pending = {'hits': 0, 'misses': 0}
+            self._last_flush = time.monotonic()
+        if not any(pending.values()):
+            return
+        try:
+            with self._connection() as conn:
+                self._write_stats(conn, pending)
+        except sqlite3.Error as e:
+            logger.warning("Result cache stats flush failed: %s", e)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached result for the key, or None on a miss"""
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT value, created_at, accessed_at FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    row = None
+
+                if row is None:
+                    self._count(conn, 'misses')
+                    return None
+
+                if now - row[2] > TOUCH_INTERVAL_SECONDS:
+                    conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self._count(conn, 'hits')
+                return json.loads(row[0])
+        except sqlite3.Error as e:
+            logger.warning("Result cache lookup failed: %s", e)
+            return None
+
+    def _eviction_due(self) -> bool:
+        with self._lock:
+            self._reset_after_fork()
+            self._writes += 1
+            if self._writes < self._check_every and time.monotonic() - self._last_check < EVICTION_CHECK_SECONDS:
+                return False
+            self._writes = 0
+            self._last_check = time.monotonic()
+            return True
+
+    def set(self, key: str, value: Dict):
+        """Store a result; every few writes, evict expired and least recently used entries"""
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now)
+                )
+                if not self._eviction_due():
+                    return
+                conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+                size = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                if size > self.max_entries:
+                    conn.execute(
+                        "DELETE FROM entries WHERE key IN "
+                        "(SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                        (size - self.max_entries,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning("Result cache store failed: %s", e)
+
+    def stats(self) -> Dict:
+        """Return the hit/miss counters and the current number of entries.
+
+        The counters are the shared totals plus this process's unflushed
+        counts; other workers' counts appear once they flush their batch.
+        """
+        try:
+            conn = self._connection()
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            size = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning("Result cache stats failed: %s", e)
+            return {'enabled': True, 'error': str(e)}
+
+        with self._lock:
+            self._reset_after_fork()
+            pending = dict(self._pending)
+        hits = counters.get('hits', 0) + pending['hits']
+        misses = counters.get('misses', 0) + pending['misses']
+        lookups = hits + misses
+        return {
+            'enabled': True,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'size': size,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds
+        }
@@ -0,0 +1,125 @@
+"""
+Token-budgeted preparation of long emails for the zero-shot model
+"""
+import re
+from typing import Dict, List, Tuple
+
+# Cabeçalhos que introduzem o histórico citado de uma resposta (PT e EN)
+_REPLY_HEADER_RE = re.compile(
+    r'^\s*(?:'
+    r'on\b.{0,200}\bwrote:\s*$'
+    r'|em\b.{0,200}\bescreveu:\s*$'
+    r'|-{2,}\s*(?:original message|mensagem original|forwarded message|mensagem encaminhada)\s*-{2,}'
+    r'|(?:from|de):\s.*$'
+    r')',
+    re.IGNORECASE
+)
+_SENT_FROM_RE = re.compile(r'^\s*(?:sent from my|enviado do meu)\b', re.IGNORECASE)
+
+# Limite de caracteres por token usado para cortar o texto antes de tokenizar
+MAX_CHARS_PER_TOKEN = 16
+
+
+def strip_quoted_text(text: str) -> str:
+    """Remove quoted reply history and the signature from an email body.
+
+    Drops '>'-quoted lines, everything from the first reply/forward header
+    ("On ... wrote:", "Em ... escreveu:", "-----Original Message-----",
+    "From: ..."), and everything after a "-- " signature delimiter or a
+    "Sent from my ..." line.
+    """
+    kept = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped == '--':
+            break
+        if _REPLY_HEADER_RE.match(line) or _SENT_FROM_RE.match(line):
+            # Um "From:" na primeira linha é o cabeçalho do próprio email, não uma citação
+            if kept or not stripped.lower().startswith(('from:', 'de:')):
+                break
+        if stripped.startswith('>'):
+            continue
+        kept.append(line)
+    return '\n'.join(kept).strip()
+
+
+class TokenBudget:
+    """Counts and slices text in model tokens.
+
+    Uses the model tokenizer when available (in-process pipeline) and falls
+    back to whitespace-separated words otherwise (e.g. with the remote
+    inference server), which is a close enough approximation for budgeting.
+    """
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer
+
+    def encode(self, text: str) -> List:
+        if self.tokenizer is not None:
+            return self.tokenizer.encode(text, add_special_tokens=False)
+        return text.split()
+
+    def decode(self, tokens: List) -> str:
+        if self.tokenizer is not None:
+            return self.tokenizer.decode(tokens, skip_special_tokens=True)
+        return ' '.join(tokens)
+
+    def truncate(self, text: str, max_tokens: int, head_ratio: float) -> str:
+        """Keep the first head_ratio of the budget and fill the rest from the tail"""
+        max_chars = max_tokens * MAX_CHARS_PER_TOKEN
+        if len(text) > 2 * max_chars:
+            # Evita tokenizar documentos enormes só para os cortar
+            text = text[:max_chars] + '\n' + text[-max_chars:]
+
+        tokens = self.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+
+        head_tokens = int(max_tokens * head_ratio)
+        tail_tokens = max_tokens - head_tokens
+        head = self.decode(tokens[:head_tokens])
+        if tail_tokens <= 0:
+            return head
+        return head + '\n...\n' + self.decode(tokens[-tail_tokens:])
+
+    def chunks(self, text: str, chunk_tokens: int, overlap: int, max_tokens: int) -> List[Tuple[str, int]]:
+        """Split text into overlapping windows of chunk_tokens, sending at most
+        max_tokens tokens to the model in total. Returns (chunk_text, token_count) pairs."""
+        text = text[:max_tokens * MAX_CHARS_PER_TOKEN]
+        tokens = self.encode(text)
+        if not tokens:
+            return [(text, 0)]
+
+        chunk_tokens = max(1, min(chunk_tokens, max_tokens))
+        step = max(1, chunk_tokens - overlap)
+        windows = []
+        used = 0
+        for start in range(0, len(tokens), step):
+            window = tokens[start:start + chunk_tokens]
+            # O orçamento conta todos os tokens enviados ao modelo, incluindo a sobreposição
+            if windows and used + len(window) > max_tokens:
+                break
+            windows.append((self.decode(window), len(window)))
+            used += len(window)
+            if start + chunk_tokens >= len(tokens):
+                break
+        return windows
+
+
+def aggregate_chunk_results(results: List[Dict], weights: List[int]) -> Dict:
+    """Combine per-chunk zero-shot outputs into one, weighting scores by chunk length"""
+    if not sum(weights):
+        weights = [1] * len(results)
+    total_weight = sum(weights)
+    scores: Dict[str, float] = {}
+    for result, weight in zip(results, weights):
+        for label, score in zip(result['labels'], result['scores']):
+            scores[label] = scores.get(label, 0.0) + score * weight / total_weight
+
+    labels = sorted(scores, key=scores.get, reverse=True)
+    return {
+        'sequence': results[0].get('sequence', ''),
+        'labels': labels,
+        'scores': [scores[label] for label in labels],
+        'chunks': len(results)
+    }
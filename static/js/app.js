@@ -1,18 +1,29 @@
 const CONFIG = {
     API_URL: '/classify',
+    BATCH_API_URL: '/classify/batch',
     HEALTH_URL: '/health',
+    EXTRACT_WORKER_URL: 'js/extract-worker.js',
     MAX_FILE_SIZE: 10 * 1024 * 1024, // 10MB
+    MAX_FILES: 100, // MAX_BATCH_ITEMS do backend
+    MAX_EXTRACT_WORKERS: 4,
+    BATCH_SIZE: 8, // emails por pedido ao /classify/batch
+    MAX_PARALLEL_BATCHES: 2,
     MIN_TEXT_LENGTH: 10,
     TOAST_DURATION: 5000,
     HISTORY_KEY: 'email-classifier-history',
     THEME_KEY: 'email-classifier-theme',
-    MAX_HISTORY_ITEMS: 10,
+    MAX_HISTORY_ITEMS: 50,
+    MAX_HISTORY_CONTENT_LENGTH: 2000, // caracteres do email guardados por item
+    MAX_HISTORY_BYTES: 256 * 1024, // tamanho máximo do histórico serializado
     
     SELECTORS: {
         dropZone: '#drop-zone',
         fileInput: '#file-input',
         fileInfo: '#file-info',
         fileName: '#file-name',
+        uploadProgress: '#upload-progress',
+        uploadSummary: '#upload-summary',
+        uploadList: '#upload-list',
         emailText: '#email-text',
         submitText: '#submit-text',
         charCount: '#char-count',
@@ -29,10 +40,98 @@ const CONFIG = {
     }
 };
 
+class ExtractionPool {
+    // Pool de Web Workers que extraem o texto dos arquivos em paralelo,
+    // sem bloquear a thread principal
+    constructor(workerUrl, size) {
+        this.workerUrl = workerUrl;
+        this.size = size;
+        this.workers = [];
+        this.idle = [];
+        this.queue = [];
+        this.tasks = new Map();
+        this.nextId = 0;
+    }
+
+    static isSupported() {
+        return typeof Worker !== 'undefined';
+    }
+
+    extract(file, onProgress) {
+        return new Promise((resolve, reject) => {
+            this.queue.push({ id: this.nextId++, file, onProgress, resolve, reject });
+            this.dispatch();
+        });
+    }
+
+    dispatch() {
+        while (this.queue.length > 0) {
+            let worker = this.idle.pop();
+            if (!worker) {
+                if (this.workers.length >= this.size) return;
+                worker = this.createWorker();
+            }
+            
+            const task = this.queue.shift();
+            this.tasks.set(task.id, { task, worker });
+            worker.postMessage({ id: task.id, file: task.file });
+        }
+    }
+
+    createWorker() {
+        const worker = new Worker(this.workerUrl);
+        worker.onmessage = (event) => this.handleMessage(worker, event.data);
+        worker.onerror = (event) => this.handleCrash(worker, event);
+        this.workers.push(worker);
+        return worker;
+    }
+
+    handleMessage(worker, message) {
+        const entry = this.tasks.get(message.id);
+        if (!entry) return;
+        
+        if (message.type === 'progress') {
+            if (entry.task.onProgress) entry.task.onProgress(message.progress);
+            return;
+        }
+        
+        this.tasks.delete(message.id);
+        this.idle.push(worker);
+        
+        if (message.type === 'done') {
+            entry.task.resolve(message.text);
+        } else {
+            entry.task.reject(new Error(message.error));
+        }
+        this.dispatch();
+    }
+
+    handleCrash(worker, event) {
+        // Um worker que falhou é descartado; as tarefas dele falham e o pool cria outro
+        event.preventDefault();
+        for (const [id, entry] of this.tasks) {
+            if (entry.worker === worker) {
+                this.tasks.delete(id);
+                entry.task.reject(new Error(event.message || 'Falha no worker de extração'));
+            }
+        }
+        
+        worker.terminate();
+        this.workers = this.workers.filter(w => w !== worker);
+        this.idle = this.idle.filter(w => w !== worker);
+        this.dispatch();
+    }
+}
+
 class EmailClassifier {
     constructor() {
         this.isProcessing = false;
         this.dragCounter = 0;
+        this.uploadItems = [];
+        this.historySequence = 0;
+        this.extractionPool = ExtractionPool.isSupported()
+            ? new ExtractionPool(CONFIG.EXTRACT_WORKER_URL, Math.min(navigator.hardwareConcurrency || 2, CONFIG.MAX_EXTRACT_WORKERS))
+            : null;
         this.history = this.loadHistory();
         this.init();
     }
@@ -96,6 +195,10 @@ class EmailClassifier {
             document.querySelector(CONFIG.SELECTORS.fileInput).click();
         }
         
+        else if (closest('.upload-item')) {
+            this.showUploadResult(target.closest('.upload-item'));
+        }
+        
         else if (closest(CONFIG.SELECTORS.submitText)) {
             this.handleTextSubmit();
         }
@@ -127,7 +230,7 @@ class EmailClassifier {
         if (target.matches(CONFIG.SELECTORS.fileInput)) {
             const files = target.files;
             if (files && files.length > 0) {
-                this.handleFile(files[0]);
+                this.handleFiles(Array.from(files));
             }
         }
     }
@@ -179,7 +282,7 @@ class EmailClassifier {
             
             const files = e.dataTransfer?.files;
             if (files && files.length > 0) {
-                this.handleFile(files[0]);
+                this.handleFiles(Array.from(files));
             }
         }, false);
     }
@@ -207,41 +310,241 @@ class EmailClassifier {
         submitBtn.disabled = text.length < CONFIG.MIN_TEXT_LENGTH;
     }
 
-    async handleFile(file) {
+    validateFile(file) {
         const validTypes = ['text/plain', 'application/pdf'];
         if (!validTypes.includes(file.type)) {
-            this.showToast('Tipo de arquivo não suportado. Use apenas arquivos .txt ou .pdf', 'error');
-            return;
+            return 'Tipo de arquivo não suportado. Use apenas arquivos .txt ou .pdf';
         }
 
         if (file.size > CONFIG.MAX_FILE_SIZE) {
-            this.showToast('Arquivo muito grande. Tamanho máximo: 10MB', 'error');
-            return;
+            return 'Arquivo muito grande. Tamanho máximo: 10MB';
+        }
+        
+        return null;
+    }
+
+    async handleFiles(files) {
+        if (this.isProcessing) return;
+        
+        if (files.length > CONFIG.MAX_FILES) {
+            this.showToast(`Máximo de ${CONFIG.MAX_FILES} arquivos por vez. Apenas os primeiros serão processados.`, 'warning');
+            files = files.slice(0, CONFIG.MAX_FILES);
         }
 
         const fileName = document.querySelector(CONFIG.SELECTORS.fileName);
         const fileInfo = document.querySelector(CONFIG.SELECTORS.fileInfo);
+        const totalSize = files.reduce((sum, file) => sum + file.size, 0);
         
-        fileName.textContent = `${file.name} (${this.formatFileSize(file.size)})`;
+        fileName.textContent = files.length === 1
+            ? `${files[0].name} (${this.formatFileSize(totalSize)})`
+            : `${files.length} arquivos (${this.formatFileSize(totalSize)})`;
         fileInfo.classList.remove('hidden');
 
+        this.uploadItems = files.map((file, index) => {
+            const error = this.validateFile(file);
+            return { index, file, status: error ? 'error' : 'queued', progress: 0, error, content: null, result: null };
+        });
+        this.renderUploadList();
+        
+        const validItems = this.uploadItems.filter(item => !item.error);
+        if (validItems.length === 0) {
+            this.showToast(this.uploadItems[0].error, 'error');
+            return;
+        }
+
         try {
-            const text = await this.extractTextFromFile(file);
+            this.isProcessing = true;
+            this.showLoading();
             
-            if (text.trim().length < CONFIG.MIN_TEXT_LENGTH) {
-                this.showToast('Conteúdo do arquivo muito curto para classificação', 'error');
-                return;
+            await this.processUploadItems(validItems);
+            
+            const classified = this.uploadItems.filter(item => item.result);
+            if (classified.length > 0) {
+                this.showResult(classified[0].result);
             }
             
-            const emailData = {
-                content: text,
-                source: 'file',
-                filename: file.name
-            };
+            if (this.uploadItems.length > 1) {
+                this.showToast(`${classified.length} de ${this.uploadItems.length} arquivos classificados`,
+                    classified.length === this.uploadItems.length ? 'success' : 'warning');
+            } else if (classified.length === 0) {
+                this.showToast(this.uploadItems[0].error, 'error');
+            }
+        } catch (error) {
+            this.showToast('Erro ao processar arquivos: ' + error.message, 'error');
+        } finally {
+            this.isProcessing = false;
+            this.hideLoading();
             
-            await this.processEmail(emailData);
+            const fileInput = document.querySelector(CONFIG.SELECTORS.fileInput);
+            fileInput.value = '';
+        }
+    }
+
+    async processUploadItems(items) {
+        // A extração corre no pool de workers; os textos prontos são enviados
+        // em lotes ao /classify/batch, com no máximo MAX_PARALLEL_BATCHES pedidos em curso
+        const running = new Set();
+        let pending = [];
+        let sending = Promise.resolve();
+        
+        const sendPending = () => {
+            const batch = pending;
+            pending = [];
+            sending = sending.then(async () => {
+                while (running.size >= CONFIG.MAX_PARALLEL_BATCHES) {
+                    await Promise.race(running);
+                }
+                const request = this.classifyUploadBatch(batch).finally(() => running.delete(request));
+                running.add(request);
+            });
+        };
+        
+        await Promise.all(items.map(async (item) => {
+            await this.extractUploadText(item);
+            if (item.status === 'extracted') {
+                pending.push(item);
+                if (pending.length >= CONFIG.BATCH_SIZE) {
+                    sendPending();
+                }
+            }
+        }));
+        
+        if (pending.length > 0) {
+            sendPending();
+        }
+        
+        await sending;
+        await Promise.all(running);
+    }
+
+    async extractUploadText(item) {
+        item.status = 'extracting';
+        this.updateUploadItem(item);
+        
+        try {
+            const text = this.extractionPool
+                ? await this.extractionPool.extract(item.file, (progress) => {
+                    item.progress = progress;
+                    this.updateUploadItem(item);
+                })
+                : await this.extractTextFromFile(item.file);
+            
+            if (text.trim().length < CONFIG.MIN_TEXT_LENGTH) {
+                throw new Error('Conteúdo do arquivo muito curto para classificação');
+            }
+            
+            item.content = text;
+            item.status = 'extracted';
         } catch (error) {
-            this.showToast('Erro ao processar arquivo: ' + error.message, 'error');
+            item.status = 'error';
+            item.error = error.message;
+        }
+        this.updateUploadItem(item);
+    }
+
+    async classifyUploadBatch(items) {
+        items.forEach(item => {
+            item.status = 'classifying';
+            this.updateUploadItem(item);
+        });
+        
+        const emails = items.map(item => ({
+            content: item.content,
+            source: 'file',
+            filename: item.file.name
+        }));
+        const results = await this.classifyBatch(emails);
+        
+        const classified = [];
+        items.forEach((item, index) => {
+            const result = results[index];
+            if (result && !result.error) {
+                item.result = result;
+                item.status = 'done';
+                classified.push([emails[index], result]);
+            } else {
+                item.status = 'error';
+                item.error = result ? result.error : 'Sem resultado';
+            }
+            // O texto já está no resultado (originalContent)
+            item.content = null;
+            this.updateUploadItem(item);
+        });
+        
+        this.addManyToHistory(classified);
+    }
+
+    renderUploadList() {
+        const progress = document.querySelector(CONFIG.SELECTORS.uploadProgress);
+        const list = document.querySelector(CONFIG.SELECTORS.uploadList);
+        const template = document.getElementById('upload-item-template');
+        
+        const fragment = document.createDocumentFragment();
+        this.uploadItems.forEach(item => {
+            const element = template.content.cloneNode(true).querySelector('.upload-item');
+            element.dataset.uploadIndex = item.index;
+            element.querySelector('.upload-name').textContent = item.file.name;
+            fragment.appendChild(element);
+        });
+        
+        list.innerHTML = '';
+        list.appendChild(fragment);
+        progress.classList.remove('hidden');
+        
+        this.uploadItems.forEach(item => this.updateUploadItem(item));
+    }
+
+    updateUploadItem(item) {
+        const element = document.querySelector(`${CONFIG.SELECTORS.uploadList} [data-upload-index="${item.index}"]`);
+        if (!element) return;
+        
+        const status = element.querySelector('.upload-status');
+        const bar = element.querySelector('.upload-bar');
+        
+        let text, percent;
+        switch (item.status) {
+            case 'queued':
+                text = 'Na fila';
+                percent = 0;
+                break;
+            case 'extracting':
+                text = `Extraindo texto ${Math.round(item.progress * 100)}%`;
+                percent = item.progress * 60;
+                break;
+            case 'extracted':
+                text = 'Aguardando envio';
+                percent = 60;
+                break;
+            case 'classifying':
+                text = 'Classificando...';
+                percent = 80;
+                break;
+            case 'done':
+                text = `${item.result.category} (${Math.round(item.result.confidence * 100)}%)`;
+                percent = 100;
+                break;
+            default:
+                text = item.error;
+                percent = 100;
+        }
+        
+        status.textContent = text;
+        status.classList.toggle('text-red-600', item.status === 'error');
+        status.classList.toggle('dark:text-red-400', item.status === 'error');
+        bar.style.width = `${percent}%`;
+        bar.classList.toggle('bg-red-500', item.status === 'error');
+        bar.classList.toggle('bg-green-500', item.status === 'done');
+        element.classList.toggle('cursor-pointer', item.status === 'done');
+        
+        const summary = document.querySelector(CONFIG.SELECTORS.uploadSummary);
+        const finished = this.uploadItems.filter(i => i.status === 'done' || i.status === 'error').length;
+        summary.textContent = `${finished} de ${this.uploadItems.length} arquivos processados`;
+    }
+
+    showUploadResult(element) {
+        const item = this.uploadItems[element.dataset.uploadIndex];
+        if (item && item.result) {
+            this.showResult(item.result);
         }
     }
 
@@ -349,6 +652,37 @@ class EmailClassifier {
         }
     }
 
+    async classifyBatch(emails) {
+        try {
+            const response = await fetch(CONFIG.BATCH_API_URL, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ emails }),
+            });
+
+            if (!response.ok) {
+                let errorMessage = `HTTP error! status: ${response.status}`;
+                try {
+                    const errorData = await response.json();
+                    errorMessage = errorData.error || errorMessage;
+                } catch (e) {
+                }
+                throw new Error(errorMessage);
+            }
+
+            const data = await response.json();
+            return data.results;
+        } catch (error) {
+            console.error('API Error:', error);
+            
+            this.showToast('Erro na API: ' + error.message + '. Usando respostas simuladas.', 'warning');
+            
+            return emails.map(emailData => this.getMockResponse(emailData));
+        }
+    }
+
     getMockResponse(emailData) {
         const content = emailData.content.toLowerCase();
         
@@ -810,6 +1144,10 @@ A análise identificou padrões típicos de emails promocionais, spam ou conteú
         fileInput.value = '';
         fileInfo.classList.add('hidden');
         
+        this.uploadItems = [];
+        document.querySelector(CONFIG.SELECTORS.uploadProgress).classList.add('hidden');
+        document.querySelector(CONFIG.SELECTORS.uploadList).innerHTML = '';
+        
         const textarea = document.querySelector(CONFIG.SELECTORS.emailText);
         textarea.value = '';
         this.updateCharCount();
@@ -897,26 +1235,62 @@ A análise identificou padrões típicos de emails promocionais, spam ou conteú
 
     loadHistory() {
         try {
-            const history = localStorage.getItem(CONFIG.HISTORY_KEY);
-            return history ? JSON.parse(history) : [];
+            const stored = localStorage.getItem(CONFIG.HISTORY_KEY);
+            if (!stored) return [];
+            
+            // Históricos gravados por versões anteriores podem ter crescido sem limite
+            const history = this.compactHistory(JSON.parse(stored));
+            const serialized = JSON.stringify(history);
+            if (serialized.length !== stored.length) {
+                localStorage.setItem(CONFIG.HISTORY_KEY, serialized);
+            }
+            return history;
         } catch (error) {
             console.error('Error loading history:', error);
             return [];
         }
     }
 
+    compactHistory(history) {
+        // Limita o número de itens, o texto guardado de cada email e o tamanho total
+        const items = history.slice(0, CONFIG.MAX_HISTORY_ITEMS).map(item => ({
+            ...item,
+            content: item.content && item.content.length > CONFIG.MAX_HISTORY_CONTENT_LENGTH
+                ? item.content.substring(0, CONFIG.MAX_HISTORY_CONTENT_LENGTH)
+                : item.content
+        }));
+        
+        while (items.length > 1 && JSON.stringify(items).length > CONFIG.MAX_HISTORY_BYTES) {
+            items.pop();
+        }
+        return items;
+    }
+
     saveHistory() {
         try {
             localStorage.setItem(CONFIG.HISTORY_KEY, JSON.stringify(this.history));
         } catch (error) {
             console.error('Error saving history:', error);
+            // Sem espaço no localStorage: mantém só os itens mais recentes
+            this.history = this.history.slice(0, Math.floor(this.history.length / 2));
+            try {
+                localStorage.setItem(CONFIG.HISTORY_KEY, JSON.stringify(this.history));
+            } catch (e) {
+            }
         }
     }
 
     addToHistory(emailData, result) {
-        const historyItem = {
-            id: Date.now(),
-            timestamp: new Date().toISOString(),
+        this.addManyToHistory([[emailData, result]]);
+    }
+
+    addManyToHistory(entries) {
+        if (entries.length === 0) return;
+        
+        const now = Date.now();
+        const items = entries.map(([emailData, result]) => ({
+            id: `${now}-${this.historySequence++}`,
+            timestamp: new Date(now).toISOString(),
             content: emailData.content,
             source: emailData.source,
             filename: emailData.filename,
@@ -924,13 +1298,9 @@ A análise identificou padrões típicos de emails promocionais, spam ou conteú
             confidence: result.confidence,
             suggestedResponse: result.suggestedResponse,
             reasoning: result.reasoning
-        };
+        }));
         
-        this.history.unshift(historyItem);
-        
-        if (this.history.length > CONFIG.MAX_HISTORY_ITEMS) {
-            this.history = this.history.slice(0, CONFIG.MAX_HISTORY_ITEMS);
-        }
+        this.history = this.compactHistory(items.reverse().concat(this.history));
         
         this.saveHistory();
         this.renderHistory();
@@ -948,12 +1318,13 @@ A análise identificou padrões típicos de emails promocionais, spam ou conteú
             return;
         }
         
-        historyList.innerHTML = '';
-        
+        const fragment = document.createDocumentFragment();
         this.history.forEach(item => {
-            const historyItem = this.createHistoryItem(item);
-            historyList.appendChild(historyItem);
+            fragment.appendChild(this.createHistoryItem(item));
         });
+        
+        historyList.innerHTML = '';
+        historyList.appendChild(fragment);
     }
 
     createHistoryItem(item) {
@@ -0,0 +1,54 @@
+// Extrai o texto de arquivos .txt/.pdf fora da thread principal.
+// Carregar o pdf.worker aqui faz o PDF.js processar o documento nesta mesma
+// thread (sem criar outro worker), uma página de cada vez.
+const PDFJS_URL = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.min.js';
+const PDFJS_WORKER_URL = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
+
+let pdfjsLoaded = false;
+
+function loadPDFJS() {
+    if (!pdfjsLoaded) {
+        importScripts(PDFJS_URL, PDFJS_WORKER_URL);
+        pdfjsLib.GlobalWorkerOptions.workerSrc = PDFJS_WORKER_URL;
+        pdfjsLoaded = true;
+    }
+}
+
+async function extractPDFText(id, file) {
+    loadPDFJS();
+    const arrayBuffer = await file.arrayBuffer();
+    const pdf = await pdfjsLib.getDocument({ data: arrayBuffer }).promise;
+    const pages = [];
+
+    try {
+        for (let i = 1; i <= pdf.numPages; i++) {
+            const page = await pdf.getPage(i);
+            const textContent = await page.getTextContent();
+            pages.push(textContent.items.map(item => item.str).join(' '));
+            page.cleanup();
+            self.postMessage({ id, type: 'progress', progress: i / pdf.numPages });
+        }
+    } finally {
+        pdf.destroy();
+    }
+
+    return pages.join('\n');
+}
+
+self.onmessage = async (event) => {
+    const { id, file } = event.data;
+
+    try {
+        let text;
+        if (file.type === 'text/plain') {
+            text = await file.text();
+        } else if (file.type === 'application/pdf') {
+            text = await extractPDFText(id, file);
+        } else {
+            throw new Error('Formato de arquivo não suportado');
+        }
+        self.postMessage({ id, type: 'done', text });
+    } catch (error) {
+        self.postMessage({ id, type: 'error', error: error.message });
+    }
+};